@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from faq_index import normalize, tokenize
+from registry import atomic_write
+
+# Cached Bing-grounded answers shared by runs of the RAG agent.
+RAG_CACHE_PATH = os.getenv("RAG_CACHE_PATH", ".rag_cache.json")
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+# Web-grounded answers go stale; re-ask Bing after a day.
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 2048
+
+
+class HashingEmbedder:
+    # Signed feature hashing of words and character trigrams; no model, no network.
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def features(self, text: str) -> list[str]:
+        words = tokenize(text)
+        grams = []
+        for word in words:
+            padded = f" {word} "
+            grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return [f"w:{word}" for word in words] + [f"c:{gram}" for gram in grams]
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        path: str | None = None,
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        embedder: HashingEmbedder | None = None,
+        clock=time.time,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedder = embedder or HashingEmbedder()
+        self.clock = clock
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+        # LRU order of normalized questions; each owns one row of the vector matrix.
+        self._entries = OrderedDict()
+        self._slot_keys = {}
+        self._vectors = np.zeros((max_entries, self.embedder.dim), dtype=np.float32)
+        self._active = np.zeros(max_entries, dtype=bool)
+        self._free = list(range(max_entries - 1, -1, -1))
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: dict) -> bool:
+        return self.clock() - entry["created_at"] > self.ttl
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        del self._slot_keys[entry["slot"]]
+        self._active[entry["slot"]] = False
+        self._free.append(entry["slot"])
+
+    def get(self, question: str) -> dict | None:
+        key = normalize(question)
+        entry = self._entries.get(key)
+        semantic = False
+        if entry is None and self._entries:
+            sims = self._vectors @ self.embedder.embed(question)
+            sims[~self._active] = -1.0
+            slot = int(np.argmax(sims))
+            if sims[slot] >= self.threshold:
+                key = self._slot_keys[slot]
+                entry = self._entries[key]
+                semantic = True
+
+        if entry is not None and self._expired(entry):
+            self._remove(key)
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        self.stats["semantic_hits"] += semantic
+        return {field: entry[field] for field in ("question", "answer", "citations", "created_at")}
+
+    def put(self, question: str, answer: str, citations: list | None = None, created_at: float | None = None):
+        key = normalize(question)
+        if key in self._entries:
+            self._remove(key)
+        while not self._free:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+        slot = self._free.pop()
+        self._vectors[slot] = self.embedder.embed(question)
+        self._active[slot] = True
+        self._slot_keys[slot] = key
+        self._entries[key] = {
+            "question": question,
+            "answer": answer,
+            "citations": citations or [],
+            "created_at": self.clock() if created_at is None else created_at,
+            "slot": slot,
+        }
+
+    def purge_expired(self) -> int:
+        expired = [key for key, entry in self._entries.items() if self._expired(entry)]
+        for key in expired:
+            self._remove(key)
+        self.stats["expired"] += len(expired)
+        return len(expired)
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def save(self):
+        # Vectors are cheap to recompute, so only the entries are persisted (in LRU order).
+        entries = [{k: v for k, v in entry.items() if k != "slot"} for entry in self._entries.values() if not self._expired(entry)]
+        atomic_write(self.path, json.dumps({"entries": entries}, ensure_ascii=False))
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for entry in data.get("entries", [])[-self.max_entries:]:
+            if not self._expired(entry):
+                self.put(entry["question"], entry["answer"], entry.get("citations"), entry["created_at"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or look up entries in the RAG answer cache.")
+    parser.add_argument("questions", nargs="*", help="look these questions up")
+    parser.add_argument("--path", default=RAG_CACHE_PATH)
+    parser.add_argument("--purge", action="store_true", help="drop expired entries and save")
+    args = parser.parse_args()
+
+    cache = AnswerCache(args.path)
+    print(f"{len(cache)} cached answers in {args.path}")
+    for question in args.questions:
+        hit = cache.get(question)
+        print(f"{question} -> {hit['answer'] if hit else '(miss)'}")
+        for citation in hit["citations"] if hit else []:
+            print(f"    {citation}")
+    if args.purge:
+        print(f"purged {cache.purge_expired()} expired entries")
+        cache.save()
+    if args.questions:
+        print(f"hit rate {cache.hit_rate():.1%} {cache.stats}")
+
+
+if __name__ == "__main__":
+    main()
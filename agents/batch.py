@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import tracing
+from dedup import DEFAULT_THRESHOLD, DEFAULT_WINDOW, DuplicateIndex
+from pipeline import EmailJob, open_pipeline
+from scheduler import BULK
+from speculate import ANSWER_MODES
+
+DEFAULT_WORKERS = {"triage": 4, "answer": 8, "reply": 4}
+# Latencies kept for the p50/p95 summary; past this a uniform reservoir sample is kept instead.
+LATENCY_SAMPLE_SIZE = 10_000
+
+
+def read_emails(path: str):
+    # Lazily yields (email_id, email); emails without an "id" are keyed by their line number.
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                email = json.loads(line)
+                yield str(email.get("id") or f"line:{number}"), email
+
+
+def load_completed(path: str) -> set:
+    # The results file doubles as the checkpoint: an email with a non-error result is done.
+    completed = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # partially written last line of an interrupted run
+                if result.get("status") != "error":
+                    completed.add(result["email_id"])
+    return completed
+
+
+class LatencySample:
+    def __init__(self, size: int = LATENCY_SAMPLE_SIZE, rng: random.Random | None = None):
+        self.size = size
+        self.rng = rng or random.Random(0)
+        self.count = 0
+        self.values = []
+
+    def add(self, value: float):
+        self.count += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            slot = self.rng.randrange(self.count)
+            if slot < self.size:
+                self.values[slot] = value
+
+    def percentile(self, p: float) -> float:
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class BatchRunner:
+    # triage -> answer (FAQ/RAG fan-out) -> reply, each stage with its own worker pool and a bounded
+    # input queue. A full queue blocks the stage before it, so at most a few emails per worker are in flight.
+    def __init__(self, pipeline, results_path: str, workers: dict | None = None, queue_size: int | None = None):
+        self.pipeline = pipeline
+        self.results_path = results_path
+        self.workers = {**DEFAULT_WORKERS, **(workers or {})}
+        self.queue_size = queue_size
+        self.latency = LatencySample()
+        self.counts = {"replied": 0, "needs_user": 0, "error": 0, "skipped": 0}
+
+    def _queue(self, stage: str) -> asyncio.Queue:
+        return asyncio.Queue(maxsize=self.queue_size or 2 * self.workers[stage])
+
+    async def _feed(self, emails, completed: set, queue: asyncio.Queue):
+        for email_id, email in emails:
+            if email_id in completed:
+                self.counts["skipped"] += 1
+                continue
+            await queue.put(EmailJob({**email, "id": email_id}))
+
+    async def _stage(self, name: str, inbox: asyncio.Queue, step, route):
+        while True:
+            job = await inbox.get()
+            if job is None:
+                return
+            try:
+                await step(job)
+            except Exception as e:
+                job.error = f"{name}: {type(e).__name__}: {e}"
+            await route(job)
+
+    async def _run_stage(self, name: str, inbox: asyncio.Queue, step, route, downstream: asyncio.Queue, downstream_workers: int, followers: set = frozenset()):
+        # followers are tasks started by route that may still pass jobs downstream; the next stage is closed after them.
+        await asyncio.gather(*(self._stage(name, inbox, step, route) for _ in range(self.workers[name])))
+        while followers:
+            await asyncio.wait(list(followers))
+        for _ in range(downstream_workers):
+            await downstream.put(None)
+
+    async def _write(self, inbox: asyncio.Queue, out):
+        while True:
+            job = await inbox.get()
+            if job is None:
+                return
+            result = job.result()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            self.pipeline.finish(job)
+            self.counts[result["status"]] += 1
+            self.latency.add(job.timeline.clock() - job.timeline.origin)
+
+    async def run(self, input_path: str) -> dict:
+        completed = load_completed(self.results_path)
+        triage_q, answer_q, reply_q = self._queue("triage"), self._queue("answer"), self._queue("reply")
+        results_q = asyncio.Queue(maxsize=self.queue_size or 2 * sum(self.workers.values()))
+
+        followers = set()
+
+        async def after_triage(job):
+            if job.duplicate_of is not None and not job.error:
+                # A duplicate waits for the earlier email's answers outside the answer workers, which may
+                # have that email still to answer.
+                task = asyncio.create_task(follow(job))
+                followers.add(task)
+                task.add_done_callback(followers.discard)
+                return
+            await (results_q if job.error else answer_q).put(job)
+
+        async def follow(job):
+            try:
+                followed = await self.pipeline.follow(job)
+            except Exception as e:
+                job.error, followed = f"answer: {type(e).__name__}: {e}", True
+            # Without the earlier email's answers, it is answered like any other email.
+            await (after_answer(job) if followed else answer_q.put(job))
+
+        async def after_answer(job):
+            await (results_q if job.error or job.unanswered else reply_q).put(job)
+
+        start = time.perf_counter()
+        with open(self.results_path, "a", encoding="utf-8") as out:
+            async def feed():
+                await self._feed(read_emails(input_path), completed, triage_q)
+                for _ in range(self.workers["triage"]):
+                    await triage_q.put(None)
+
+            stages = asyncio.gather(
+                self._run_stage("triage", triage_q, self.pipeline.triage, after_triage, answer_q, self.workers["answer"], followers),
+                self._run_stage("answer", answer_q, self.pipeline.answer, after_answer, reply_q, self.workers["reply"]),
+                self._run_stage("reply", reply_q, self.pipeline.reply, results_q.put, results_q, 1),
+            )
+            await asyncio.gather(feed(), stages, self._write(results_q, out))
+        elapsed = time.perf_counter() - start
+
+        processed = self.latency.count
+        return {
+            **self.counts,
+            "processed": processed,
+            "elapsed": round(elapsed, 3),
+            "emails_per_minute": round(processed / elapsed * 60, 1) if elapsed else 0.0,
+            "p50": round(self.latency.percentile(50), 3),
+            "p95": round(self.latency.percentile(95), 3),
+        }
+
+
+async def report_scheduler(scheduler, interval: float):
+    # Live queue depth and throttling per model deployment, on stderr.
+    while True:
+        await asyncio.sleep(interval)
+        stats = ", ".join(f"{model}: queued {s['queued']} in flight {s['in_flight']} throttled {s['throttled']}" for model, s in scheduler.snapshot().items())
+        print(stats, file=sys.stderr)
+
+
+async def run_batch(
+    input_path: str,
+    results_path: str,
+    fake: bool = False,
+    speed: float = 1.0,
+    workers: dict | None = None,
+    stats_interval: float = 0.0,
+    fake_options: dict | None = None,
+    coalesce: bool = False,
+    dedup: bool = False,
+    dup_threshold: float = DEFAULT_THRESHOLD,
+    dup_window: float = DEFAULT_WINDOW,
+    **options,
+) -> dict:
+    # Batch runs queue behind interactive ones on the shared rate limit scheduler. With coalesce, emails
+    # in flight share the answer to the same question; with dedup, an email whose body repeats one seen
+    # in the last dup_window seconds reuses its triage output and answers. Both are off by default.
+    # options: record, replay, replay_timing, cascade, route, template_replies and answer_mode, see open_pipeline.
+    duplicates = DuplicateIndex(dup_threshold, dup_window) if dedup else None
+    async with open_pipeline(fake, speed, priority=BULK, fake_options=fake_options, coalesce=coalesce, duplicates=duplicates, **options) as pipeline:
+        # Span percentiles cover this batch only.
+        pipeline.tracer.reset()
+        reporter = asyncio.create_task(report_scheduler(pipeline.client.scheduler, stats_interval)) if stats_interval else None
+        try:
+            summary = await BatchRunner(pipeline, results_path, workers).run(input_path)
+        finally:
+            if reporter:
+                reporter.cancel()
+    # Taken after the pipeline is closed, so pooled threads have been deleted too.
+    extra = {}
+    if pipeline.cascade:
+        extra["cascade"] = pipeline.cascade.snapshot()
+    if pipeline.router:
+        extra["routing"] = pipeline.router.snapshot()
+    if pipeline.coalescer:
+        extra["coalescing"] = pipeline.coalescer.snapshot()
+    if pipeline.duplicates:
+        extra["dedup"] = pipeline.duplicates.snapshot()
+    if pipeline.replies:
+        extra["template_replies"] = pipeline.replies.snapshot()
+    if pipeline.speculation:
+        extra["speculation"] = pipeline.speculation.snapshot()
+    return {**summary, "validation": pipeline.validation.snapshot(), "scheduler": pipeline.client.scheduler.snapshot(), "threads": pipeline.threads.snapshot(), "spans": pipeline.tracer.summary(), **extra}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a JSONL file of emails through the triage -> FAQ/RAG -> reply agents.")
+    parser.add_argument("emails", help='JSONL file, one {"id", "from", "to", "subject", "body"} object per line')
+    parser.add_argument("--results", default=None, help="JSONL results file, also used to resume (default: <emails>.results.jsonl)")
+    parser.add_argument("--triage-workers", type=int, default=DEFAULT_WORKERS["triage"])
+    parser.add_argument("--answer-workers", type=int, default=DEFAULT_WORKERS["answer"])
+    parser.add_argument("--reply-workers", type=int, default=DEFAULT_WORKERS["reply"])
+    parser.add_argument("--fake", action="store_true", help="run against the in-process fake Foundry (fake_foundry.py)")
+    parser.add_argument("--speed", type=float, default=1.0, help="scale the fake's simulated latency")
+    parser.add_argument("--stats-interval", type=float, default=0.0, help="print per-deployment queue depth every N seconds")
+    parser.add_argument("--record", metavar="CASSETTE", help="record the Foundry and CQA traffic to a cassette (.jsonl or .jsonl.gz)")
+    parser.add_argument("--replay", metavar="CASSETTE", help="answer from a recorded cassette instead of Azure")
+    parser.add_argument("--no-timing", action="store_true", help="with --replay, don't wait the recorded latencies")
+    parser.add_argument("--trace", metavar="FILE", help="append OTLP/JSON spans of the agent runs and tool calls to FILE")
+    parser.add_argument("--trace-console", action="store_true", help="print a line per finished span to stderr")
+    parser.add_argument("--cascade", action="store_true", help="run the mini twins of the RAG and Reply agents first")
+    parser.add_argument("--route", action="store_true", help="send each question to FAQ, RAG or both by its match against the FAQ KB")
+    parser.add_argument("--coalesce", action="store_true", help="let emails in flight share the answer to the same question")
+    parser.add_argument("--dedup", action="store_true", help="reuse the triage output and answers of an earlier email with the same body")
+    parser.add_argument("--dup-threshold", type=float, default=DEFAULT_THRESHOLD, help="estimated Jaccard similarity at which an earlier email is checked for the same body")
+    parser.add_argument("--dup-window", type=float, default=DEFAULT_WINDOW, help="seconds an email stays in the duplicate index")
+    parser.add_argument("--template-replies", action="store_true", help="render plain replies locally and post them to the Reply trigger (REPLY_ENDPOINT)")
+    parser.add_argument("--answer-mode", choices=ANSWER_MODES, default="both", help="run FAQ and RAG together, RAG only after an FAQ miss, or RAG speculatively (cancelled on an FAQ answer)")
+    args = parser.parse_args()
+
+    results_path = args.results or os.path.splitext(args.emails)[0] + ".results.jsonl"
+    workers = {"triage": args.triage_workers, "answer": args.answer_workers, "reply": args.reply_workers}
+    tracing.configure(args.trace, args.trace_console)
+    try:
+        summary = asyncio.run(run_batch(
+            args.emails, results_path, args.fake, args.speed, workers, args.stats_interval, coalesce=args.coalesce,
+            dedup=args.dedup, dup_threshold=args.dup_threshold, dup_window=args.dup_window,
+            record=args.record, replay=args.replay, replay_timing=not args.no_timing, cascade=args.cascade, route=args.route,
+            template_replies=args.template_replies, answer_mode=args.answer_mode,
+        ))
+    except EnvironmentError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        tracing.tracer.shutdown()
+
+    print(f"{summary['processed']} emails in {summary['elapsed']:.1f}s -> {results_path}")
+    print(f"replied {summary['replied']}, needs user {summary['needs_user']}, errors {summary['error']}, skipped (already done) {summary['skipped']}")
+    print(f"throughput {summary['emails_per_minute']:.1f} emails/min, latency p50 {summary['p50']:.2f}s p95 {summary['p95']:.2f}s")
+    threads = summary["threads"]
+    print(f"threads: pool hit rate {threads['hit_rate']:.0%}, created {threads['created']}, deleted {threads['deleted']}, delete failures {threads['delete_failures']}, still leased {threads['leased']}")
+    for model, stats in summary["scheduler"].items():
+        print(f"{model}: {stats['dispatched']} runs, {stats['tokens']} tokens, throttled {stats['throttled']}, failed {stats['failed']}, cancelled {stats['cancelled']}")
+    for stage, stats in summary.get("cascade", {}).items():
+        saved = f"{stats['saved']:.1f}s saved" if stats["saved"] is not None else "no full runs to compare"
+        print(f"cascade {stage}: {stats['escalated']} of {stats['runs']} escalated ({stats['escalation_rate']:.0%}), {saved}, reasons {stats['reasons']}")
+    if "routing" in summary:
+        routing = summary["routing"]
+        print(f"routing: {routing['faq']} questions to FAQ only, {routing['rag']} to RAG only, {routing['both']} to both; "
+              f"{routing['fallbacks']} FAQ misses sent on to RAG; RAG runs avoided {routing['rag_runs_avoided']}, FAQ runs avoided {routing['faq_runs_avoided']}")
+    if "coalescing" in summary:
+        coalescing = summary["coalescing"]
+        print(f"coalescing: {coalescing['coalesced']} of {coalescing['questions']} questions shared an answer in flight ({coalescing['ratio']:.0%}), {coalescing['saved_runs']} runs saved")
+    if "dedup" in summary:
+        dedup = summary["dedup"]
+        print(f"dedup: {dedup['duplicates']} of {dedup['lookups']} emails repeated an earlier one, {dedup['rejected']} similar but different, {dedup['evictions']} evicted")
+    if "template_replies" in summary:
+        replies = summary["template_replies"]
+        saved = f"~{replies['saved']:.1f}s saved" if replies["saved"] is not None else "no Reply Agent runs to compare"
+        print(f"template replies: {replies['templated']} of {replies['replies']} sent without the Reply Agent ({replies['bypass_rate']:.0%}), {saved}, reasons {replies['reasons']}")
+    if "speculation" in summary:
+        speculation = summary["speculation"]
+        print(f"speculation: FAQ answered {speculation['faq_answered']} of {speculation['questions']} questions, {speculation['rag_cancelled']} RAG paths cancelled "
+              f"({speculation['runs_cancelled']} runs, {speculation['wasted_tokens']} tokens wasted); RAG had a {speculation['head_start_seconds']:.1f}s head start on {speculation['rag_needed']} FAQ misses")
+    failed = {agent: stats for agent, stats in summary["validation"].items() if stats["failed"]}
+    if failed:
+        print("validation: " + ", ".join(
+            f"{agent} {stats['failed']}/{stats['checked']} outputs invalid ({stats['failure_rate']:.1%}), {stats['repaired']}/{stats['retries']} retries repaired them"
+            for agent, stats in failed.items()
+        ))
+    print(tracing.format_summary(summary["spans"]))
+
+
+if __name__ == "__main__":
+    main()
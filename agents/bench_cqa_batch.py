@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import time
+
+import requests
+
+import cqa_batch_tool
+from cqa_stub_server import CqaStubServer
+from faq_index import FaqIndex
+
+
+def build_index(count: int) -> FaqIndex:
+    index = FaqIndex()
+    for number in range(count):
+        index.add(number, [f"What is the limit number {number} for agents?"], f"Limit {number} is {number * 10}.")
+    return index
+
+
+def run(questions: int, latency_ms: float, model_turn_ms: float):
+    server = CqaStubServer(("127.0.0.1", 0), build_index(questions), latency_ms / 1000).start()
+    os.environ["CQA_ENDPOINT"] = server.endpoint
+    batch = [f"What is the limit number {number} for agents?" for number in range(questions)]
+
+    # Baseline: the OpenAPI tool, i.e. one model turn plus one fresh HTTP call per question.
+    start = time.perf_counter()
+    for question in batch:
+        time.sleep(model_turn_ms / 1000)
+        requests.post(
+            f"{server.endpoint}/:query-knowledgebases",
+            json={"question": question, "top": 1},
+            timeout=cqa_batch_tool.TIMEOUT,
+        ).raise_for_status()
+    sequential = time.perf_counter() - start
+
+    # Batched function tool: one model turn, queries fanned out over pooled connections.
+    start = time.perf_counter()
+    time.sleep(model_turn_ms / 1000)
+    result = json.loads(cqa_batch_tool.query_knowledgebase_batch(batch))
+    batched = time.perf_counter() - start
+
+    answered = sum(1 for item in result["answers"] if item.get("answer"))
+    print(f"{questions} questions, {latency_ms:.0f} ms service latency, {model_turn_ms:.0f} ms per model turn")
+    print(f"sequential tool calls: {sequential * 1000:8.1f} ms ({questions} model turns)")
+    print(f"batched tool call:     {batched * 1000:8.1f} ms (1 model turn, {cqa_batch_tool.MAX_PARALLEL} parallel)")
+    print(f"answered {answered}/{questions}; speed-up {sequential / batched:.1f}x")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-question CQA tool calls with the batched function tool.")
+    parser.add_argument("--questions", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--model-turn-ms", type=float, default=0.0, help="simulated model round-trip per tool call")
+    args = parser.parse_args()
+    run(args.questions, args.latency_ms, args.model_turn_ms)
+
+
+if __name__ == "__main__":
+    main()
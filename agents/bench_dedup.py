@@ -0,0 +1,83 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bench_faq_index import ACTIONS, CONTEXTS, FILLERS, OBJECTS, percentile
+from dedup import DEFAULT_THRESHOLD, DuplicateIndex, body_key
+from faq_index import normalize
+
+GREETINGS = ["Hi team,", "Hello,", "Hey,", "Good morning,", ""]
+SIGN_OFFS = ["Thanks!", "Best regards,", "Cheers,", "Thank you in advance.", ""]
+
+
+def random_email(rng: random.Random) -> str:
+    questions = [f"How do I {rng.choice(ACTIONS)} a {rng.choice(OBJECTS)} using the {rng.choice(CONTEXTS)}?" for _ in range(rng.randint(1, 3))]
+    return f"{rng.choice(GREETINGS)} {' '.join(questions)} {rng.choice(SIGN_OFFS)} {rng.choice(['Ana', 'Ben', 'Chen', 'Dana', 'Eli'])}"
+
+
+def resend(body: str, rng: random.Random) -> str:
+    # The same email sent again: only case, punctuation and line breaks change.
+    words = [word.upper() if rng.random() < 0.1 else word for word in body.split()]
+    text = rng.choice([" ", "  ", "\n"]).join(words)
+    return text.replace("?", rng.choice(["?", " ?", "??"]))
+
+
+def edit(body: str, rng: random.Random) -> str:
+    # A different email that shares the rest of its wording, e.g. another order number.
+    words = body.split()
+    words.insert(rng.randrange(len(words) + 1), f"#{rng.randrange(10_000, 100_000)}")
+    return " ".join(words)
+
+
+def run(count: int, duplicate_rate: float, edit_rate: float, threshold: float, seed: int) -> int:
+    # Returns the number of false matches: emails matched to an earlier one with a different body.
+    rng = random.Random(seed)
+    sent = []
+    tracemalloc.start()
+    index = DuplicateIndex(threshold=threshold, max_entries=count)
+    latency, planted, edited, found, false_matches = [], 0, 0, 0, 0
+    for number in range(count):
+        kind = rng.random()
+        is_copy = bool(sent) and kind < duplicate_rate
+        is_edit = bool(sent) and duplicate_rate <= kind < duplicate_rate + edit_rate
+        body = resend(rng.choice(sent), rng) if is_copy else edit(rng.choice(sent), rng) if is_edit else random_email(rng)
+        start = time.perf_counter()
+        signature = index.signature(body)
+        match = index.find(signature, body_key(body))
+        if match is None:
+            index.add(signature, body_key(body), number)
+        latency.append((time.perf_counter() - start) * 1_000_000)
+        planted += is_copy
+        edited += is_edit
+        found += bool(is_copy and match)
+        false_matches += bool(match and normalize(sent[match[0]]) != normalize(body))
+        sent.append(body)
+    sent_memory = sum(len(body) + 49 for body in sent) + 8 * len(sent)
+    index_memory = tracemalloc.get_traced_memory()[0] - sent_memory
+    tracemalloc.stop()
+
+    print(f"{count} emails, {planted} resent copies, {edited} edited copies, threshold {threshold}, {index.bands} bands x {index.rows} rows")
+    print(f"copies found {found}/{planted} ({found / max(planted, 1):.1%}); false matches {false_matches}; similar but different emails rejected {index.stats['rejected']}")
+    print(f"lookup+insert p50 {statistics.median(latency):.0f} us, p99 {percentile(latency, 99):.0f} us, max {max(latency):.0f} us")
+    print(f"index: {len(index)} entries, about {index_memory / 2**20:.1f} MiB ({index_memory / max(len(index), 1):.0f} bytes per entry; the signature matrix for {count} is allocated up front)")
+    return false_matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate email detection (dedup.py) on synthetic resent emails.")
+    parser.add_argument("--emails", type=int, default=50_000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="share of emails that are resent copies of an earlier one")
+    parser.add_argument("--edit-rate", type=float, default=0.2, help="share of emails that are an earlier one with a number added")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if run(args.emails, args.duplicate_rate, args.edit_rate, args.threshold, args.seed):
+        print("FAIL: emails were matched to an earlier email with a different body", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
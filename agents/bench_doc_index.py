@@ -0,0 +1,116 @@
+import argparse
+import os
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench_faq_index import ACTIONS, CONTEXTS, OBJECTS, percentile
+from doc_index import CHUNK_WORDS, DocIndex, build_index, list_docs
+
+SECTIONS_PER_FILE = 10
+VOCABULARY = 20_000
+TOPIC_WORDS = 3
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "gu", "he", "ja", "fi", "be"]
+
+
+def vocabulary(size: int) -> list[str]:
+    words, syllables = [], len(_SYLLABLES)
+    for number in range(size):
+        word = ""
+        while True:
+            number, digit = divmod(number, syllables)
+            word += _SYLLABLES[digit]
+            if not number:
+                break
+        words.append(word + "x")
+    return words
+
+
+def write_docs(directory: str, chunks: int, rng: np.random.Generator) -> list[tuple[str, list[str]]]:
+    # Markdown files of SECTIONS_PER_FILE sections, each one chunk long. Section bodies draw from a
+    # Zipf-like vocabulary and repeat a few topic words of their own; returns (source, topic) per section.
+    words = vocabulary(VOCABULARY)
+    weights = 1.0 / np.arange(1, VOCABULARY + 1)
+    weights /= weights.sum()
+    sections = []
+    for number in range(0, chunks, SECTIONS_PER_FILE):
+        source = f"area{number // 1000:03d}/doc{number:06d}.md"
+        os.makedirs(os.path.join(directory, os.path.dirname(source)), exist_ok=True)
+        lines = [f"# Document {number}"]
+        for _ in range(min(SECTIONS_PER_FILE, chunks - number)):
+            topic = [words[i] for i in rng.integers(VOCABULARY // 2, VOCABULARY, TOPIC_WORDS)]
+            action, obj, context = ACTIONS[rng.integers(len(ACTIONS))], OBJECTS[rng.integers(len(OBJECTS))], CONTEXTS[rng.integers(len(CONTEXTS))]
+            body = [words[i] for i in rng.choice(VOCABULARY, CHUNK_WORDS - 40, p=weights)]
+            for word in topic * 3:
+                body.insert(int(rng.integers(len(body))), word)
+            lines += [f"## {action.capitalize()} a {obj} with the {context}", " ".join(body), ""]
+            sections.append((source, [action, obj, context, *topic]))
+        with open(os.path.join(directory, source), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    return sections
+
+
+def touch(directory: str, share: float, rng: np.random.Generator) -> int:
+    # Appends a line to a share of the files, like a docs sync with a few edited pages.
+    docs = list_docs(directory)
+    picked = rng.choice(len(docs), max(1, int(share * len(docs))), replace=False)
+    for i in picked:
+        with open(docs[i][1], "a", encoding="utf-8") as f:
+            f.write("\nUpdated.\n")
+    return len(picked)
+
+
+def rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(chunks: int, queries: int, changed: float, seed: int):
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir, index_dir = os.path.join(tmp, "docs"), os.path.join(tmp, "index")
+        sections = write_docs(docs_dir, chunks, rng)
+        full = build_index(docs_dir, index_dir)
+        edited = touch(docs_dir, changed, rng)
+        incremental = build_index(docs_dir, index_dir)
+
+        rss = rss_mib()
+        tracemalloc.start()
+        index = DocIndex(index_dir)
+        opened = tracemalloc.get_traced_memory()[0]
+        index.search("warm up")
+        latency, found = [], 0
+        for _ in range(queries):
+            source, (action, obj, context, *topic) = sections[rng.integers(len(sections))]
+            query = f"How do I {action} a {obj} with the {context} {' '.join(topic[:2])}?"
+            start = time.perf_counter()
+            passages = index.search(query)
+            latency.append((time.perf_counter() - start) * 1000)
+            found += any(passage["source"] == source and topic[0] in passage["text"] for passage in passages)
+        heap = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        index.close()
+
+    print(f"{chunks} chunks in {full['files']} files")
+    print(f"full build {full['seconds']:.1f}s, index {full['bytes'] / 2**20:.1f} MiB on disk ({full['bytes'] / chunks:.0f} bytes per chunk)")
+    print(f"incremental build after editing {edited} files: {incremental['seconds']:.2f}s, {incremental['embedded']} chunks embedded")
+    print(f"query p50 {statistics.median(latency):.2f} ms, p95 {percentile(latency, 95):.2f} ms, p99 {percentile(latency, 99):.2f} ms; target section in top 5 for {found / queries:.1%}")
+    print(f"memory: {opened / 2**10:.0f} KiB heap to open, {heap / 2**20:.1f} MiB heap peak while querying, max RSS {rss_mib():.0f} MiB (was {rss:.0f} MiB before opening; the arrays are memory-mapped)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark building and querying the local docs index (doc_index.py) on synthetic Markdown docs.")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--changed", type=float, default=0.01, help="share of files edited before the incremental build")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    for chunks in args.chunks:
+        run(chunks, args.queries, args.changed, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from faq_index import DEFAULT_CONFIDENCE_THRESHOLD, FaqIndex
+
+# Vocabulary for a synthetic Agent Service style knowledge base.
+ACTIONS = ["create", "delete", "update", "configure", "monitor", "deploy", "scale", "secure", "debug", "export"]
+OBJECTS = ["agent", "thread", "vector store", "file search index", "connection", "deployment", "project", "tool", "run", "evaluation"]
+CONTEXTS = ["portal", "python sdk", "rest api", "azure cli", "private network", "sharepoint", "bing grounding", "logic apps"]
+OUT_OF_SCOPE = [
+    "What will the roadmap look like next year?",
+    "Who is the product owner of the service?",
+    "Can you recommend a good pizza place nearby?",
+    "Is the weather in Seattle nice in May?",
+    "What is the market size of the company?",
+]
+FILLERS = ["please tell me", "quick question", "hey team", "thanks", "asap"]
+
+
+def build_kb(size: int, rng: random.Random) -> tuple[FaqIndex, list[tuple[str, str]], list[str]]:
+    combos = [(a, o, c) for a in ACTIONS for o in OBJECTS for c in CONTEXTS]
+    rng.shuffle(combos)
+    index = FaqIndex()
+    qnas = []
+    for qna_id, (action, obj, context) in enumerate(combos[:size]):
+        question = f"How do I {action} a {obj} using the {context}?"
+        alternate = f"What are the steps to {action} {obj} with {context}"
+        index.add(qna_id, [question, alternate], f"To {action} a {obj} with the {context}, follow the documented steps.")
+        qnas.append((str(qna_id), question))
+    # Same shape as KB questions but not in the KB: these must go to the agent.
+    near_misses = [f"How do I {action} a {obj} using the {context}?" for action, obj, context in combos[size:]]
+    return index, qnas, near_misses
+
+
+def paraphrase(question: str, rng: random.Random) -> str:
+    words = question.rstrip("?").split()
+    if len(words) > 4:
+        words.pop(rng.randrange(1, 3))
+    if rng.random() < 0.5:
+        words.insert(0, rng.choice(FILLERS) + ",")
+    text = " ".join(words)
+    return text.upper() if rng.random() < 0.2 else text + "??"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(size: int, queries: int, threshold: float, seed: int):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    index, qnas, near_misses = build_kb(size, rng)
+    index.query("warm up")
+    build_ms = (time.perf_counter() - start) * 1000
+
+    workload = []
+    for _ in range(queries):
+        qna_id, question = rng.choice(qnas)
+        kind = rng.choices(["exact", "paraphrase", "near_miss", "out_of_scope"], weights=[4, 4, 1 if near_misses else 0, 1])[0]
+        if kind == "exact":
+            workload.append((kind, question, qna_id))
+        elif kind == "paraphrase":
+            workload.append((kind, paraphrase(question, rng), qna_id))
+        elif kind == "near_miss":
+            workload.append((kind, rng.choice(near_misses), None))
+        else:
+            workload.append((kind, rng.choice(OUT_OF_SCOPE), None))
+
+    kinds = ("exact", "paraphrase", "near_miss", "out_of_scope")
+    stats = {kind: {"total": 0, "hits": 0, "correct": 0, "latency_us": []} for kind in kinds}
+    for kind, question, expected in workload:
+        start = time.perf_counter()
+        answer = index.answer(question, threshold)
+        stats[kind]["latency_us"].append((time.perf_counter() - start) * 1_000_000)
+        stats[kind]["total"] += 1
+        if answer:
+            stats[kind]["hits"] += 1
+            stats[kind]["correct"] += answer["id"] == expected
+
+    print(f"KB: {len(index)} QnA pairs, built in {build_ms:.1f} ms; threshold {threshold}")
+    print(f"{'kind':<14}{'queries':>8}{'hit rate':>10}{'correct':>10}{'p50 us':>10}{'p95 us':>10}")
+    for kind, s in stats.items():
+        if not s["total"]:
+            continue
+        print(
+            f"{kind:<14}{s['total']:>8}{s['hits'] / s['total']:>10.1%}{s['correct'] / s['total']:>10.1%}"
+            f"{statistics.median(s['latency_us']):>10.1f}{percentile(s['latency_us'], 95):>10.1f}"
+        )
+    answerable = stats["exact"]["total"] + stats["paraphrase"]["total"]
+    answered_locally = stats["exact"]["correct"] + stats["paraphrase"]["correct"]
+    wrong = sum(stats[kind]["hits"] - stats[kind]["correct"] for kind in kinds)
+    print(f"Answered locally (skipping the FAQ agent): {answered_locally}/{answerable} in-KB questions")
+    print(f"Wrong local answers (would have needed the agent): {wrong}/{queries}")
+    # Near misses are not in the KB, so every local answer to one is wrong.
+    return stats["near_miss"]["hits"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local FAQ index on a synthetic question set.")
+    parser.add_argument("--size", type=int, default=500, help="number of QnA pairs (max 800)")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if run(args.size, args.queries, args.threshold, args.seed):
+        print("FAIL: questions not in the KB were answered locally", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
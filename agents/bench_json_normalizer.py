@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import statistics
+import time
+
+from json_normalizer import parse_answers
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "agent_outputs.jsonl")
+
+
+def load_samples(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run(path: str, repeat: int):
+    samples = load_samples(path)
+    parsed = correct = 0
+    parse_us = []
+    formatter_ms = []
+    misses = []
+    for index, sample in enumerate(samples):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = parse_answers(sample["output"], sample["questions"])
+        parse_us.append((time.perf_counter() - start) / repeat * 1_000_000)
+
+        answered = [item["question_id"] for item in result["answered_questions"]] if result else None
+        parsed += result is not None
+        correct += answered == sample["expected_answered"]
+        if result is None or answered != sample["expected_answered"]:
+            reason = "nothing parseable, falls back to the formatter" if result is None else f"answered {answered}"
+            misses.append(f"  #{index} ({sample['agent']}): {reason}, expected {sample['expected_answered']}: {sample['output'][:60]!r}")
+        formatter_ms.append(sample["formatter_ms"])
+
+    total = len(samples)
+    fallbacks = total - parsed
+    print(f"{total} recorded FAQ/RAG outputs from {path}")
+    print(f"parsed locally: {parsed}/{total} ({parsed / total:.0%}), matches expected: {correct}/{total}")
+    for miss in misses:
+        print(miss)
+    print(f"local parse latency: p50 {statistics.median(parse_us):.1f} us, max {max(parse_us):.1f} us")
+    print(f"LLM formatter latency (recorded): p50 {statistics.median(formatter_ms):.0f} ms")
+    # With the normalizer only the unparseable outputs still pay for a formatter run.
+    before = sum(formatter_ms)
+    after = sum(ms for sample, ms in zip(samples, formatter_ms) if parse_answers(sample["output"], sample["questions"]) is None)
+    print(f"formatter time on the critical path: {before} ms -> {after} ms ({fallbacks} fallback runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the local JSON normalizer with the *_to_json formatter agents.")
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.fixtures, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
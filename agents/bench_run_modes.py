@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from azure.ai.agents.models import AsyncFunctionTool, MessageRole
+
+from fake_foundry import FAKE_AGENT_IDS, FakeProjectClient
+from run_executor import poll_run, stream_run
+
+MESSAGES = {
+    "triage": "ID: 1\nFrom: a@contoso.com\nTo: support@contoso.com\nSubject: Questions\n\nWhich regions support Agent Service? How does file search work?",
+    "faq": "Ab12Cd: Which regions support Agent Service?",
+    "rag": "Ef34Gh: How does file search work?",
+    "reply": "Please compose a response email using the following answers:\nQ: Which regions support Agent Service?\nA: East US, West US and Sweden Central.\n\nQ: How does file search work?\nA: It indexes uploaded files into a vector store.\n\n",
+}
+
+
+def query_knowledgebase_batch(questions: list[str]) -> str:
+    # Stand-in for cqa_batch_tool.query_knowledgebase_batch, so FAQ runs stop at requires_action.
+    return json.dumps({"answers": [{"question": question, "answer": None, "confidenceScore": 0.0} for question in questions]})
+
+
+def faq_function_calls(history: list) -> list | None:
+    if history[-1]["role"] != "user":
+        return None
+    return [{"name": "query_knowledgebase_batch", "arguments": {"questions": [history[-1]["content"].split(": ", 1)[-1]]}}]
+
+
+async def run_once(agents, stage: str, mode: str, functions, polling_interval: float) -> dict:
+    thread = await agents.threads.create()
+    await agents.messages.create(thread_id=thread.id, role=MessageRole.USER, content=MESSAGES[stage])
+    calls = agents.thread_calls[thread.id]
+    start = time.perf_counter()
+    agent_id = FAKE_AGENT_IDS[stage]
+    if mode == "create_and_process":
+        await agents.runs.create_and_process(thread_id=thread.id, agent_id=agent_id, polling_interval=polling_interval)
+        await agents.messages.get_last_message_by_role(thread_id=thread.id, role=MessageRole.AGENT)
+        ttft = None
+    elif mode == "poll":
+        await poll_run(agents, thread.id, agent_id, functions)
+        await agents.messages.get_last_message_by_role(thread_id=thread.id, role=MessageRole.AGENT)
+        ttft = None
+    else:
+        outcome = await stream_run(agents, thread.id, agent_id, functions)
+        ttft = outcome.ttft
+    total = time.perf_counter() - start
+    # Without a stream the first text is only visible once the final message is fetched.
+    return {"ttft": ttft if ttft is not None else total, "total": total, "requests": agents.thread_calls[thread.id] - calls}
+
+
+async def bench(repeat: int, speed: float, rtt: float, polling_interval: float) -> dict:
+    functions = AsyncFunctionTool({query_knowledgebase_batch})
+    async with FakeProjectClient(speed=speed, rtt=rtt, function_calls={FAKE_AGENT_IDS["faq"]: faq_function_calls}) as project_client:
+        agents = project_client.agents
+        agents.enable_auto_function_calls({query_knowledgebase_batch})
+        results = {}
+        for stage in MESSAGES:
+            for mode in ("create_and_process", "poll", "stream"):
+                await run_once(agents, stage, mode, functions, polling_interval)  # warm-up; adaptive polling learns run times
+                runs = await asyncio.gather(*(run_once(agents, stage, mode, functions, polling_interval) for _ in range(repeat)))
+                results[(stage, mode)] = {
+                    key: statistics.median(run[key] for run in runs) for key in ("ttft", "total", "requests")
+                }
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare streamed and polled agent runs against the fake Foundry.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--speed", type=float, default=0.5, help="scale the fake's simulated model latency")
+    parser.add_argument("--rtt", type=float, default=0.03, help="simulated round trip per HTTP request, seconds")
+    parser.add_argument("--polling-interval", type=float, default=1.0, help="create_and_process polling interval (SDK default 1s)")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args.repeat, args.speed, args.rtt, args.polling_interval))
+    print(f"median of {args.repeat} runs per cell, rtt {args.rtt * 1000:.0f} ms, model latency x{args.speed}; FAQ runs make one function tool call")
+    print(f"{'agent':<8} {'mode':<20} {'first text':>11} {'complete':>9} {'requests':>9}")
+    for (stage, mode), row in results.items():
+        print(f"{stage:<8} {mode:<20} {row['ttft'] * 1000:>8.0f} ms {row['total'] * 1000:>6.0f} ms {row['requests']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import random
+import time
+
+from bench_faq_index import percentile
+from fake_foundry import FAKE_KB
+from pipeline import open_pipeline
+from speculate import ANSWER_MODES
+
+# Questions the fake FAQ agent answers (its KB) and ones only RAG can answer.
+FAQ_QUESTIONS = [question for _, questions, _ in FAKE_KB for question in questions]
+RAG_QUESTIONS = [
+    "How does file search work?",
+    "How do I connect a SharePoint site?",
+    "Can an agent call my own REST API?",
+    "How are threads stored?",
+    "Does Agent Service support private networking?",
+]
+
+
+def make_emails(count: int, faq_share: float, rng: random.Random) -> list[dict]:
+    emails = []
+    for number in range(count):
+        questions = [rng.choice(FAQ_QUESTIONS if rng.random() < faq_share else RAG_QUESTIONS) for _ in range(rng.randint(1, 3))]
+        emails.append({"id": f"spec-{number}", "from": "a@contoso.com", "to": "support@contoso.com", "subject": "Questions", "body": " ".join(questions)})
+    return emails
+
+
+async def run(mode: str, emails: list, concurrency: int, speed: float, options: dict) -> dict:
+    # Emails concurrency at a time through one pipeline; latency is per email, tokens include cancelled runs.
+    latency, tokens = [], 0
+    limit = asyncio.Semaphore(concurrency)
+    async with open_pipeline(True, speed, fake_options=options, answer_mode=mode) as pipeline:
+        async def process(email: dict):
+            nonlocal tokens
+            async with limit:
+                start = time.perf_counter()
+                result = await pipeline.process(email)
+                latency.append(time.perf_counter() - start)
+                tokens += sum(result["usage"].values())
+
+        await asyncio.gather(*map(process, emails))
+        scheduler = pipeline.client.scheduler.snapshot()
+        speculation = pipeline.speculation.snapshot() if pipeline.speculation else {}
+    return {
+        "p50": percentile(latency, 50),
+        "p95": percentile(latency, 95),
+        "tokens": tokens,
+        "rag_runs": scheduler.get("gpt-4.1", {}).get("dispatched", 0) + scheduler.get("gpt-4.1", {}).get("cancelled", 0),
+        "cancelled": speculation.get("runs_cancelled", 0),
+        "wasted_tokens": speculation.get("wasted_tokens", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare answering FAQ and RAG together, sequentially and speculatively against the fake Foundry.")
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--faq-share", type=float, default=0.7, help="share of questions the FAQ knowledge base answers")
+    parser.add_argument("--concurrency", type=int, default=20, help="emails in flight at once")
+    parser.add_argument("--speed", type=float, default=0.2, help="scale the fake's simulated latency")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    emails = make_emails(args.emails, args.faq_share, random.Random(args.seed))
+    options = {"jitter": args.jitter, "seed": args.seed}
+    results = {mode: asyncio.run(run(mode, emails, args.concurrency, args.speed, options)) for mode in ANSWER_MODES}
+
+    print(f"{args.emails} emails, {args.faq_share:.0%} of questions in the FAQ KB, {args.concurrency} in flight, speed {args.speed}")
+    print(f"{'mode':<12} {'p50':>8} {'p95':>8} {'tokens':>8} {'RAG runs':>9} {'cancelled':>10} {'wasted tok':>11}")
+    for mode, r in results.items():
+        print(f"{mode:<12} {r['p50']:>7.2f}s {r['p95']:>7.2f}s {r['tokens']:>8} {r['rag_runs']:>9} {r['cancelled']:>10} {r['wasted_tokens']:>11}")
+    speculative = results["speculative"]
+    for baseline in ("sequential", "both"):
+        base = results[baseline]
+        change = {key: (speculative[key] - base[key]) / base[key] for key in ("p95", "p50", "tokens")}
+        print(f"speculative vs {baseline}: p95 {change['p95']:+.1%}, p50 {change['p50']:+.1%}, tokens {change['tokens']:+.1%}")
+
+
+if __name__ == "__main__":
+    main()
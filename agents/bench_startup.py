@@ -0,0 +1,105 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# What each entry point imports before it does any work.
+IMPORTS = {
+    "cli.py": "import cli",
+    "cli.py check / provision.py": "import provision",
+    "triage_agent.py": "import triage_agent",
+    "faq_agent.py": "import faq_agent",
+    "pipeline.py / batch.py": "import batch",
+    # What every agent script imported at load before the imports were deferred.
+    "Azure SDK (old eager imports)": "import azure.identity, azure.ai.projects, azure.ai.agents.models",
+}
+# Commands that finish without calling Azure, timed end to end.
+COMMANDS = {
+    "cli.py --help": ["cli.py", "--help"],
+    "cli.py check": ["cli.py", "check"],
+    "provision.py --dry-run": ["provision.py", "--dry-run"],
+}
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_times(statement: str) -> tuple[float, Counter]:
+    # -X importtime breakdown: total seconds and seconds per top-level package (self time, so a
+    # package's dependencies are counted under their own name).
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=HERE, capture_output=True, text=True, check=True)
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            packages[match.group(4).split(".")[0]] += int(match.group(1)) / 1e6
+    return sum(packages.values()), packages
+
+
+def wall_time(args: list, env: dict, cwd: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(HERE, args[0]), *args[1:]], cwd=cwd, env=env, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time (-X importtime) and startup time of the agent scripts and cli.py.")
+    parser.add_argument("--runs", type=int, default=5, help="runs per measurement; the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="heaviest packages to list per entry point")
+    parser.add_argument("--credential", action="store_true", help="also time getting a Foundry token: the full credential chain vs. the cached credential (needs an Azure login)")
+    args = parser.parse_args()
+
+    import_times("import cli")  # compile the .pyc files first
+    print(f"{'entry point':<32} {'imports':>9}  heaviest packages (self time)")
+    for name, statement in IMPORTS.items():
+        runs = [import_times(statement) for _ in range(args.runs)]
+        total = statistics.median(total for total, _ in runs)
+        packages = runs[-1][1]
+        heaviest = ", ".join(f"{package} {seconds * 1000:.0f}ms" for package, seconds in packages.most_common(args.top))
+        print(f"{name:<32} {total * 1000:>7.0f}ms  {heaviest}")
+
+    print()
+    # A throwaway working directory: no .agents.json or .env, so nothing is provisioned or called.
+    with tempfile.TemporaryDirectory() as cwd:
+        env = {**os.environ, "PROJECT_ENDPOINT": "https://example.services.ai.azure.com/api/projects/bench"}
+        for name, command in COMMANDS.items():
+            seconds = statistics.median(wall_time(command, env, cwd) for _ in range(args.runs))
+            print(f"{name:<32} {seconds * 1000:>7.0f}ms wall")
+
+    if args.credential:
+        from azure.identity import DefaultAzureCredential
+        from credential import CachedCredential
+        from cli import FOUNDRY_SCOPE
+
+        print()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tokens.json")
+            timings = {}
+            start = time.perf_counter()
+            with DefaultAzureCredential() as chain:
+                chain.get_token(FOUNDRY_SCOPE)
+            timings["DefaultAzureCredential"] = time.perf_counter() - start
+            for name in ("cached credential, first run", "cached credential, token cached"):
+                start = time.perf_counter()
+                with CachedCredential(path) as credential:
+                    credential.get_token(FOUNDRY_SCOPE)
+                timings[name] = time.perf_counter() - start
+            # Token gone but link remembered: only that link is asked.
+            store = CachedCredential(path).store
+            store.tokens = {}
+            store.save()
+            start = time.perf_counter()
+            with CachedCredential(path) as credential:
+                credential.get_token(FOUNDRY_SCOPE)
+            timings[f"remembered link ({store.link})"] = time.perf_counter() - start
+        for name, seconds in timings.items():
+            print(f"{name:<32} {seconds * 1000:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from batch import run_batch
+from fake_foundry import FakeProjectClient
+from pipeline import STAGE_MODULES, AgentRunError, open_pipeline
+from provision import AGENT_MODULES, provision
+from registry import AgentRegistry
+from simulate_throttling import write_emails
+
+RESULTS_DIR = "bench-results"
+BENCH_ENDPOINT = "https://bench.services.ai.azure.com/api/projects/fake"
+# Metrics where a larger value is better; for everything else (seconds, requests, tokens) smaller is better.
+HIGHER_IS_BETTER = ("emails_per_minute", "hit_rate")
+
+
+def git_commit() -> tuple[str, bool]:
+    # (short commit hash, whether the working tree has uncommitted changes)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def percentiles(values: list[float]) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    return {"p50": round(statistics.median(ordered), 4), "p95": round(pick(0.95), 4), "max": round(ordered[-1], 4)}
+
+
+async def bench_provision(speed: float, options: dict) -> dict:
+    # All agents in provision.AGENT_MODULES: first creation, a rerun with nothing changed, and --force updates.
+    agent_stages = {module.AGENT_NAME: stage for stage, module in STAGE_MODULES.items()}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        registry = AgentRegistry(os.path.join(tmp, ".agents.json"))
+        async with FakeProjectClient(speed=speed, agent_stages=agent_stages, **options) as client:
+            for name, force in (("create", False), ("unchanged", False), ("force_update", True)):
+                calls = client.agents.calls
+                start = time.perf_counter()
+                ok = await provision(AGENT_MODULES, force=force, client=client, endpoint=BENCH_ENDPOINT, registry=registry, env_path=os.path.join(tmp, ".env"))
+                if not ok:
+                    raise RuntimeError(f"Provisioning ({name}) failed against the fake.")
+                results[name] = {"seconds": round(time.perf_counter() - start, 4), "requests": client.agents.calls - calls}
+    results["agents"] = len(AGENT_MODULES)
+    return results
+
+
+async def bench_single_email(emails: list, speed: float, options: dict, mode: str) -> dict:
+    # Emails one at a time through one pipeline, like the interactive path; the first one warms it up.
+    latencies, errors, tokens = [], 0, []
+    async with open_pipeline(True, speed, mode=mode, fake_options=options) as pipeline:
+        # A failed warm-up is not counted; the email is timed again below.
+        with contextlib.suppress(AgentRunError):
+            await pipeline.process(emails[0])
+        for email in emails:
+            start = time.perf_counter()
+            try:
+                result = await pipeline.process(email)
+            except AgentRunError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            tokens.append(sum(result["usage"].values()))
+    return {
+        "emails": len(emails),
+        "errors": errors,
+        "latency": percentiles(latencies),
+        "tokens_per_email": round(statistics.mean(tokens), 1) if tokens else 0.0,
+    }
+
+
+async def bench_bulk(count: int, speed: float, options: dict, rng: random.Random) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        emails_path, results_path = os.path.join(tmp, "emails.jsonl"), os.path.join(tmp, "results.jsonl")
+        write_emails(emails_path, count, rng)
+        summary = await run_batch(emails_path, results_path, fake=True, speed=speed, fake_options=options)
+    return {
+        "emails": summary["processed"],
+        "errors": summary["error"],
+        "seconds": round(summary["elapsed"], 4),
+        "emails_per_minute": round(summary["emails_per_minute"], 1),
+        "latency": {"p50": round(summary["p50"], 4), "p95": round(summary["p95"], 4)},
+        "tokens": sum(stats["tokens"] for stats in summary["scheduler"].values()),
+        "thread_pool_hit_rate": summary["threads"]["hit_rate"],
+        "agent_p99": {name: row["p99"] for name, row in summary["spans"].items() if "runs" in row and name != "email"},
+    }
+
+
+async def run_suite(args) -> dict:
+    rng = random.Random(args.seed)
+    options = {"rtt": args.rtt, "jitter": args.jitter, "failure_rate": args.failure_rate, "malformed_rate": args.malformed_rate, "seed": args.seed}
+    results = {}
+    if "provision" in args.only:
+        results["provision"] = await bench_provision(args.speed, options)
+    if "single" in args.only:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "emails.jsonl")
+            write_emails(path, args.emails, rng)
+            with open(path, "r", encoding="utf-8") as f:
+                emails = [json.loads(line) for line in f]
+        results["single_email"] = await bench_single_email(emails, args.speed, options, args.mode)
+    if "bulk" in args.only:
+        results["bulk"] = await bench_bulk(args.bulk, args.speed, options, rng)
+    return results
+
+
+def flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        return {k: v for key, item in value.items() for k, v in flatten(item, f"{prefix}{key}.").items()}
+    return {prefix.rstrip("."): value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(previous: dict, current: dict, threshold: float) -> bool:
+    # Prints every metric side by side; returns False if any got worse by more than threshold (a fraction).
+    old, new = flatten(previous["results"]), flatten(current["results"])
+    ok = True
+    print(f"{'metric':<40} {previous['commit']:>12} {current['commit']:>12} {'change':>8}")
+    for key in new:
+        if key not in old:
+            continue
+        change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        flag = "  worse" if worse > threshold else ""
+        ok = ok and not flag
+        print(f"{key:<40} {old[key]:>12} {new[key]:>12} {change:>+8.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark provisioning, single-email latency and bulk throughput against the fake Foundry.")
+    parser.add_argument("--only", nargs="+", choices=["provision", "single", "bulk"], default=["provision", "single", "bulk"])
+    parser.add_argument("--emails", type=int, default=20, help="emails for the single-email latency benchmark")
+    parser.add_argument("--bulk", type=int, default=200, help="emails for the bulk throughput benchmark")
+    parser.add_argument("--speed", type=float, default=0.05, help="scale the fake's simulated latency")
+    parser.add_argument("--rtt", type=float, default=0.01, help="simulated round trip per HTTP request, seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="random +/- variation of each run's model time (fraction)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of runs that fail with server_error")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of triage/FAQ/RAG outputs that are malformed")
+    parser.add_argument("--mode", choices=["stream", "poll"], default="stream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help=f"JSON results file (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="with --compare, exit 1 if a metric is this much worse")
+    args = parser.parse_args()
+
+    # A local FAQ export or RAG cache would answer questions without runs and skew the numbers.
+    for key in ("FAQ_KB_PATH", "RAG_CACHE_PATH"):
+        os.environ.pop(key, None)
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit + ("-dirty" if dirty else ""),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {key: getattr(args, key) for key in ("emails", "bulk", "speed", "rtt", "jitter", "failure_rate", "mode", "seed")},
+        "results": asyncio.run(run_suite(args)),
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(json.dumps(report["results"], indent=2))
+    print(f"results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("config") != report["config"]:
+            print("warning: the two runs used different settings", file=sys.stderr)
+        if not compare(previous, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
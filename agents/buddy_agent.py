@@ -1,7 +1,16 @@
+from __future__ import annotations
+
+import argparse
 import os
+import sys
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from azure.identity import DefaultAzureCredential
-from azure.ai.projects import AIProjectClient
+
+from credential import CachedCredential
+from registry import ensure_agent
+
+if TYPE_CHECKING:
+    from azure.ai.projects import AIProjectClient
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,40 +30,17 @@ def get_project_endpoint() -> str:
 
 
 def create_project_client(endpoint: str) -> AIProjectClient:
-    return AIProjectClient(endpoint=endpoint, credential=DefaultAzureCredential())
-
+    from azure.ai.projects import AIProjectClient
 
-def create_agent(client: AIProjectClient):
-    agent = client.agents.create_agent(
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        instructions=INSTRUCTIONS
-    )
-    with open(".env", "a") as f:
-        f.write(f"\n{AGENT_ENV_KEY}={agent.id}")
-    return agent
-
-
-def update_agent(client: AIProjectClient, agent_id: str):
-    return client.agents.update_agent(
-        agent_id=agent_id,
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        instructions=INSTRUCTIONS
-    )
+    return AIProjectClient(endpoint=endpoint, credential=CachedCredential())
 
 
 def main():
-    endpoint = get_project_endpoint()
-    client = create_project_client(endpoint)
-
-    agent_id = os.getenv(AGENT_ENV_KEY)
-    if not agent_id:
-        agent = create_agent(client)
-    else:
-        agent = update_agent(client, agent_id)
-
-    print(f"{AGENT_NAME} ready with ID: {agent.id}")
+    parser = argparse.ArgumentParser(description=f"Create or update the {AGENT_NAME}.")
+    parser.add_argument("--force", action="store_true", help="update the agent even if its definition is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="show which fields would change, without calling Azure")
+    args = parser.parse_args()
+    ensure_agent(sys.modules[__name__], get_project_endpoint(), create_project_client, force=args.force, dry_run=args.dry_run)
 
 
 if __name__ == "__main__":
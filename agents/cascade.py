@@ -0,0 +1,87 @@
+import json
+import os
+import re
+
+import rag_agent_mini
+import reply_agent_mini
+from json_normalizer import DONT_KNOW
+
+# Pipeline stage -> its cheaper twin. With a cascade, the twin runs first (as stage "<stage>_mini")
+# and the full agent only runs when the twin's output fails the stage's confidence check.
+MINI_MODULES = {"rag": rag_agent_mini, "reply": reply_agent_mini}
+# Per-stage checks; override with CASCADE_THRESHOLDS='{"rag": {"min_citations": 2}}'.
+#   min_citations: fewer URL citations than this escalates
+#   min_chars: shorter output than this escalates
+#   html: output without an HTML element escalates
+# "I don't know" answers and output that doesn't parse always escalate.
+DEFAULT_THRESHOLDS = {
+    "rag": {"min_citations": 1, "min_chars": 0, "html": False},
+    "reply": {"min_citations": 0, "min_chars": 80, "html": True},
+}
+_HTML_TAG = re.compile(r"<(p|div|ul|ol|li|br|table|html|body)\b", re.IGNORECASE)
+
+
+def mini_stage(stage: str) -> str:
+    return f"{stage}_mini"
+
+
+def load_thresholds() -> dict:
+    thresholds = {stage: dict(values) for stage, values in DEFAULT_THRESHOLDS.items()}
+    for stage, values in json.loads(os.getenv("CASCADE_THRESHOLDS", "{}")).items():
+        if stage not in thresholds:
+            raise ValueError(f"CASCADE_THRESHOLDS: no mini twin for stage {stage!r} (choose from {', '.join(thresholds)}).")
+        thresholds[stage].update(values)
+    return thresholds
+
+
+class Cascade:
+    # Confidence checks for the twins' output, and per-stage counts of how often they were good enough.
+    def __init__(self, thresholds: dict | None = None):
+        self.thresholds = thresholds or load_thresholds()
+        self.stages = {stage: {"runs": 0, "escalated": 0, "reasons": {}, "mini_seconds": 0.0, "full_runs": 0, "full_seconds": 0.0} for stage in self.thresholds}
+
+    def check(self, stage: str, text: str | None, citations: list = (), valid: bool = True) -> str | None:
+        # None if the twin's output can be used, otherwise why not.
+        limits = self.thresholds[stage]
+        if not valid:
+            return "invalid"
+        if not text or DONT_KNOW.search(text):
+            return "unknown"
+        if len(citations) < limits.get("min_citations", 0):
+            return "citations"
+        if len(text) < limits.get("min_chars", 0):
+            return "short"
+        if limits.get("html") and not _HTML_TAG.search(text):
+            return "invalid"
+        return None
+
+    def record(self, stage: str, mini_seconds: float, reason: str | None, full_seconds: float | None = None):
+        stats = self.stages[stage]
+        stats["runs"] += 1
+        stats["mini_seconds"] += mini_seconds
+        if reason is not None:
+            stats["escalated"] += 1
+            stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+        if full_seconds is not None:
+            stats["full_runs"] += 1
+            stats["full_seconds"] += full_seconds
+
+    def snapshot(self) -> dict:
+        # saved: seconds the accepted twin runs saved against the full agent's mean run time (measured on
+        # escalations), less the time spent on twin runs that were escalated. None until a full run was seen.
+        snapshot = {}
+        for stage, stats in self.stages.items():
+            if not stats["runs"]:
+                continue
+            full_mean = stats["full_seconds"] / stats["full_runs"] if stats["full_runs"] else None
+            accepted = stats["runs"] - stats["escalated"]
+            snapshot[stage] = {
+                "runs": stats["runs"],
+                "escalated": stats["escalated"],
+                "escalation_rate": round(stats["escalated"] / stats["runs"], 3),
+                "reasons": dict(stats["reasons"]),
+                "mini_mean": round(stats["mini_seconds"] / stats["runs"], 4),
+                "full_mean": round(full_mean, 4) if full_mean is not None else None,
+                "saved": round(accepted * full_mean - stats["mini_seconds"], 3) if full_mean is not None else None,
+            }
+        return snapshot
@@ -0,0 +1,556 @@
+import argparse
+import asyncio
+import gzip
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import HttpResponseError, ResponseNotReadError, StreamClosedError, StreamConsumedError
+from azure.core.pipeline.transport import AsyncHttpTransport
+from azure.core.rest import AsyncHttpResponse
+from azure.core.utils import CaseInsensitiveDict
+
+from registry import atomic_write
+
+CASSETTE_VERSION = 1
+REDACTED = "REDACTED"
+# Query parameters and JSON fields whose values are never written to a cassette.
+SECRET_PARAMS = ("sig", "api-key", "subscription-key", "code")
+SECRET_FIELDS = ("connection_id", "connectionId", "api_key", "apiKey")
+# Response headers kept for replay; request IDs, cookies and the like are dropped.
+KEPT_HEADERS = ("content-type", "retry-after", "retry-after-ms", "x-ratelimit-remaining-requests", "x-ratelimit-remaining-tokens")
+# Host used for the client in replay mode; nothing is sent to it.
+REPLAY_HOST = "https://replay.invalid"
+
+_SIG = re.compile(r"([?&](?:sig|api-key|subscription-key|code)=)[^&\s\"'#]+", re.IGNORECASE)
+# Connection IDs are ARM resource IDs; everything but the provider and connection name is scrubbed.
+_CONNECTION_ID = re.compile(
+    r"/subscriptions/[^/\s\"']+/resourceGroups/[^/\s\"']+/providers/([^/\s\"']+)/accounts/[^/\s\"']+/projects/[^/\s\"']+/connections/",
+    re.IGNORECASE,
+)
+_THREAD_ID = re.compile(r"thread_[A-Za-z0-9]+")
+
+
+class CassetteMissError(LookupError):
+    pass
+
+
+def redact_text(text: str) -> str:
+    text = _SIG.sub(rf"\1{REDACTED}", text)
+    return _CONNECTION_ID.sub(
+        rf"/subscriptions/{REDACTED}/resourceGroups/{REDACTED}/providers/\1/accounts/{REDACTED}/projects/{REDACTED}/connections/", text
+    )
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {key: REDACTED if key in SECRET_FIELDS and item else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+def redact_query(query: str) -> str:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(key, REDACTED if key.lower() in SECRET_PARAMS else value) for key, value in pairs])
+
+
+def parse_body(content) -> object:
+    # Request/response body as redacted JSON, or redacted text if it isn't JSON.
+    if content is None or content in (b"", ""):
+        return None
+    if isinstance(content, (bytes, bytearray)):
+        content = bytes(content).decode("utf-8", errors="replace")
+    if not isinstance(content, str):
+        return "<stream>"  # file uploads are not recorded
+    try:
+        return redact(json.loads(content))
+    except ValueError:
+        return redact_text(content)
+
+
+def _request_record(service: str, method: str, url: str, body) -> dict:
+    parts = urlsplit(url)
+    return {"service": service, "method": method.upper(), "path": parts.path, "query": redact_query(parts.query), "body": parse_body(body)}
+
+
+def _kept_headers(headers) -> dict:
+    return {key.lower(): value for key, value in headers.items() if key.lower() in KEPT_HEADERS}
+
+
+def _split_events(buffer: str) -> tuple[list[str], str]:
+    # Complete server-sent events (each ending in a blank line) and the incomplete rest.
+    *events, rest = buffer.split("\n\n")
+    return [event + "\n\n" for event in events], rest
+
+
+class Cassette:
+    # Recorded HTTP interactions: a header line ({"meta": ...}), then one interaction per line.
+    # Paths ending in .gz are gzip-compressed.
+    def __init__(self, path: str, meta: dict | None = None, clock=time.monotonic):
+        self.path = path
+        self.meta = meta or {}
+        self.interactions = []
+        self.clock = clock
+        self.started = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or "meta" not in lines[0]:
+            raise ValueError(f"{path} is not a cassette (missing header line).")
+        if lines[0].get("version") != CASSETTE_VERSION:
+            raise ValueError(f"{path} has cassette version {lines[0].get('version')}, expected {CASSETTE_VERSION}.")
+        cassette = cls(path, lines[0]["meta"])
+        cassette.interactions = lines[1:]
+        return cassette
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def add(self, interaction: dict):
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def save(self):
+        interactions = sorted(self.interactions, key=lambda interaction: interaction["t"])
+        header = {"version": CASSETTE_VERSION, "meta": {**self.meta, "saved_at": datetime.now(timezone.utc).isoformat()}}
+        text = "".join(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n" for line in [header, *interactions])
+        data = text.encode("utf-8")
+        atomic_write(self.path, gzip.compress(data) if self.path.endswith(".gz") else data)
+
+
+class _ReplayResponse(AsyncHttpResponse):
+    # An azure.core.rest response whose body is content, or comes from chunks (an async iterator of recorded
+    # events or of a relayed stream). inner is the relayed response, closed with this one.
+    def __init__(self, request, status_code: int, headers: dict, chunks, content: bytes | None = None, inner=None):
+        self._request = request
+        self._status_code = status_code
+        self._headers = CaseInsensitiveDict(headers)
+        self._chunks = chunks
+        self._content = content
+        self._inner = inner
+        self._encoding = None
+        self._closed = False
+        self._consumed = False
+
+    @property
+    def request(self):
+        return self._request
+
+    @property
+    def status_code(self) -> int:
+        return self._status_code
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @property
+    def reason(self) -> str:
+        return ""
+
+    @property
+    def content_type(self) -> str | None:
+        return self._headers.get("content-type")
+
+    @property
+    def url(self) -> str:
+        return self._request.url
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    @property
+    def is_stream_consumed(self) -> bool:
+        return self._consumed
+
+    @property
+    def encoding(self) -> str | None:
+        return self._encoding
+
+    @encoding.setter
+    def encoding(self, value: str | None):
+        self._encoding = value
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            raise ResponseNotReadError(self)
+        return self._content
+
+    def text(self, encoding: str | None = None) -> str:
+        return self.content.decode(encoding or self._encoding or "utf-8")
+
+    def json(self):
+        return json.loads(self.text())
+
+    def raise_for_status(self):
+        if self._status_code >= 400:
+            raise HttpResponseError(response=self)
+
+    async def read(self) -> bytes:
+        if self._content is None:
+            self._content = b"".join([chunk async for chunk in self.iter_bytes()])
+        return self._content
+
+    async def iter_raw(self, **kwargs):
+        async for chunk in self.iter_bytes(**kwargs):
+            yield chunk
+
+    async def iter_bytes(self, **kwargs):
+        if self._content is not None:
+            yield self._content
+            return
+        if self._consumed:
+            raise StreamConsumedError(self)
+        if self._closed:
+            raise StreamClosedError(self)
+        self._consumed = True
+        try:
+            async for chunk in self._chunks:
+                yield chunk
+        finally:
+            await self.close()
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            if self._inner is not None:
+                await self._inner.close()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class RecordingTransport(AsyncHttpTransport):
+    # Sends every request through inner (aiohttp by default) and records the redacted exchange.
+    # Streamed responses (runs.stream) are relayed as they arrive and stored event by event with their offsets.
+    def __init__(self, cassette: Cassette, inner: AsyncHttpTransport | None = None):
+        if inner is None:
+            from azure.core.pipeline.transport import AioHttpTransport
+            inner = AioHttpTransport()
+        self.cassette = cassette
+        self.inner = inner
+
+    async def __aenter__(self):
+        await self.inner.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.inner.__aexit__(*exc_info)
+
+    async def open(self):
+        await self.inner.open()
+
+    async def close(self):
+        await self.inner.close()
+
+    async def send(self, request, **kwargs):
+        t = self.cassette.elapsed()
+        response = await self.inner.send(request, **kwargs)
+        interaction = {
+            "t": round(t, 4),
+            **_request_record("agents", request.method, request.url, request.content),
+            "status": response.status_code,
+            "headers": _kept_headers(response.headers),
+            "elapsed": round(self.cassette.elapsed() - t, 4),
+        }
+        if not kwargs.get("stream"):
+            interaction["response"] = parse_body(response.content)
+            self.cassette.add(interaction)
+            return response
+        chunks = self._relay(response, interaction, t)
+        return _ReplayResponse(request, response.status_code, dict(response.headers), chunks, inner=response)
+
+    async def _relay(self, response, interaction: dict, t: float):
+        events, buffer = [], ""
+        try:
+            async for chunk in response.iter_bytes():
+                yield chunk
+                complete, buffer = _split_events(buffer + chunk.decode("utf-8", errors="replace"))
+                offset = round(self.cassette.elapsed() - t, 4)
+                events.extend([offset, redact_text(event)] for event in complete)
+        finally:
+            if buffer:
+                events.append([round(self.cassette.elapsed() - t, 4), redact_text(buffer)])
+            interaction["events"] = events
+            self.cassette.add(interaction)
+
+
+class Replayer:
+    # Finds the recorded response for a request. Requests match on service, method, path, query and body.
+    #  - Thread IDs: a live thread is bound to the recorded thread whose requests it repeats, and its later
+    #    requests are rewritten to that thread, since a pooled thread may do different work than when it was
+    #    recorded. Adding a message doesn't settle which thread it is (FAQ and RAG get the same message),
+    #    so binding waits for the next request, usually the run with its agent ID.
+    #  - normalizers: regexes for values that differ on every run (e.g. question IDs). They are masked when
+    #    comparing bodies, and the recorded values are replaced with the live ones in replayed responses.
+    #  - GETs can repeat (polling). With timing, a GET returns the recorded response that matches how long the
+    #    run has been going; without timing, the last one, so runs finish at once.
+    def __init__(self, cassette: Cassette, timing: bool = True, speed: float = 1.0, normalizers: list | None = None, clock=time.monotonic):
+        self.cassette = cassette
+        self.timing = timing
+        self.speed = speed
+        self.normalizers = [re.compile(pattern) if isinstance(pattern, str) else pattern for pattern in normalizers or []]
+        self.clock = clock
+        self.used = set()
+        self.bindings = {}  # live thread ID -> recorded thread ID
+        self.bound = set()
+        self.pending = {}  # live thread ID -> steps taken before it was bound
+        self.aliases = {}  # recorded value -> live value
+        self.anchors = {}  # recorded thread ID -> (recorded time, replay time) of its last POST/DELETE
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._index = {}
+        self._thread_steps = {}  # recorded thread ID -> [(interaction number, step)] without GETs
+        for number, interaction in enumerate(cassette.interactions):
+            step = self._step(interaction)
+            self._index.setdefault(step[0], []).append(number)
+            threads = _THREAD_ID.findall(interaction["path"])
+            if threads and interaction["method"] != "GET":
+                self._thread_steps.setdefault(threads[0], []).append((number, step))
+
+    def _step(self, record: dict) -> tuple:
+        key = (record["service"], record["method"], _THREAD_ID.sub("thread_*", record["path"]), record["query"])
+        return key, json.dumps(self._mask(record["body"]), sort_keys=True)
+
+    def _strings(self, value):
+        if isinstance(value, dict):
+            for item in value.values():
+                yield from self._strings(item)
+        elif isinstance(value, list):
+            for item in value:
+                yield from self._strings(item)
+        elif isinstance(value, str):
+            yield value
+
+    def _mask(self, value):
+        if isinstance(value, dict):
+            return {key: self._mask(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._mask(item) for item in value]
+        if isinstance(value, str):
+            for pattern in self.normalizers:
+                value = pattern.sub("<>", value)
+        return value
+
+    def _tokens(self, value) -> list:
+        return [match for text in self._strings(value) for pattern in self.normalizers for match in pattern.findall(text)]
+
+    def _bind(self, live: str, recorded: str):
+        self.bindings[live] = recorded
+        self.bound.add(recorded)
+        steps = len(self.pending.pop(live, []))
+        self.used.update(number for number, _ in self._thread_steps.get(recorded, [])[:steps + 1])
+
+    def _match_unbound(self, live: str, record: dict) -> int | None:
+        # The first unbound recorded thread whose requests so far are the ones this live thread made.
+        history = self.pending.get(live, []) + [self._step(record)]
+        for recorded, steps in self._thread_steps.items():
+            if recorded in self.bound or len(steps) < len(history):
+                continue
+            if all(step == expected for (_, step), expected in zip(steps, history)):
+                self.stats["rebound"] += 1
+                number = steps[len(history) - 1][0]
+                if record["method"] == "POST" and record["path"].endswith("/messages"):
+                    self.pending[live] = history
+                else:
+                    self._bind(live, recorded)
+                return number
+        return None
+
+    def _pick_get(self, numbers: list, thread: str | None) -> int:
+        if not self.timing:
+            return numbers[-1]
+        anchor = self.anchors.get(thread)
+        if anchor is None:
+            return numbers[0]
+        recorded_t, replay_t = anchor
+        target = recorded_t + (self.clock() - replay_t) / self.speed
+        eligible = [number for number in numbers if self.cassette.interactions[number]["t"] <= target]
+        return eligible[-1] if eligible else numbers[0]
+
+    def _match_bound(self, record: dict, path: str) -> int | None:
+        key, body = self._step({**record, "path": path})
+        candidates = [n for n in self._index.get(key, []) if self.cassette.interactions[n]["path"] == path]
+        same_body = [n for n in candidates if self._step(self.cassette.interactions[n])[1] == body]
+        if record["method"] == "GET" and same_body:
+            self.stats["get"] += 1
+            return self._pick_get(same_body, (_THREAD_ID.findall(path) or [None])[0])
+        for numbers, kind in ((same_body, "exact"), (candidates, "loose")):
+            unused = [n for n in numbers if n not in self.used]
+            if unused:
+                self.stats[kind] += 1
+                self.used.add(unused[0])
+                return unused[0]
+        return None
+
+    def match(self, service: str, method: str, url: str, body) -> dict:
+        record = _request_record(service, method, url, body)
+        with self._lock:
+            path = _THREAD_ID.sub(lambda m: self.bindings.get(m.group(0), m.group(0)), record["path"])
+            threads = _THREAD_ID.findall(path)
+            if threads and threads[0] not in self.bindings:
+                number = self._match_unbound(threads[0], record)
+                if number is None:
+                    # The pipeline made a request that was never recorded for a fresh thread; take any unused one.
+                    key = self._step(record)[0]
+                    number = next((n for n in self._index.get(key, []) if n not in self.used
+                                   and _THREAD_ID.findall(self.cassette.interactions[n]["path"])[0] not in self.bound), None)
+                    if number is not None:
+                        self.stats["loose"] += 1
+                        self._bind(threads[0], _THREAD_ID.findall(self.cassette.interactions[number]["path"])[0])
+                        self.used.add(number)
+            else:
+                number = self._match_bound(record, path)
+            if number is None:
+                self.stats["missed"] += 1
+                raise CassetteMissError(f"No recorded response for {record['method']} {record['path']} ({service}).")
+
+            interaction = self.cassette.interactions[number]
+            recorded_threads = _THREAD_ID.findall(interaction["path"])
+            if record["method"] != "GET" and recorded_threads and recorded_threads[0] in self.bound:
+                self.anchors[recorded_threads[0]] = (interaction["t"], self.clock())
+            for recorded, live in zip(self._tokens(interaction["body"]), self._tokens(record["body"])):
+                if recorded != live:
+                    self.aliases[recorded] = live
+            return interaction
+
+    def rewrite(self, text: str) -> str:
+        for recorded, live in self.aliases.items():
+            text = text.replace(recorded, live)
+        return text
+
+    def response_bytes(self, interaction: dict) -> bytes:
+        body = interaction.get("response")
+        if body is None:
+            return b""
+        text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+        return self.rewrite(text).encode("utf-8")
+
+    def delay(self, seconds: float) -> float:
+        return seconds * self.speed if self.timing else 0.0
+
+
+class ReplayTransport(AsyncHttpTransport):
+    # Serves AIProjectClient requests from a cassette; nothing goes over the network.
+    def __init__(self, replayer: Replayer):
+        self.replayer = replayer
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send(self, request, **kwargs):
+        interaction = self.replayer.match("agents", request.method, request.url, request.content)
+        if "events" not in interaction:
+            await asyncio.sleep(self.replayer.delay(interaction["elapsed"]))
+            content = self.replayer.response_bytes(interaction)
+            return _ReplayResponse(request, interaction["status"], interaction["headers"], _chunks([content]), content=content)
+        await asyncio.sleep(self.replayer.delay(interaction["elapsed"]))
+        return _ReplayResponse(request, interaction["status"], interaction["headers"], self._events(interaction))
+
+    async def _events(self, interaction: dict):
+        started = time.monotonic()
+        for offset, event in interaction["events"]:
+            wait = self.replayer.delay(offset) - (time.monotonic() - started) - self.replayer.delay(interaction["elapsed"])
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield self.replayer.rewrite(event).encode("utf-8")
+
+
+async def _chunks(chunks: list):
+    for chunk in chunks:
+        yield chunk
+
+
+class CassetteAdapter(HTTPAdapter):
+    # requests adapter for the local CQA tool (cqa_batch_tool.install_adapter): records through the
+    # network with a cassette, or answers from a replayer.
+    def __init__(self, cassette: Cassette | None = None, replayer: Replayer | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.replayer = replayer
+
+    def send(self, request, **kwargs):
+        if self.replayer is not None:
+            interaction = self.replayer.match("cqa", request.method, request.url, request.body)
+            time.sleep(self.replayer.delay(interaction["elapsed"]))
+            response = requests.Response()
+            response.status_code = interaction["status"]
+            response.headers = CaseInsensitiveDict(interaction["headers"])
+            response._content = self.replayer.response_bytes(interaction)
+            response.encoding = "utf-8"
+            response.url = request.url
+            response.request = request
+            return response
+
+        t = self.cassette.elapsed()
+        response = super().send(request, **kwargs)
+        self.cassette.add({
+            "t": round(t, 4),
+            **_request_record("cqa", request.method, request.url, request.body),
+            "status": response.status_code,
+            "headers": _kept_headers(response.headers),
+            "elapsed": round(self.cassette.elapsed() - t, 4),
+            "response": parse_body(response.content),
+        })
+        return response
+
+
+class ReplayCredential:
+    # Stands in for DefaultAzureCredential when replaying; the token is never sent anywhere.
+    async def get_token(self, *scopes, **kwargs) -> AccessToken:
+        return AccessToken("replay", int(time.time()) + 3600)
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def _path_template(path: str) -> str:
+    return re.sub(r"/(thread|run|msg|step|asst|call)_[A-Za-z0-9]+", r"/{\1}", path)
+
+
+def describe(cassette: Cassette) -> dict:
+    requests_by_kind = Counter(f"{i['service']} {i['method']} {_path_template(i['path'])}" for i in cassette.interactions)
+    duration = max((i["t"] + i["elapsed"] + (i["events"][-1][0] if i.get("events") else 0) for i in cassette.interactions), default=0.0)
+    return {"meta": cassette.meta, "interactions": len(cassette.interactions), "duration": round(duration, 2), "requests": dict(requests_by_kind.most_common())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a recorded cassette (pipeline.py/batch.py --record).")
+    parser.add_argument("cassette")
+    args = parser.parse_args()
+    print(json.dumps(describe(Cassette.load(args.cassette)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import importlib
+import sys
+import time
+
+# Subcommands that run another script's main() with the remaining arguments. The script, and the
+# Azure SDK behind it, is only imported once its subcommand is chosen.
+SCRIPTS = {
+    "provision": ("provision", "create or update agents (provision.py)"),
+    "pipeline": ("pipeline", "run one email through the agents (pipeline.py)"),
+    "batch": ("batch", "run a JSONL file of emails through the agents (batch.py)"),
+    "faq-index": ("faq_index", "answer questions from the local FAQ export (faq_index.py)"),
+    "doc-index": ("doc_index", "build or search the internal docs index (doc_index.py)"),
+    "rag-cache": ("answer_cache", "inspect the RAG answer cache (answer_cache.py)"),
+    "cassette": ("cassette", "summarize a recorded cassette (cassette.py)"),
+}
+# Scope of the Foundry project APIs (AIProjectClient's default credential scope).
+FOUNDRY_SCOPE = "https://ai.azure.com/.default"
+
+
+def check(args) -> int:
+    # Which agents differ from what .agents.json recorded for this project; no Azure calls.
+    from fingerprint import agent_definition, changed_fields, fingerprint
+    from provision import get_project_endpoint, is_up_to_date, select_modules
+    from registry import AgentRegistry
+
+    endpoint = get_project_endpoint()
+    registry = AgentRegistry()
+    stale = 0
+    for module in select_modules(args.agents, args.cascade):
+        definition = agent_definition(module)
+        entry = registry.lookup(module.AGENT_ENV_KEY, endpoint)
+        if is_up_to_date(entry, fingerprint(definition)):
+            print(f"{module.AGENT_NAME}: up to date ({entry['agent_id']})")
+            continue
+        stale += 1
+        if entry is None:
+            print(f"{module.AGENT_NAME}: not provisioned")
+        else:
+            fields = changed_fields(entry.get("definition"), definition) if entry.get("definition") else ["(no recorded definition)"]
+            print(f"{module.AGENT_NAME}: changed: {', '.join(fields)} ({entry['agent_id']})")
+    return 1 if stale else 0
+
+
+def auth(args) -> int:
+    from azure.core.exceptions import ClientAuthenticationError
+    from credential import CachedCredential, TokenStore, default_token_cache_path
+
+    path = default_token_cache_path()
+    if args.clear:
+        TokenStore(path).clear()
+        print(f"Cleared {path}" if path else "The token cache is off")
+        return 0
+    start = time.perf_counter()
+    with CachedCredential() as credential:
+        try:
+            token = credential.get_token(args.scope)
+        except ClientAuthenticationError as e:
+            print(e.message, file=sys.stderr)
+            return 1
+        link = credential.store.link
+    print(f"Token for {args.scope} from {link or 'the credential chain'}, expires in {(token.expires_on - time.time()) / 60:.0f} min ({time.perf_counter() - start:.2f}s)")
+    print(f"Token cache: {path or 'off'}")
+    return 0
+
+
+def main(argv: list | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SCRIPTS:
+        module_name = SCRIPTS[argv[0]][0]
+        sys.argv = [f"{sys.argv[0]} {argv[0]}", *argv[1:]]
+        sys.exit(importlib.import_module(module_name).main())
+
+    parser = argparse.ArgumentParser(description="One entry point for the agent scripts; each subcommand imports only what it needs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check_parser = commands.add_parser("check", help="show which agents changed since they were provisioned, without calling Azure")
+    check_parser.add_argument("agents", nargs="*", metavar="AGENT_ENV_KEY", help="only check these agents")
+    check_parser.add_argument("--cascade", action="store_true", help="also check the mini twins")
+    check_parser.set_defaults(run=check)
+    auth_parser = commands.add_parser("auth", help="get (and cache) a token for the Foundry project, and show which credential gave it")
+    auth_parser.add_argument("--scope", default=FOUNDRY_SCOPE)
+    auth_parser.add_argument("--clear", action="store_true", help="delete the token cache and the remembered credential")
+    auth_parser.set_defaults(run=auth)
+    for name, (_, help_text) in SCRIPTS.items():
+        commands.add_parser(name, help=help_text, add_help=False)
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    sys.exit(args.run(args))
+
+
+if __name__ == "__main__":
+    main()
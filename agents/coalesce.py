@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from faq_index import normalize
+
+
+def coalesce_key(question: str) -> str:
+    # Only case, punctuation and whitespace don't change the key, so "How much does Agent Service
+    # cost?" and "how much does agent service cost" are answered once. Word order and every word count:
+    # "from East US to West US" and "from West US to East US", or "when" and "where", are different questions.
+    return normalize(question)
+
+
+class QuestionCoalescer:
+    # Single-flight for questions across emails: while one email's runs answer a question, other emails
+    # asking the same question wait for that answer instead of starting runs of their own. Only
+    # in-flight questions are shared; a finished answer is not kept.
+    def __init__(self):
+        self._inflight = {}
+        self.stats = {"questions": 0, "coalesced": 0, "saved_runs": 0}
+
+    async def run(self, question: str, answer: Callable[[], Awaitable[tuple[dict, int]]]) -> tuple[dict, bool]:
+        # answer() returns (answer, agent runs it took). Returns (answer, whether it was shared).
+        key = coalesce_key(question)
+        self.stats["questions"] += 1
+        task = self._inflight.get(key) if key else None
+        if task is not None:
+            self.stats["coalesced"] += 1
+            result, runs = await asyncio.shield(task)
+            self.stats["saved_runs"] += runs
+            return result, True
+        task = asyncio.ensure_future(answer())
+        if key:
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key) if self._inflight.get(key) is task else None)
+        # Shielded so a cancelled leader doesn't cancel the answer other emails are waiting for.
+        result, _ = await asyncio.shield(task)
+        return result, False
+
+    def snapshot(self) -> dict:
+        questions = self.stats["questions"]
+        return {**self.stats, "ratio": round(self.stats["coalesced"] / questions, 3) if questions else 0.0}
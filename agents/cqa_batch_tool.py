@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+# Same service, project and deployment as the OpenAPI spec in tools/cqa_tool.json.
+DEFAULT_CQA_ENDPOINT = "https://build-demo-language-resource.cognitiveservices.azure.com/language"
+PROJECT_NAME = "cqa-project"
+DEPLOYMENT_NAME = "production"
+API_VERSION = "2023-04-01"
+CONFIDENCE_SCORE_THRESHOLD = 0.6
+
+MAX_PARALLEL = int(os.getenv("CQA_MAX_PARALLEL", "8"))
+# (connect, read) timeout in seconds for each knowledge base query.
+TIMEOUT = (3.05, float(os.getenv("CQA_TIMEOUT", "10")))
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool() -> tuple[requests.Session, ThreadPoolExecutor]:
+    global _session, _executor
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _lock:
+        if _session is None:
+            # Keep-alive connections are reused across calls; one per worker.
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_PARALLEL))
+            _session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_PARALLEL))
+            _executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL, thread_name_prefix="cqa")
+    return _session, _executor
+
+
+def install_adapter(adapter: HTTPAdapter):
+    # Routes knowledge base queries through adapter, e.g. cassette.CassetteAdapter to record or replay them.
+    session, _ = _pool()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def _query_one(session: requests.Session, endpoint: str, key: str, question: str) -> dict:
+    import requests
+
+    try:
+        response = session.post(
+            f"{endpoint.rstrip('/')}/:query-knowledgebases",
+            params={"projectName": PROJECT_NAME, "deploymentName": DEPLOYMENT_NAME, "api-version": API_VERSION},
+            headers={"Ocp-Apim-Subscription-Key": key},
+            json={"question": question, "top": 1, "confidenceScoreThreshold": CONFIDENCE_SCORE_THRESHOLD},
+            timeout=TIMEOUT,
+        )
+        response.raise_for_status()
+        answers = [a for a in response.json().get("answers", []) if a.get("id", -1) != -1]
+    except (requests.RequestException, ValueError) as e:
+        return {"question": question, "error": str(e)}
+
+    if not answers:
+        return {"question": question, "answer": None}
+    best = answers[0]
+    return {"question": question, "answer": best["answer"], "confidenceScore": best.get("confidenceScore")}
+
+
+def _batch() -> tuple[Callable[[str], dict], ThreadPoolExecutor]:
+    # The query for one question and the pool to run it on, set up the same way for the sync and async tools:
+    # endpoint and key from the environment, the shared session (TIMEOUT) and MAX_PARALLEL workers.
+    endpoint = os.getenv("CQA_ENDPOINT", DEFAULT_CQA_ENDPOINT)
+    key = os.getenv("CQA_KEY", "")
+    session, executor = _pool()
+    return functools.partial(_query_one, session, endpoint, key), executor
+
+
+def query_knowledgebase_batch(questions: list[str]) -> str:
+    """
+    Gets answers from the FAQ knowledge base for several questions at once.
+
+    :param questions: All of the user's questions, one question per item.
+    :return: JSON with one entry per question, in order. "answer" is null when the knowledge base has no answer.
+    """
+    query, executor = _batch()
+    results = list(executor.map(query, questions))
+    return json.dumps({"answers": results})
+
+
+@functools.wraps(query_knowledgebase_batch)
+async def query_knowledgebase_batch_async(questions: list[str]) -> str:
+    # Same tool for an event loop (pipeline.py): the queries run on the shared pool and the loop is free
+    # while they do. It keeps the sync tool's name, so the agent's definition doesn't change.
+    query, executor = _batch()
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(loop.run_in_executor(executor, query, question) for question in questions))
+    return json.dumps({"answers": list(results)})
+
+
+FUNCTIONS = {query_knowledgebase_batch}
+ASYNC_FUNCTIONS = {query_knowledgebase_batch_async}
@@ -0,0 +1,77 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from faq_index import FaqIndex, load_kb
+
+NO_ANSWER = {"answer": "No answer found", "confidenceScore": 0.0, "id": -1, "questions": []}
+
+
+class CqaStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], index: FaqIndex, latency: float = 0.0):
+        super().__init__(address, CqaStubHandler)
+        self.index = index
+        self.latency = latency
+        self.requests = 0
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/language"
+
+    def start(self) -> "CqaStubServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class CqaStubHandler(BaseHTTPRequestHandler):
+    # Keep-alive so clients can reuse connections like they would against the real service.
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not urlparse(self.path).path.endswith("/:query-knowledgebases"):
+            self._reply(404, {"error": {"code": "NotFound", "message": self.path}})
+            return
+
+        self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        answers = self.server.index.query(
+            body.get("question", ""),
+            top=body.get("top", 5),
+            confidence_threshold=body.get("confidenceScoreThreshold", 0.0),
+        )
+        self._reply(200, {"answers": answers or [NO_ANSWER]})
+
+    def _reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Custom Question Answering query endpoint.")
+    parser.add_argument("kb", help="knowledge base export (.tsv or .json)")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated service latency per query")
+    args = parser.parse_args()
+
+    server = CqaStubServer(("127.0.0.1", args.port), load_kb(args.kb), args.latency_ms / 1000)
+    print(f"CQA stub listening on {server.endpoint} (set CQA_ENDPOINT to this)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import json
+import os
+import stat
+import time
+
+from registry import atomic_write
+
+# Access tokens are kept in this file until they expire, so a short command doesn't walk the
+# credential chain or start `az` again. Set it to an empty string to turn the cache off.
+TOKEN_CACHE_PATH_ENV = "TOKEN_CACHE_PATH"
+DEFAULT_TOKEN_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "email-agents", "tokens.json")
+# Cached tokens are only used while they have at least this long left.
+REFRESH_MARGIN = 300
+
+# Links of the DefaultAzureCredential chain that can be remembered, by class name, and the keyword
+# that turns each one off. A remembered link is the same chain with every other link excluded.
+LINKS = {
+    "EnvironmentCredential": "exclude_environment_credential",
+    "WorkloadIdentityCredential": "exclude_workload_identity_credential",
+    "ManagedIdentityCredential": "exclude_managed_identity_credential",
+    "SharedTokenCacheCredential": "exclude_shared_token_cache_credential",
+    "VisualStudioCodeCredential": "exclude_visual_studio_code_credential",
+    "AzureCliCredential": "exclude_cli_credential",
+    "AzurePowerShellCredential": "exclude_powershell_credential",
+    "AzureDeveloperCliCredential": "exclude_developer_cli_credential",
+}
+
+
+def default_token_cache_path() -> str | None:
+    return os.getenv(TOKEN_CACHE_PATH_ENV, DEFAULT_TOKEN_CACHE_PATH) or None
+
+
+def token_key(scopes: tuple, tenant_id: str | None = None) -> str:
+    # AZURE_CLIENT_ID picks the identity for the environment, workload and managed identity links.
+    return " ".join([tenant_id or "", os.getenv("AZURE_CLIENT_ID", ""), *sorted(scopes)])
+
+
+class TokenStore:
+    # JSON file holding the remembered link and the access tokens, readable only by its owner (0600).
+    # A file that others can read or write is ignored rather than trusted.
+    def __init__(self, path: str | None):
+        self.path = path
+        self.link = None
+        self.tokens = {}
+        if path and os.path.exists(path):
+            info = os.stat(path)
+            if os.name != "posix" or (info.st_uid == os.getuid() and not info.st_mode & (stat.S_IRWXG | stat.S_IRWXO)):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        data = json.load(f)
+                    self.link = data.get("link") if data.get("link") in LINKS else None
+                    self.tokens = data.get("tokens", {})
+                except (OSError, ValueError):
+                    pass
+
+    def get(self, key: str):
+        from azure.core.credentials import AccessToken
+
+        entry = self.tokens.get(key)
+        if entry and entry["expires_on"] - REFRESH_MARGIN > time.time():
+            return AccessToken(entry["token"], entry["expires_on"])
+        return None
+
+    def put(self, key: str, token, link: str | None):
+        self.link = link
+        now = time.time()
+        self.tokens = {k: v for k, v in self.tokens.items() if v["expires_on"] > now}
+        self.tokens[key] = {"token": token.token, "expires_on": int(token.expires_on)}
+        self.save()
+
+    def forget_link(self):
+        self.link = None
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        # atomic_write writes through mkstemp, which creates the file with mode 0600.
+        atomic_write(self.path, json.dumps({"link": self.link, "tokens": self.tokens}))
+
+    def clear(self):
+        self.link, self.tokens = None, {}
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def _chain(link: str | None, aio: bool):
+    # DefaultAzureCredential, or only its remembered link.
+    if aio:
+        from azure.identity.aio import DefaultAzureCredential
+    else:
+        from azure.identity import DefaultAzureCredential
+
+    if not link:
+        return DefaultAzureCredential()
+    options = {exclude: name != link for name, exclude in LINKS.items()}
+    if not aio:
+        options["exclude_broker_credential"] = True
+    return DefaultAzureCredential(**options)
+
+
+def _successful_link(chain) -> str | None:
+    # The chain keeps the link that last returned a token.
+    name = type(getattr(chain, "_successful_credential", None)).__name__
+    return name if name in LINKS else None
+
+
+def _token_options(claims, tenant_id, kwargs) -> dict:
+    return {**kwargs, **({"claims": claims} if claims else {}), **({"tenant_id": tenant_id} if tenant_id else {})}
+
+
+class CachedCredential:
+    # DefaultAzureCredential that remembers which link of its chain worked (e.g. the Azure CLI) and
+    # skips the others next time, and keeps access tokens on disk until they expire. If the remembered
+    # link stops working, the whole chain is walked again.
+    def __init__(self, path: str | None = None):
+        self.store = TokenStore(default_token_cache_path() if path is None else path)
+        self._chain = None
+        self.link = None
+
+    def get_token(self, *scopes, claims=None, tenant_id=None, **kwargs):
+        key = token_key(scopes, tenant_id)
+        token = None if claims else self.store.get(key)
+        if token is None:
+            token = self._acquire(scopes, _token_options(claims, tenant_id, kwargs))
+            self.store.put(key, token, self.link)
+        return token
+
+    def _acquire(self, scopes: tuple, options: dict):
+        from azure.core.exceptions import ClientAuthenticationError
+
+        if self._chain is None:
+            self.link = self.store.link
+            self._chain = _chain(self.link, aio=False)
+        try:
+            token = self._chain.get_token(*scopes, **options)
+        except ClientAuthenticationError:
+            if self.link is None:
+                raise
+            self.close()
+            self.store.forget_link()
+            self.link, self._chain = None, _chain(None, aio=False)
+            token = self._chain.get_token(*scopes, **options)
+        self.link = self.link or _successful_link(self._chain)
+        return token
+
+    def close(self):
+        if self._chain is not None:
+            self._chain.close()
+            self._chain = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncCachedCredential:
+    # CachedCredential for the aio clients.
+    def __init__(self, path: str | None = None):
+        self.store = TokenStore(default_token_cache_path() if path is None else path)
+        self._chain = None
+        self.link = None
+
+    async def get_token(self, *scopes, claims=None, tenant_id=None, **kwargs):
+        key = token_key(scopes, tenant_id)
+        token = None if claims else self.store.get(key)
+        if token is None:
+            token = await self._acquire(scopes, _token_options(claims, tenant_id, kwargs))
+            self.store.put(key, token, self.link)
+        return token
+
+    async def _acquire(self, scopes: tuple, options: dict):
+        from azure.core.exceptions import ClientAuthenticationError
+
+        if self._chain is None:
+            self.link = self.store.link
+            self._chain = _chain(self.link, aio=True)
+        try:
+            token = await self._chain.get_token(*scopes, **options)
+        except ClientAuthenticationError:
+            if self.link is None:
+                raise
+            await self.close()
+            self.store.forget_link()
+            self.link, self._chain = None, _chain(None, aio=True)
+            token = await self._chain.get_token(*scopes, **options)
+        self.link = self.link or _successful_link(self._chain)
+        return token
+
+    async def close(self):
+        if self._chain is not None:
+            await self._chain.close()
+            self._chain = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,166 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from faq_index import normalize
+
+# Emails whose bodies have an estimated Jaccard similarity (over character shingles) of at least
+# DEFAULT_THRESHOLD are candidates, if the earlier one arrived within DEFAULT_WINDOW seconds. A candidate
+# is only a duplicate if the normalized bodies are the same (body_key): emails that share boilerplate
+# but differ in a word or a number are different emails.
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_WINDOW = 3600.0
+DEFAULT_MAX_ENTRIES = 50_000
+NUM_PERM = 128
+SHINGLE_CHARS = 5
+# Byte weights of the shingle hash (a polynomial in a large odd base, wrapping at 2**64).
+_SHINGLE_WEIGHTS = np.array([pow(0x100000001B3, i, 1 << 64) for i in range(16)], dtype=np.uint64)
+
+
+def shingles(text: str, k: int = SHINGLE_CHARS) -> np.ndarray:
+    # Hashes of the distinct k-byte windows of the normalized UTF-8 text: k shifted array adds
+    # instead of a Python loop per shingle.
+    data = np.frombuffer(normalize(text).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) < k:
+        data = np.pad(data, (0, k - len(data)))
+    count = len(data) - k + 1
+    hashes = data[:count] * _SHINGLE_WEIGHTS[0]
+    for i in range(1, k):
+        hashes += data[i:i + count] * _SHINGLE_WEIGHTS[i]
+    return np.unique(hashes)
+
+
+def body_key(text: str) -> bytes:
+    # Digest of the body ignoring case, punctuation and whitespace.
+    return hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=16).digest()
+
+
+def lsh_params(threshold: float, num_perm: int, false_negative_weight: float = 0.9) -> tuple[int, int]:
+    # (bands, rows per band) minimizing the weighted false positive and false negative areas of the
+    # LSH S-curve around threshold. Candidates are checked against the threshold afterwards, so a
+    # false positive only costs a comparison and missed duplicates weigh more.
+    s = np.linspace(0.0, 1.0, 201)
+    below, above = s <= threshold, s >= threshold
+    best, params = None, (1, num_perm)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        collide = 1 - (1 - s ** rows) ** bands
+        false_positive = collide[below].mean() * threshold
+        false_negative = (1 - collide[above]).mean() * (1 - threshold)
+        error = (1 - false_negative_weight) * false_positive + false_negative_weight * false_negative
+        if best is None or error < best:
+            best, params = error, (bands, rows)
+    return params
+
+
+class DuplicateIndex:
+    # MinHash signatures of recent email bodies, bucketed by LSH band so a lookup only compares
+    # against likely matches. Entries leave after window seconds, or oldest first past max_entries.
+    # Signatures live in one preallocated matrix, one row per entry, so memory is fixed up front.
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        window: float = DEFAULT_WINDOW,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        num_perm: int = NUM_PERM,
+        seed: int = 1,
+        clock=time.monotonic,
+    ):
+        self.threshold = threshold
+        self.window = window
+        self.max_entries = max_entries
+        self.clock = clock
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: (a * x + b) mod 2**64, top 32 bits. Wrapping uint64 arithmetic is
+        # several times faster in NumPy than a modulo by a prime.
+        self._a = rng.integers(1, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        # A different hash per band, so all bands can share one dict keyed by plain ints.
+        self._band_mix = rng.integers(1, 1 << 63, (self.bands, self.rows), dtype=np.uint64)
+        # band hash -> slot, or a list of slots once several entries share the bucket.
+        self._buckets = {}
+        self._signatures = np.zeros((max_entries, num_perm), dtype=np.uint32)
+        self._entries = OrderedDict()  # slot -> (added at, body key, value), oldest first
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.stats = {"lookups": 0, "duplicates": 0, "rejected": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text)
+        if not len(hashes):
+            return np.full(len(self._a), 0xFFFFFFFF, dtype=np.uint32)
+        return ((hashes[:, None] * self._a + self._b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list:
+        # One 64-bit hash per band (wrapping multiply-add over the band's rows).
+        bands = signature[:self.bands * self.rows].reshape(self.bands, self.rows).astype(np.uint64)
+        return (bands * self._band_mix).sum(axis=1).tolist()
+
+    def _remove(self, slot: int):
+        del self._entries[slot]
+        for key in self._band_keys(self._signatures[slot]):
+            members = self._buckets.get(key)
+            if members == slot:
+                del self._buckets[key]
+            elif isinstance(members, list):
+                members.remove(slot)
+                if len(members) == 1:
+                    self._buckets[key] = members[0]
+        self._free.append(slot)
+
+    def _evict(self, room: int = 0):
+        now = self.clock()
+        while self._entries:
+            slot, (added, _, _) = next(iter(self._entries.items()))
+            if len(self._entries) + room <= self.max_entries and now - added <= self.window:
+                return
+            self._remove(slot)
+            self.stats["evictions"] += 1
+
+    def find(self, signature: np.ndarray, body: bytes) -> tuple[object, float] | None:
+        # (value, estimated Jaccard similarity) of the most similar entry at or above the threshold whose
+        # body_key is body. Similar entries with another body are counted as rejected.
+        self._evict()
+        self.stats["lookups"] += 1
+        candidates = set()
+        for key in self._band_keys(signature):
+            members = self._buckets.get(key)
+            if isinstance(members, list):
+                candidates.update(members)
+            elif members is not None:
+                candidates.add(members)
+        if not candidates:
+            return None
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self._signatures[slots] == signature).mean(axis=1)
+        similar = [(float(similarity[i]), int(slots[i])) for i in np.flatnonzero(similarity >= self.threshold)]
+        for score, slot in sorted(similar, reverse=True):
+            _, entry_body, value = self._entries[slot]
+            if entry_body == body:
+                self.stats["duplicates"] += 1
+                return value, score
+        if similar:
+            self.stats["rejected"] += 1
+        return None
+
+    def add(self, signature: np.ndarray, body: bytes, value):
+        self._evict(room=1)
+        slot = self._free.pop()
+        self._signatures[slot] = signature
+        self._entries[slot] = (self.clock(), body, value)
+        for key in self._band_keys(signature):
+            members = self._buckets.get(key)
+            if members is None:
+                self._buckets[key] = slot
+            elif isinstance(members, list):
+                members.append(slot)
+            else:
+                self._buckets[key] = [members, slot]
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries)}
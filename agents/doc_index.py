@@ -0,0 +1,386 @@
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import time
+from collections import Counter
+from html.parser import HTMLParser
+
+import numpy as np
+
+from answer_cache import HashingEmbedder
+from faq_index import BM25_B, BM25_K1, tokenize
+from registry import atomic_write
+
+# On-disk index of the internal docs, searched by the RAG agent's search_docs tool (doc_search_tool.py).
+DOCS_INDEX_PATH_ENV = "DOCS_INDEX_PATH"
+DEFAULT_INDEX_PATH = ".docs_index"
+DOC_EXTENSIONS = (".md", ".markdown", ".html", ".htm", ".txt")
+# Bump whenever chunking, tokenizing or the file layout changes, so the next build starts over.
+INDEX_VERSION = 1
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+DENSE_DIM = 256
+# Hybrid ranking: the top CANDIDATES chunks by BM25 and by vector similarity are merged with
+# reciprocal rank fusion. A chunk without any of the query's terms needs MIN_SIMILARITY to be returned.
+CANDIDATES = 50
+RRF_K = 60
+MIN_SIMILARITY = 0.5
+MANIFEST = "manifest.json"
+# Memory-mapped arrays, one file per array and index generation. Postings are CSR: the postings of
+# terms[i] (sorted 64-bit term hashes) are posting_docs/posting_tf[term_offsets[i]:term_offsets[i + 1]].
+ARRAYS = ("vectors", "doc_len", "chunk_offsets", "terms", "term_offsets", "posting_docs", "posting_tf")
+CHUNKS_FILE = "chunks"  # one JSON line per chunk: {"source", "title", "text"}, sliced by chunk_offsets
+_GENERATION_FILE = re.compile(r"^(\w+)\.(\d+)\.(npy|jsonl)$")
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)[\s#]*$")
+_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def markdown_sections(text: str, title: str) -> list[tuple[str, str]]:
+    # (heading, text) per section; text before the first heading goes under title.
+    sections, lines, fenced = [], [], False
+    for line in text.splitlines():
+        if _FENCE.match(line):
+            fenced = not fenced
+        heading = None if fenced else _HEADING.match(line)
+        if heading:
+            sections.append((title, "\n".join(lines)))
+            title, lines = heading.group(2), []
+        else:
+            lines.append(_LINK.sub(r"\1", line))
+    sections.append((title, "\n".join(lines)))
+    return sections
+
+
+class _HtmlSections(HTMLParser):
+    HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+    SKIPPED = {"script", "style", "noscript", "template"}
+    BLOCKS = {"p", "div", "li", "tr", "br", "pre", "section", "article", "table", "ul", "ol"}
+
+    def __init__(self, title: str):
+        super().__init__(convert_charrefs=True)
+        self.title = title
+        self.sections = []
+        self.parts = []
+        self.heading = None
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self.skip += 1
+        elif tag in self.HEADINGS or tag == "title":
+            self.heading = []
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self.skip = max(0, self.skip - 1)
+        elif (tag in self.HEADINGS or tag == "title") and self.heading is not None:
+            heading = " ".join("".join(self.heading).split())
+            self.heading = None
+            if tag in self.HEADINGS:
+                self.close_section()
+            self.title = heading or self.title
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            (self.parts if self.heading is None else self.heading).append(data)
+
+    def close_section(self):
+        self.sections.append((self.title, "".join(self.parts)))
+        self.parts = []
+
+
+def read_sections(source: str, raw: bytes) -> list[tuple[str, str]]:
+    text = raw.decode("utf-8-sig", errors="replace")
+    title = os.path.splitext(os.path.basename(source))[0]
+    extension = os.path.splitext(source)[1].lower()
+    if extension in (".md", ".markdown"):
+        return markdown_sections(text, title)
+    if extension in (".html", ".htm"):
+        parser = _HtmlSections(title)
+        parser.feed(text)
+        parser.close()
+        parser.close_section()
+        return parser.sections
+    return [(title, text)]
+
+
+def chunk_sections(sections: list[tuple[str, str]], words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> list[tuple[str, str]]:
+    # Windows of `words` words per section, each overlapping the previous one by `overlap` words.
+    chunks = []
+    for title, text in sections:
+        tokens = text.split()
+        for start in range(0, max(len(tokens) - overlap, 1), words - overlap):
+            if tokens[start:start + words]:
+                chunks.append((title, " ".join(tokens[start:start + words])))
+    return chunks
+
+
+def list_docs(docs_dir: str) -> list[tuple[str, str]]:
+    # (path relative to docs_dir with "/" separators, full path), skipping hidden directories.
+    found = []
+    for root, dirs, files in os.walk(docs_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.lower().endswith(DOC_EXTENSIONS):
+                full = os.path.join(root, name)
+                found.append((os.path.relpath(full, docs_dir).replace(os.sep, "/"), full))
+    return found
+
+
+def _read_manifest(path: str) -> dict | None:
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _compatible(manifest: dict | None, dim: int) -> bool:
+    return bool(manifest) and manifest.get("version") == INDEX_VERSION and manifest.get("dim") == dim
+
+
+def _file(path: str, name: str, generation: int) -> str:
+    return os.path.join(path, f"{name}.{generation}.{'jsonl' if name == CHUNKS_FILE else 'npy'}")
+
+
+class DocIndex:
+    # Read-only view of a built index. Arrays and chunk text are memory-mapped, so opening is cheap
+    # and only the pages a query touches are read.
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, embedder: HashingEmbedder | None = None):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder(DENSE_DIM)
+        self.manifest = _read_manifest(path) or {"version": INDEX_VERSION, "dim": self.embedder.dim, "generation": 0, "chunks": 0, "files": {}}
+        if not _compatible(self.manifest, self.embedder.dim):
+            raise ValueError(f"{path} was built by another version of doc_index.py; rebuild it with `python agents/doc_index.py --build <docs>`.")
+        self.files = self.manifest["files"]
+        self.avg_len = self.manifest.get("avg_len", 0.0)
+        self._arrays = {}
+        self._file = self._chunks = None
+        if len(self):
+            generation = self.manifest["generation"]
+            self._arrays = {name: np.load(_file(path, name, generation), mmap_mode="r") for name in ARRAYS}
+            self._file = open(_file(path, CHUNKS_FILE, generation), "rb")
+            self._chunks = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self.manifest["chunks"]
+
+    def close(self):
+        self._arrays = {}
+        if self._chunks is not None:
+            self._chunks.close()
+            self._file.close()
+            self._file = self._chunks = None
+
+    def chunk(self, doc: int) -> dict:
+        offsets = self._arrays["chunk_offsets"]
+        return json.loads(self._chunks[int(offsets[doc]):int(offsets[doc + 1])])
+
+    def _bm25(self, query: str) -> np.ndarray:
+        arrays, n = self._arrays, len(self)
+        scores = np.zeros(n, dtype=np.float32)
+        terms = arrays["terms"]
+        hashes = np.array([term_hash(term) for term in set(tokenize(query))], dtype=np.uint64)
+        for row, h in zip(np.searchsorted(terms, hashes).tolist(), hashes.tolist()):
+            if row >= len(terms) or int(terms[row]) != h:
+                continue
+            lo, hi = int(arrays["term_offsets"][row]), int(arrays["term_offsets"][row + 1])
+            docs = arrays["posting_docs"][lo:hi]
+            tf = arrays["posting_tf"][lo:hi].astype(np.float32)
+            idf = math.log(1 + (n - (hi - lo) + 0.5) / (hi - lo + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * arrays["doc_len"][docs] / self.avg_len)
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top: int = 5) -> list[dict]:
+        # [{"id", "source", "title", "text", "score"}], best first; score is the fused rank score.
+        if not len(self):
+            return []
+        lexical = self._bm25(query)
+        dense = self._arrays["vectors"] @ self.embedder.embed(query)
+        fused = {}
+        for scores, floor in ((lexical, 0.0), (dense, -1.0)):
+            count = min(CANDIDATES, len(scores))
+            best = np.argpartition(-scores, count - 1)[:count]
+            best = best[np.argsort(-scores[best])]
+            for rank, doc in enumerate(best[scores[best] > floor].tolist()):
+                fused[doc] = fused.get(doc, 0.0) + 1.0 / (RRF_K + rank + 1)
+        results = []
+        for doc, score in sorted(fused.items(), key=lambda item: item[1], reverse=True):
+            if lexical[doc] <= 0.0 and dense[doc] < MIN_SIMILARITY:
+                continue
+            results.append({"id": doc, **self.chunk(doc), "score": round(score, 4)})
+            if len(results) == top:
+                break
+        return results
+
+
+def build_index(docs_dir: str, path: str = DEFAULT_INDEX_PATH, embedder: HashingEmbedder | None = None) -> dict:
+    # Writes a new generation of the index, then switches the manifest to it. Only files whose size or
+    # mtime changed are read, and only those whose content hash changed are chunked and embedded again;
+    # the chunks, vectors and postings of every other file are copied from the previous generation.
+    started = time.perf_counter()
+    embedder = embedder or HashingEmbedder(DENSE_DIM)
+    os.makedirs(path, exist_ok=True)
+    previous = _read_manifest(path)
+    old = DocIndex(path, embedder) if _compatible(previous, embedder.dim) else None
+    old_arrays = old._arrays if old else {}
+    generation = (previous or {}).get("generation", 0) + 1
+    stats = {"files": 0, "unchanged": 0, "changed": 0, "removed": 0, "chunks": 0, "embedded": 0}
+
+    files, vectors, doc_lens, offsets, postings = {}, [], [], [], []
+    doc_map = np.full(len(old) if old else 0, -1, dtype=np.int64)  # old chunk -> new chunk, -1 if dropped
+    hashes_cache = {}
+    n = position = 0
+    with open(_file(path, CHUNKS_FILE, generation), "wb") as out:
+        for source, full in list_docs(docs_dir):
+            status = os.stat(full)
+            entry = old.files.get(source) if old else None
+            raw = digest = None
+            if entry and (entry["size"], entry["mtime_ns"]) != (status.st_size, status.st_mtime_ns):
+                with open(full, "rb") as f:
+                    raw = f.read()
+                digest = hashlib.sha256(raw).hexdigest()
+                if digest != entry["sha256"]:
+                    entry = None
+            if entry:
+                start, count = entry["start"], entry["count"]
+                if count:
+                    doc_map[start:start + count] = np.arange(n, n + count)
+                    vectors.append(old_arrays["vectors"][start:start + count])
+                    doc_lens.append(old_arrays["doc_len"][start:start + count])
+                    lo, hi = int(old_arrays["chunk_offsets"][start]), int(old_arrays["chunk_offsets"][start + count])
+                    out.write(old._chunks[lo:hi])
+                    offsets.append(old_arrays["chunk_offsets"][start:start + count] - lo + position)
+                    position += hi - lo
+                digest = entry["sha256"]
+                stats["unchanged"] += 1
+            else:
+                if raw is None:
+                    with open(full, "rb") as f:
+                        raw = f.read()
+                    digest = hashlib.sha256(raw).hexdigest()
+                chunks = chunk_sections(read_sections(source, raw))
+                count = len(chunks)
+                texts = [f"{title}\n{text}" for title, text in chunks]
+                lengths = []
+                for doc, text in enumerate(texts, n):
+                    terms = Counter(tokenize(text))
+                    lengths.append(sum(terms.values()))
+                    for term in terms.keys() - hashes_cache.keys():
+                        hashes_cache[term] = term_hash(term)
+                    postings.append((np.array([hashes_cache[term] for term in terms], dtype=np.uint64), np.full(len(terms), doc, dtype=np.int32), np.minimum(list(terms.values()), 65535).astype(np.uint16)))
+                for title, text in chunks:
+                    record = (json.dumps({"source": source, "title": title, "text": text}, ensure_ascii=False) + "\n").encode("utf-8")
+                    offsets.append(np.array([position], dtype=np.int64))
+                    out.write(record)
+                    position += len(record)
+                if count:
+                    vectors.append(np.stack([embedder.embed(text) for text in texts]))
+                    doc_lens.append(np.array(lengths, dtype=np.uint32))
+                stats["changed"] += 1
+                stats["embedded"] += count
+            files[source] = {"size": status.st_size, "mtime_ns": status.st_mtime_ns, "sha256": digest, "start": n, "count": count}
+            n += count
+    offsets.append(np.array([position], dtype=np.int64))
+
+    if old and len(old):
+        # Postings of the chunks kept from the previous generation, renumbered.
+        new_docs = doc_map[old_arrays["posting_docs"]]
+        kept = new_docs >= 0
+        terms = np.repeat(old_arrays["terms"], np.diff(old_arrays["term_offsets"]))
+        postings.append((terms[kept], new_docs[kept].astype(np.int32), old_arrays["posting_tf"][kept]))
+    postings.append((np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)))
+    hashes, docs, tfs = (np.concatenate(column) for column in zip(*postings))
+    postings.clear()
+    order = np.argsort(hashes, kind="stable")
+    hashes, docs, tfs = hashes[order], docs[order], tfs[order]
+    del order
+    starts = np.flatnonzero(np.diff(hashes, prepend=hashes[:1] + np.uint64(1)))  # first posting of each term
+    doc_len = np.concatenate(doc_lens) if doc_lens else np.zeros(0, dtype=np.uint32)
+    arrays = {
+        "doc_len": doc_len,
+        "chunk_offsets": np.concatenate(offsets),
+        "terms": hashes[starts],
+        "term_offsets": np.append(starts, len(hashes)).astype(np.int64),
+        "posting_docs": docs,
+        "posting_tf": tfs,
+    }
+    for name, array in arrays.items():
+        np.save(_file(path, name, generation), array)
+    matrix = np.lib.format.open_memmap(_file(path, "vectors", generation), mode="w+", dtype=np.float32, shape=(n, embedder.dim))
+    row = 0
+    for block in vectors:
+        matrix[row:row + len(block)] = block
+        row += len(block)
+    matrix.flush()
+    del matrix
+
+    stats["removed"] = len(set(old.files) - set(files)) if old else 0
+    if old:
+        old.close()
+    manifest = {
+        "version": INDEX_VERSION,
+        "dim": embedder.dim,
+        "generation": generation,
+        "docs_dir": os.path.abspath(docs_dir),
+        "chunks": n,
+        "avg_len": float(doc_len.mean()) if n else 0.0,
+        "files": files,
+    }
+    atomic_write(os.path.join(path, MANIFEST), json.dumps(manifest, ensure_ascii=False))
+    for name in os.listdir(path):
+        match = _GENERATION_FILE.match(name)
+        if match and int(match.group(2)) != generation:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass  # still mapped by another process; removed by the next build
+    stats.update(files=len(files), chunks=n, seconds=round(time.perf_counter() - started, 3), bytes=index_size(path))
+    return stats
+
+
+def index_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if _GENERATION_FILE.match(name) or name == MANIFEST)
+
+
+def load_default_index() -> DocIndex | None:
+    path = os.getenv(DOCS_INDEX_PATH_ENV, DEFAULT_INDEX_PATH)
+    return DocIndex(path) if os.path.exists(os.path.join(path, MANIFEST)) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or search the local index of internal docs (Markdown, HTML, text).")
+    parser.add_argument("queries", nargs="*", help="search the index for these")
+    parser.add_argument("--build", metavar="DOCS_DIR", help="index the docs in DOCS_DIR, re-processing only files that changed")
+    parser.add_argument("--index", default=os.getenv(DOCS_INDEX_PATH_ENV, DEFAULT_INDEX_PATH))
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.build:
+        stats = build_index(args.build, args.index)
+        print(f"{stats['files']} files ({stats['changed']} new or changed, {stats['unchanged']} unchanged, {stats['removed']} removed), "
+              f"{stats['chunks']} chunks ({stats['embedded']} embedded) in {stats['seconds']:.1f}s, {stats['bytes'] / 2**20:.1f} MiB in {args.index}")
+    index = DocIndex(args.index)
+    for query in args.queries:
+        print(query)
+        for passage in index.search(query, args.top):
+            print(f"  [{passage['score']:.4f}] {passage['source']} > {passage['title']}: {passage['text'][:120]}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
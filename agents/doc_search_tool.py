@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from doc_index import DocIndex
+
+# Passage URLs are DOCS_BASE_URL + the file's path in the docs directory + "#" + the section anchor,
+# e.g. the SharePoint library or wiki the docs were exported from.
+DOCS_BASE_URL_ENV = "DOCS_BASE_URL"
+MAX_TOP = 10
+MAX_PASSAGE_CHARS = 1500
+_ANCHOR = re.compile(r"[^\w]+")
+
+_index = None
+_lock = threading.Lock()
+_returned = contextvars.ContextVar("doc_passages", default=None)
+
+
+def _open() -> DocIndex | None:
+    global _index
+    from doc_index import load_default_index
+
+    with _lock:
+        if _index is None:
+            # Opened once per process from DOCS_INDEX_PATH; False if it has not been built.
+            _index = load_default_index() or False
+    return _index or None
+
+
+def passage_url(source: str, title: str) -> str:
+    base = os.getenv(DOCS_BASE_URL_ENV, "").rstrip("/")
+    anchor = _ANCHOR.sub("-", title.casefold()).strip("-")
+    return f"{base}/{source}#{anchor}" if base else f"{source}#{anchor}"
+
+
+@contextmanager
+def collect():
+    # Passages returned by search_docs calls made in this context, to turn the ones an answer cites
+    # into citations (see cited()).
+    passages = []
+    token = _returned.set(passages)
+    try:
+        yield passages
+    finally:
+        _returned.reset(token)
+
+
+def cited(text: str, passages: list) -> list:
+    citations, seen = [], set()
+    for passage in passages:
+        if passage["url"] in text and passage["url"] not in seen:
+            seen.add(passage["url"])
+            citations.append({"url": passage["url"], "title": passage["title"]})
+    return citations
+
+
+def search_docs(query: str, top: int = 5) -> str:
+    """
+    Searches the internal product documentation.
+
+    :param query: What to look for, e.g. one of the user's questions.
+    :param top: How many passages to return, at most 10.
+    :return: JSON with the best matching passages, best first. Cite a passage by its "url".
+    """
+    index = _open()
+    if index is None:
+        return json.dumps({"query": query, "passages": [], "error": "The internal documentation index has not been built."})
+    passages = [
+        {"url": passage_url(p["source"], p["title"]), "title": p["title"], "source": p["source"], "text": p["text"][:MAX_PASSAGE_CHARS]}
+        for p in index.search(query, min(max(int(top), 1), MAX_TOP))
+    ]
+    returned = _returned.get()
+    if returned is not None:
+        returned.extend(passages)
+    return json.dumps({"query": query, "passages": passages}, ensure_ascii=False)
+
+
+@functools.wraps(search_docs)
+async def search_docs_async(query: str, top: int = 5) -> str:
+    # search_docs on a worker thread, for an event loop (pipeline.py). The thread runs in a copy of the
+    # caller's context, so collect() still sees the passages.
+    return await asyncio.to_thread(search_docs, query, top)
+
+
+FUNCTIONS = {search_docs}
+ASYNC_FUNCTIONS = {search_docs_async}
@@ -0,0 +1,89 @@
+import argparse
+import json
+import random
+import statistics
+import time
+
+from bench_faq_index import OUT_OF_SCOPE, build_kb, paraphrase, percentile
+from faq_index import load_kb
+from router import DEFAULT_FAQ_THRESHOLD, DEFAULT_RAG_THRESHOLD, ROUTES, QuestionRouter
+
+
+def synthetic(size: int, queries: int, rng: random.Random):
+    # Questions from the bench_faq_index.py knowledge base, labeled with the agent that should answer:
+    # exact and reworded KB questions are "faq"; near misses and out-of-scope questions are "rag".
+    index, qnas, near_misses = build_kb(size, rng)
+    labeled = []
+    for _ in range(queries):
+        _, question = rng.choice(qnas)
+        kind = rng.choices(["exact", "paraphrase", "near_miss", "out_of_scope"], weights=[3, 3, 2 if near_misses else 0, 2])[0]
+        if kind == "exact":
+            labeled.append((kind, question, "faq"))
+        elif kind == "paraphrase":
+            labeled.append((kind, paraphrase(question, rng), "faq"))
+        elif kind == "near_miss":
+            labeled.append((kind, rng.choice(near_misses), "rag"))
+        else:
+            labeled.append((kind, rng.choice(OUT_OF_SCOPE), "rag"))
+    return index, labeled
+
+
+def load_labeled(path: str) -> list:
+    # JSONL of {"question", "label": "faq" | "rag"}; "kind" is optional and groups the report.
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row.get("kind", row["label"]), row["question"], row["label"]) for row in rows]
+
+
+def evaluate(router: QuestionRouter, labeled: list) -> dict:
+    by_kind, latency = {}, []
+    totals = {"questions": 0, "correct": 0, "both": 0, "wrong": 0, "rag_runs": 0, "faq_runs": 0}
+    for kind, question, label in labeled:
+        start = time.perf_counter()
+        route = router.route(question)
+        latency.append((time.perf_counter() - start) * 1_000_000)
+        row = by_kind.setdefault(kind, {route: 0 for route in ROUTES})
+        row[route] += 1
+        totals["questions"] += 1
+        totals["correct" if route == label else "both" if route == "both" else "wrong"] += 1
+        # A question routed to FAQ only that the KB can't answer falls back to RAG after the FAQ run.
+        totals["rag_runs"] += route != "faq" or label == "rag"
+        totals["faq_runs"] += route != "rag"
+    return {"totals": totals, "by_kind": by_kind, "p50_us": statistics.median(latency), "p95_us": percentile(latency, 95)}
+
+
+def report(result: dict, faq_threshold: float, rag_threshold: float):
+    totals = result["totals"]
+    n = totals["questions"]
+    print(f"thresholds: faq >= {faq_threshold}, rag < {rag_threshold}; {n} questions")
+    print(f"{'kind':<14}" + "".join(f"{route:>8}" for route in ROUTES))
+    for kind, row in result["by_kind"].items():
+        print(f"{kind:<14}" + "".join(f"{row[route]:>8}" for route in ROUTES))
+    print(f"accuracy {totals['correct'] / n:.1%}, sent to both {totals['both'] / n:.1%}, misrouted {totals['wrong'] / n:.1%}")
+    print(f"RAG runs {totals['rag_runs']} instead of {n} ({1 - totals['rag_runs'] / n:.1%} avoided), FAQ runs {totals['faq_runs']} instead of {n}")
+    print(f"routing latency p50 {result['p50_us']:.0f} us, p95 {result['p95_us']:.0f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how well the FAQ/RAG pre-router (router.py) sends questions to the right agent.")
+    parser.add_argument("--kb", help="knowledge base export (.tsv or .json); with --labeled, evaluates real questions")
+    parser.add_argument("--labeled", help='JSONL of {"question", "label": "faq" | "rag"}')
+    parser.add_argument("--size", type=int, default=300, help="synthetic KB size (max 800)")
+    parser.add_argument("--queries", type=int, default=3000)
+    parser.add_argument("--faq-threshold", type=float, default=DEFAULT_FAQ_THRESHOLD)
+    parser.add_argument("--rag-threshold", type=float, default=DEFAULT_RAG_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.kb or args.labeled:
+        if not (args.kb and args.labeled):
+            parser.error("--kb and --labeled go together")
+        index, labeled = load_kb(args.kb), load_labeled(args.labeled)
+    else:
+        index, labeled = synthetic(args.size, args.queries, random.Random(args.seed))
+    router = QuestionRouter(index, args.faq_threshold, args.rag_threshold)
+    report(evaluate(router, labeled), args.faq_threshold, args.rag_threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,616 @@
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from azure.ai.agents.models import (
+    Agent,
+    AsyncAgentEventHandler,
+    AsyncAgentRunStream,
+    AsyncFunctionTool,
+    AsyncToolSet,
+    RunStep,
+    ThreadMessage,
+    ThreadRun,
+)
+
+from faq_index import FaqIndex
+from json_normalizer import parse_answers
+
+# Agent IDs the fake hands out; EmailPipeline looks them up by pipeline stage.
+FAKE_AGENT_IDS = {
+    "triage": "asst_fake_triage",
+    "faq": "asst_fake_faq",
+    "faq_to_json": "asst_fake_faq_to_json",
+    "rag": "asst_fake_rag",
+    "rag_to_json": "asst_fake_rag_to_json",
+    "reply": "asst_fake_reply",
+    "rag_mini": "asst_fake_rag_mini",
+    "reply_mini": "asst_fake_reply_mini",
+}
+# Simulated model time per run, in seconds, roughly in line with the deployed models.
+DEFAULT_LATENCY = {"triage": 0.8, "faq": 1.2, "faq_to_json": 0.9, "rag": 3.0, "rag_to_json": 0.9, "reply": 2.0, "rag_mini": 1.4, "reply_mini": 0.9}
+# The mini RAG twin gives up on how-to and why questions, so cascades escalate some runs.
+MINI_HARD_QUESTION = re.compile(r"^\s*(how\s+(do|does|can)|why)\b", re.IGNORECASE)
+# Share of a run spent before the first token, and the size of each streamed delta.
+FIRST_TOKEN_FRACTION = 0.4
+STREAM_CHUNK_CHARS = 24
+# Simulated time for create_agent/update_agent, scaled by speed like model latency.
+AGENT_WRITE_LATENCY = 0.3
+# Usage is estimated from text length, like the service's tokenizer would roughly count it.
+CHARS_PER_TOKEN = 4
+# What the service reports for a run that failed on its side.
+SERVER_ERROR = {"code": "server_error", "message": "Sorry, something went wrong."}
+
+FAKE_KB = [
+    ("1", ["What regions is Agent Service available in?", "Which regions support Agent Service?"], "Agent Service is available in East US, West US and Sweden Central."),
+    ("2", ["How much does Agent Service cost?", "What is the pricing for Agent Service?"], "Agent Service is billed per model token and tool call."),
+    ("3", ["Which models can I use with Agent Service?"], "You can use any Azure OpenAI model deployed in your project."),
+]
+_QUESTION = re.compile(r"[^.!?\n]*\?")
+_ID_QUESTION = re.compile(r"^\s*([A-Za-z0-9]+):\s*(.+)$", re.MULTILINE)
+
+
+def _message_dict(message_id: str, run, text: str, citations: list, status: str) -> dict:
+    annotations = [{"type": "url_citation", "text": "", "url_citation": {"url": c["url"], "title": c.get("title")}} for c in citations]
+    return {
+        "id": message_id,
+        "object": "thread.message",
+        "thread_id": run.thread_id,
+        "run_id": run.id,
+        "assistant_id": run.agent_id,
+        "role": "assistant",
+        "status": status,
+        "content": [{"type": "text", "text": {"value": text, "annotations": annotations}}],
+    }
+
+
+def triage_responder(history: list) -> tuple[str, list]:
+    # The email is the thread's first message; a later one asks to correct the breakdown.
+    email = next(m["content"] for m in history if m["role"] == "user")
+    body = email.split("\n\n", 1)[-1]
+    questions = [q.strip() for q in _QUESTION.findall(body)]
+    return json.dumps({"questions": questions, "issues": []}), []
+
+
+def faq_responder(index: FaqIndex):
+    def respond(history: list) -> tuple[str, list]:
+        lines = []
+        for question_id, question in _ID_QUESTION.findall(history[-1]["content"]):
+            hit = index.answer(question)
+            answer = hit["answer"] if hit else "I don't know"
+            lines.append(f"{question_id}: {answer}")
+        return "\n".join(lines), []
+    return respond
+
+
+def docs_function_calls(history: list) -> list:
+    # With RAG_DOCS_TOOL=1 the RAG agent first searches the internal docs for each question.
+    return [{"name": "search_docs", "arguments": {"query": question}} for _, question in _ID_QUESTION.findall(history[-1]["content"])]
+
+
+def _doc_passages(history: list) -> dict:
+    # query -> passages, from the search_docs outputs submitted during this run.
+    passages = {}
+    for message in reversed(history):
+        if message["role"] != "tool":
+            break
+        output = json.loads(message["content"])
+        passages[output.get("query")] = output.get("passages", [])
+    return passages
+
+
+def _questions(history: list) -> list:
+    # (question ID, question) pairs of the last user message; tool outputs may follow it.
+    return _ID_QUESTION.findall(next(m["content"] for m in reversed(history) if m["role"] == "user"))
+
+
+def rag_responder(history: list) -> tuple[str, list]:
+    lines, citations = [], []
+    docs = _doc_passages(history)
+    for number, (question_id, question) in enumerate(_questions(history)):
+        if re.search(r"\b(next year|future|roadmap|will)\b", question, re.IGNORECASE):
+            lines.append(f"{question_id}: I don't know")
+            continue
+        if docs.get(question):
+            passage = docs[question][0]
+            lines.append(f"{question_id}: According to the internal docs, {passage['text'][:160]} [{passage['url']}]")
+            continue
+        lines.append(f"{question_id}: According to Microsoft Learn, {question.rstrip('?').lower()} is covered in the Agent Service documentation【{number}:0†source】.")
+        citations.append({"url": f"https://learn.microsoft.com/azure/ai-services/agents/{question_id}", "title": "Agent Service documentation"})
+    return "\n".join(lines), citations
+
+
+def mini_rag_responder(history: list) -> tuple[str, list]:
+    questions = _questions(history)
+    if any(MINI_HARD_QUESTION.search(question) for _, question in questions):
+        return "\n".join(f"{question_id}: I don't know" for question_id, _ in questions), []
+    return rag_responder(history)
+
+
+def to_json_responder(history: list) -> tuple[str, list]:
+    previous = next((m["content"] for m in reversed(history) if m["role"] == "assistant"), "")
+    return json.dumps(parse_answers(previous) or {"answered_questions": [], "unanswered_questions": []}), []
+
+
+def reply_responder(history: list) -> tuple[str, list]:
+    pairs = re.findall(r"^Q: (.*)\nA: (.*)$", history[-1]["content"], re.MULTILINE)
+    items = "".join(f"<li><b>{q}</b><br>{a}</li>" for q, a in pairs)
+    return f"<p>Hello,</p><p>Thanks for reaching out. Here are the answers to your questions:</p><ul>{items}</ul><p>Best regards,<br>Support</p>", []
+
+
+def malformed(text: str, rng: random.Random) -> str:
+    # What a model gets wrong now and then: JSON cut short, an answer left empty or left out.
+    if text.lstrip().startswith("{"):
+        return text[:len(text) // 2]
+    lines = text.splitlines()
+    if lines and rng.random() < 0.5:
+        lines.pop(rng.randrange(len(lines)))
+        return "\n".join(lines)
+    return _ID_QUESTION.sub(lambda match: f"{match.group(1)}: ", text)
+
+
+def fake_kb() -> FaqIndex:
+    index = FaqIndex()
+    for qna_id, questions, answer in FAKE_KB:
+        index.add(qna_id, questions, answer)
+    return index
+
+
+def default_responders() -> dict:
+    index = fake_kb()
+    return {
+        FAKE_AGENT_IDS["triage"]: triage_responder,
+        FAKE_AGENT_IDS["faq"]: faq_responder(index),
+        FAKE_AGENT_IDS["faq_to_json"]: to_json_responder,
+        FAKE_AGENT_IDS["rag"]: rag_responder,
+        FAKE_AGENT_IDS["rag_to_json"]: to_json_responder,
+        FAKE_AGENT_IDS["reply"]: reply_responder,
+        FAKE_AGENT_IDS["rag_mini"]: mini_rag_responder,
+        FAKE_AGENT_IDS["reply_mini"]: reply_responder,
+    }
+
+
+class FakeQuota:
+    # Sliding-window request and token quota for one model deployment.
+    def __init__(self, requests: int, tokens: int, window: float = 60.0, clock=time.monotonic):
+        self.requests = requests
+        self.tokens = tokens
+        self.window = window
+        self.clock = clock
+        self.used = deque()  # (time, tokens)
+        self.throttled = 0
+
+    def retry_after(self) -> float | None:
+        # None if a run may start now, otherwise seconds until the oldest usage leaves the window.
+        now = self.clock()
+        while self.used and now - self.used[0][0] >= self.window:
+            self.used.popleft()
+        if len(self.used) < self.requests and sum(tokens for _, tokens in self.used) < self.tokens:
+            return None
+        self.throttled += 1
+        return self.used[0][0] + self.window - now
+
+    def record(self, tokens: int):
+        self.used.append((self.clock(), tokens))
+
+
+class _FakeRun:
+    def __init__(self, run_id: str, thread_id: str, agent_id: str):
+        self.id = run_id
+        self.thread_id = thread_id
+        self.agent_id = agent_id
+        self.status = "queued"
+        self.required_action = None
+        self.last_error = None
+        self.usage = None
+        self.steps = []
+        self.events = asyncio.Queue()
+        self.tool_outputs = None
+        self.task = None
+        self.prompt_tokens = 0  # of the model call in progress, and the text it has streamed so far
+        self.streamed = ""
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "object": "thread.run",
+            "thread_id": self.thread_id,
+            "assistant_id": self.agent_id,
+            "status": self.status,
+            "required_action": self.required_action,
+            "last_error": self.last_error,
+            "usage": self.usage,
+        }
+
+
+class FakeAgentsOperations:
+    # The subset of AIProjectClient.agents (azure.ai.agents.aio) the scripts use. Runs progress in a
+    # background task and can be polled (runs.get), streamed (runs.stream) or awaited (create_and_process).
+    def __init__(
+        self,
+        responders: dict,
+        latency: dict,
+        speed: float,
+        models: dict | None = None,
+        quotas: dict | None = None,
+        rtt: float = 0.0,
+        function_calls: dict | None = None,
+        streaming: bool = True,
+        agent_stages: dict | None = None,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        chars_per_token: float = CHARS_PER_TOKEN,
+        seed: int | None = None,
+    ):
+        self.responders = dict(responders)
+        self.latency = {FAKE_AGENT_IDS[stage]: seconds for stage, seconds in latency.items()}
+        self.speed = speed
+        # agent_stages maps AGENT_NAME -> pipeline stage; an agent created with that name answers like
+        # the stage's fake agent. Agents with other names can be created but not run.
+        self.agent_stages = agent_stages or {}
+        # Each run's model time varies by up to +/- jitter (a fraction), and failure_rate of runs fail
+        # with server_error partway through.
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        # malformed_rate of the triage, FAQ, RAG and formatter outputs are malformed (see malformed()).
+        self.malformed_rate = malformed_rate
+        self.structured = {FAKE_AGENT_IDS[stage] for stage in ("triage", "faq", "faq_to_json", "rag", "rag_to_json", "rag_mini")}
+        self.chars_per_token = chars_per_token
+        self.rng = random.Random(seed)
+        # models maps agent ID -> model; quotas maps model -> FakeQuota. Runs over quota fail like throttled runs do.
+        self.models = dict(models or {})
+        self.quotas = quotas or {}
+        # Round trip of every request; a stream pays it once.
+        self.rtt = rtt
+        # function_calls maps agent ID -> history -> [{"name", "arguments"}] or None; those runs stop at requires_action.
+        self.function_calls = function_calls or {}
+        self.functions = None
+        self.calls = 0
+        self.thread_calls = {}
+        self._ids = itertools.count(1)
+        self._threads = {}
+        self._runs = {}
+        self._agents = {}
+        stages = {agent_id: stage for stage, agent_id in FAKE_AGENT_IDS.items()}
+        for agent_id in list(self.responders):
+            self._define_agent(agent_id, self.models.get(agent_id), stages.get(agent_id, agent_id), None, None, None, int(time.time()))
+        self.threads = SimpleNamespace(create=self._create_thread, delete=self._delete_thread)
+        self.messages = SimpleNamespace(create=self._create_message, get_last_message_by_role=self._last_message)
+        self.runs = SimpleNamespace(
+            create=self._create_run,
+            get=self._get_run,
+            submit_tool_outputs=self._submit_tool_outputs,
+            create_and_process=self._create_and_process,
+            cancel=self._cancel_run,
+        )
+        self.run_steps = SimpleNamespace(list=self._list_run_steps, get=self._get_run_step)
+        if streaming:
+            self.runs.stream = self._stream
+            self.runs.submit_tool_outputs_stream = self._submit_tool_outputs_stream
+
+    def enable_auto_function_calls(self, tools, max_retry: int = 10):
+        self.functions = AsyncFunctionTool(tools)
+
+    async def _request(self, thread_id: str | None = None):
+        self.calls += 1
+        if thread_id is not None:
+            self.thread_calls[thread_id] = self.thread_calls.get(thread_id, 0) + 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+
+    def _agent(self, agent_id: str) -> dict:
+        if agent_id not in self._agents:
+            raise ResourceNotFoundError(f"No assistant found with id '{agent_id}'.")
+        return self._agents[agent_id]
+
+    def _define_agent(self, agent_id: str, model: str, name: str | None, instructions, tools, response_format, created_at: int) -> Agent:
+        stage = self.agent_stages.get(name)
+        if stage is not None:
+            self.responders[agent_id] = self.responders[FAKE_AGENT_IDS[stage]]
+            self.latency[agent_id] = self.latency.get(FAKE_AGENT_IDS[stage], 0.0)
+        self.models[agent_id] = model
+        tools = [tool.as_dict() if hasattr(tool, "as_dict") else tool for tool in tools or []]
+        self._agents[agent_id] = {
+            "id": agent_id,
+            "object": "assistant",
+            "created_at": created_at,
+            "name": name,
+            "model": model,
+            "instructions": instructions,
+            "tools": tools,
+            "response_format": response_format.as_dict() if hasattr(response_format, "as_dict") else response_format,
+        }
+        return Agent(self._agents[agent_id])
+
+    async def create_agent(self, model: str, name: str | None = None, instructions: str | None = None, tools=None, response_format=None, **kwargs) -> Agent:
+        await self._request()
+        await asyncio.sleep(AGENT_WRITE_LATENCY * self.speed)
+        return self._define_agent(f"asst_{next(self._ids)}", model, name, instructions, tools, response_format, int(time.time()))
+
+    async def update_agent(self, agent_id: str, model: str | None = None, name: str | None = None, instructions: str | None = None, tools=None, response_format=None, **kwargs) -> Agent:
+        await self._request()
+        agent = self._agent(agent_id)
+        await asyncio.sleep(AGENT_WRITE_LATENCY * self.speed)
+        return self._define_agent(
+            agent_id,
+            model or agent["model"],
+            name or agent["name"],
+            instructions if instructions is not None else agent["instructions"],
+            tools if tools is not None else agent["tools"],
+            response_format if response_format is not None else agent["response_format"],
+            agent["created_at"],
+        )
+
+    async def get_agent(self, agent_id: str, **kwargs) -> Agent:
+        await self._request()
+        return Agent(self._agent(agent_id))
+
+    async def delete_agent(self, agent_id: str, **kwargs):
+        await self._request()
+        self._agent(agent_id)
+        del self._agents[agent_id]
+
+    async def list_agents(self, **kwargs):
+        await self._request()
+        for agent in list(self._agents.values()):
+            yield Agent(agent)
+
+    async def _create_thread(self, **kwargs):
+        thread_id = f"thread_{next(self._ids)}"
+        await self._request(thread_id)
+        self._threads[thread_id] = []
+        return SimpleNamespace(id=thread_id)
+
+    async def _delete_thread(self, thread_id: str, **kwargs):
+        await self._request(thread_id)
+        del self._threads[thread_id]
+
+    async def _create_message(self, thread_id: str, role, content: str, **kwargs):
+        await self._request(thread_id)
+        self._threads[thread_id].append({"role": getattr(role, "value", role), "content": content, "message": None})
+        return SimpleNamespace(id=f"msg_{next(self._ids)}", thread_id=thread_id)
+
+    def _emit(self, run: _FakeRun, event: str, data: dict):
+        run.events.put_nowait((event, data))
+
+    def _set_status(self, run: _FakeRun, status: str):
+        run.status = status
+        self._emit(run, f"thread.run.{status}", run.as_dict())
+
+    def _add_step(self, run: _FakeRun, step_type: str, details: dict) -> dict:
+        step = {
+            "id": f"step_{next(self._ids)}",
+            "object": "thread.run.step",
+            "type": step_type,
+            "status": "in_progress",
+            "thread_id": run.thread_id,
+            "run_id": run.id,
+            "assistant_id": run.agent_id,
+            "step_details": {"type": step_type, **details},
+            "last_error": None,
+            "usage": None,
+        }
+        run.steps.append(step)
+        self._emit(run, "thread.run.step.created", step)
+        return step
+
+    def _finish_step(self, run: _FakeRun, step: dict, status: str = "completed", prompt_tokens: int = 0, completion_tokens: int = 0):
+        step["status"] = status
+        step["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        self._emit(run, f"thread.run.step.{status}", step)
+
+    def _tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token)
+
+    def _fail(self, run: _FakeRun, error: dict):
+        for step in run.steps:
+            if step["status"] == "in_progress":
+                self._finish_step(run, step, "failed")
+        run.last_error = error
+        self._set_status(run, "failed")
+        self._emit(run, "done", "[DONE]")
+
+    async def _execute(self, run: _FakeRun):
+        try:
+            await self._generate(run)
+        except asyncio.CancelledError:
+            self._cancelled(run)
+
+    def _cancelled(self, run: _FakeRun):
+        # Like the service, a cancelled run still reports (and is billed for) the tokens it used so far.
+        for step in run.steps:
+            if step["status"] == "in_progress":
+                self._finish_step(run, step, "cancelled")
+        prompt_tokens = sum(step["usage"]["prompt_tokens"] for step in run.steps) + run.prompt_tokens
+        completion_tokens = sum(step["usage"]["completion_tokens"] for step in run.steps) + self._tokens(run.streamed)
+        quota = self.quotas.get(self.models.get(run.agent_id))
+        if quota:
+            quota.record(prompt_tokens + completion_tokens)
+        run.usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        self._set_status(run, "cancelled")
+        self._emit(run, "done", "[DONE]")
+
+    async def _generate(self, run: _FakeRun):
+        history = self._threads[run.thread_id]
+        total = self.latency.get(run.agent_id, 0.0) * self.speed
+        if self.jitter:
+            total *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+        fails = self.failure_rate and self.rng.random() < self.failure_rate
+        self._set_status(run, "in_progress")
+
+        calls = self.function_calls.get(run.agent_id, lambda history: None)(history)
+        if calls:
+            # The model decides on the tool call, then waits for the caller to submit its output.
+            await asyncio.sleep(total * 0.2)
+            tool_calls = [
+                {"id": f"call_{next(self._ids)}", "type": "function", "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+                for call in calls
+            ]
+            step = self._add_step(run, "tool_calls", {"tool_calls": tool_calls})
+            run.tool_outputs = asyncio.get_running_loop().create_future()
+            run.required_action = {"type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": tool_calls}}
+            self._set_status(run, "requires_action")
+            outputs = await run.tool_outputs
+            history.extend({"role": "tool", "content": str(output.get("output", "")), "message": None} for output in outputs)
+            self._finish_step(run, step, prompt_tokens=self._tokens("".join(m["content"] for m in history)), completion_tokens=self._tokens(json.dumps(calls)))
+            self._set_status(run, "in_progress")
+            total *= 0.8
+
+        # Most of a run is spent before the first token (tools, prompt processing); the rest streams out.
+        run.prompt_tokens = self._tokens("".join(m["content"] for m in history))
+        await asyncio.sleep(total * FIRST_TOKEN_FRACTION)
+        if fails:
+            self._fail(run, SERVER_ERROR)
+            return
+        text, citations = self.responders[run.agent_id](history)
+        if self.malformed_rate and run.agent_id in self.structured and self.rng.random() < self.malformed_rate:
+            text = malformed(text, self.rng)
+        message_id = f"msg_{next(self._ids)}"
+        step = self._add_step(run, "message_creation", {"message_creation": {"message_id": message_id}})
+        self._emit(run, "thread.message.created", _message_dict(message_id, run, "", [], "in_progress"))
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+        for chunk in chunks:
+            run.streamed += chunk
+            self._emit(run, "thread.message.delta", {
+                "id": message_id,
+                "object": "thread.message.delta",
+                "delta": {"role": "assistant", "content": [{"index": 0, "type": "text", "text": {"value": chunk}}]},
+            })
+            await asyncio.sleep(total * (1 - FIRST_TOKEN_FRACTION) / len(chunks))
+        message = _message_dict(message_id, run, text, citations, "completed")
+        history.append({"role": "assistant", "content": text, "message": ThreadMessage(message)})
+        self._emit(run, "thread.message.completed", message)
+
+        prompt_tokens = self._tokens("".join(m["content"] for m in history[:-1]))
+        completion_tokens = self._tokens(text)
+        self._finish_step(run, step, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        run.prompt_tokens, run.streamed = 0, ""
+        prompt_tokens = sum(step["usage"]["prompt_tokens"] for step in run.steps)
+        completion_tokens = sum(step["usage"]["completion_tokens"] for step in run.steps)
+        quota = self.quotas.get(self.models.get(run.agent_id))
+        if quota:
+            quota.record(prompt_tokens + completion_tokens)
+        run.usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        self._set_status(run, "completed")
+        self._emit(run, "done", "[DONE]")
+
+    def _start(self, thread_id: str, agent_id: str) -> _FakeRun:
+        self._agent(agent_id)
+        if agent_id not in self.responders:
+            raise ValueError(f"Agent {agent_id} ({self._agents[agent_id]['name']}) has no fake responder; map its name in agent_stages.")
+        run = _FakeRun(f"run_{next(self._ids)}", thread_id, agent_id)
+        self._runs[run.id] = run
+        self._emit(run, "thread.run.created", run.as_dict())
+        quota = self.quotas.get(self.models.get(agent_id))
+        retry_after = quota.retry_after() if quota else None
+        if retry_after is not None:
+            self._fail(run, {"code": "rate_limit_exceeded", "message": f"Rate limit is exceeded. Try again in {retry_after:.2f} seconds."})
+        else:
+            run.task = asyncio.create_task(self._execute(run))
+        return run
+
+    async def _create_run(self, thread_id: str, agent_id: str, **kwargs):
+        await self._request(thread_id)
+        return ThreadRun(self._start(thread_id, agent_id).as_dict())
+
+    async def _get_run(self, thread_id: str, run_id: str, **kwargs):
+        await self._request(thread_id)
+        return ThreadRun(self._runs[run_id].as_dict())
+
+    def _accept_tool_outputs(self, run: _FakeRun, tool_outputs: list):
+        if run.status != "requires_action":
+            raise ValueError(f"Run {run.id} is {run.status}, not requires_action.")
+        run.required_action = None
+        run.status = "in_progress"
+        run.tool_outputs.set_result(tool_outputs)
+
+    async def _submit_tool_outputs(self, thread_id: str, run_id: str, tool_outputs: list, **kwargs):
+        await self._request(thread_id)
+        self._accept_tool_outputs(self._runs[run_id], tool_outputs)
+        return ThreadRun(self._runs[run_id].as_dict())
+
+    async def _cancel_run(self, thread_id: str, run_id: str, **kwargs):
+        await self._request(thread_id)
+        run = self._runs[run_id]
+        if run.status not in ("queued", "in_progress", "requires_action"):
+            raise HttpResponseError(message=f"Cannot cancel run with status '{run.status}'.")
+        self._set_status(run, "cancelling")
+        run.task.cancel()
+        return ThreadRun(run.as_dict())
+
+    async def _list_run_steps(self, thread_id: str, run_id: str, **kwargs):
+        await self._request(thread_id)
+        for step in list(self._runs[run_id].steps):
+            yield RunStep(step)
+
+    async def _get_run_step(self, thread_id: str, run_id: str, step_id: str, **kwargs):
+        await self._request(thread_id)
+        step = next((step for step in self._runs[run_id].steps if step["id"] == step_id), None)
+        if step is None:
+            raise ResourceNotFoundError(f"No run step found with id '{step_id}'.")
+        return RunStep(step)
+
+    async def _create_and_process(self, thread_id: str, agent_id: str, polling_interval: float = 1, **kwargs):
+        # Same loop as the SDK: fixed-interval polling, local function tools run on requires_action.
+        run = await self._create_run(thread_id, agent_id)
+        while run.status in ("queued", "in_progress", "requires_action"):
+            await asyncio.sleep(polling_interval)
+            run = await self._get_run(thread_id, run.id)
+            if run.status == "requires_action" and self.functions:
+                toolset = AsyncToolSet()
+                toolset.add(self.functions)
+                outputs = await toolset.execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+                await self._submit_tool_outputs(thread_id, run.id, outputs)
+        return run
+
+    async def _event_bytes(self, run: _FakeRun):
+        # Server-sent events until the run finishes or stops for tool outputs.
+        while True:
+            event, data = await run.events.get()
+            payload = data if isinstance(data, str) else json.dumps(data)
+            yield f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+            if event in ("done", "thread.run.requires_action"):
+                return
+
+    async def _handle_submit_tool_outputs(self, run: ThreadRun, event_handler, submit_with_error: bool):
+        if not self.functions:
+            return []
+        toolset = AsyncToolSet()
+        toolset.add(self.functions)
+        outputs = await toolset.execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+        await self._submit_tool_outputs_stream(run.thread_id, run.id, tool_outputs=outputs, event_handler=event_handler)
+        return outputs
+
+    async def _stream(self, thread_id: str, agent_id: str, event_handler=None, **kwargs):
+        await self._request(thread_id)
+        run = self._start(thread_id, agent_id)
+        return AsyncAgentRunStream(self._event_bytes(run), self._handle_submit_tool_outputs, event_handler or AsyncAgentEventHandler())
+
+    async def _submit_tool_outputs_stream(self, thread_id: str, run_id: str, tool_outputs: list, event_handler, **kwargs):
+        await self._request(thread_id)
+        run = self._runs[run_id]
+        self._accept_tool_outputs(run, tool_outputs)
+        event_handler.initialize(self._event_bytes(run), self._handle_submit_tool_outputs)
+
+    async def _last_message(self, thread_id: str, role, **kwargs):
+        await self._request(thread_id)
+        return next((m["message"] for m in reversed(self._threads[thread_id]) if m["role"] == "assistant"), None)
+
+
+class FakeProjectClient:
+    # options are passed to FakeAgentsOperations (models, quotas, rtt, jitter, failure_rate, ...).
+    def __init__(self, responders: dict | None = None, latency: dict | None = None, speed: float = 1.0, **options):
+        self.agents = FakeAgentsOperations(responders or default_responders(), latency or DEFAULT_LATENCY, speed, **options)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
@@ -1,13 +1,19 @@
+from __future__ import annotations
+
+import argparse
 import os
-import jsonref
+import sys
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from azure.identity import DefaultAzureCredential
-from azure.ai.projects import AIProjectClient
-from azure.ai.agents.models import (
-    OpenApiTool,
-    OpenApiConnectionAuthDetails,
-    OpenApiConnectionSecurityScheme,
-)
+
+import cqa_batch_tool
+from credential import CachedCredential
+from registry import ensure_agent
+from toolspec import load_compiled_spec
+
+if TYPE_CHECKING:
+    from azure.ai.projects import AIProjectClient
+    from azure.ai.agents.models import FunctionTool, OpenApiTool
 
 # Load environment variables from .env
 load_dotenv()
@@ -24,6 +30,13 @@ INSTRUCTIONS = """Get answers for the user's questions by using the faq and retu
 You MUST use the FAQ tool. Do not rely on your own knowledge. If the answer is not found by the FAQ tool, say "I don't know" for that specific question.
 ```"""
 
+# FAQ_BATCH_TOOL=1 swaps the OpenAPI tool for the batched function tool in cqa_batch_tool.py,
+# which answers all questions in one tool call. Function tools run in the caller's process,
+# so an agent provisioned this way needs a Python harness that executes its tool calls.
+USE_BATCH_TOOL = os.getenv("FAQ_BATCH_TOOL") == "1"
+if USE_BATCH_TOOL:
+    INSTRUCTIONS += "\n\nSend all of the questions to the FAQ tool in a single call."
+
 
 def get_project_endpoint() -> str:
     endpoint = os.getenv("PROJECT_ENDPOINT")
@@ -33,12 +46,15 @@ def get_project_endpoint() -> str:
 
 
 def create_project_client(endpoint: str) -> AIProjectClient:
-    return AIProjectClient(endpoint=endpoint, credential=DefaultAzureCredential())
+    from azure.ai.projects import AIProjectClient
+
+    return AIProjectClient(endpoint=endpoint, credential=CachedCredential())
 
 
 def load_openapi_tool() -> OpenApiTool:
-    with open(OPENAPI_SPEC_PATH, "r") as f:
-        spec = jsonref.loads(f.read())
+    from azure.ai.agents.models import OpenApiConnectionAuthDetails, OpenApiConnectionSecurityScheme, OpenApiTool
+
+    spec = load_compiled_spec(OPENAPI_SPEC_PATH)
 
     auth = OpenApiConnectionAuthDetails(
         security_scheme=OpenApiConnectionSecurityScheme(connection_id=CONNECTION_ID)
@@ -47,40 +63,24 @@ def load_openapi_tool() -> OpenApiTool:
     return OpenApiTool(name="faq", spec=spec, description="Gets answers to questions", auth=auth)
 
 
-def create_agent(client: AIProjectClient, openapi_tool: OpenApiTool):
-    agent = client.agents.create_agent(
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        tools=openapi_tool.definitions,
-        instructions=INSTRUCTIONS
-    )
-    with open(".env", "a") as f:
-        f.write(f"\n{AGENT_ENV_KEY}={agent.id}")
-    return agent
-
-
-def update_agent(client: AIProjectClient, agent_id: str, openapi_tool: OpenApiTool):
-    return client.agents.update_agent(
-        agent_id=agent_id,
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        tools=openapi_tool.definitions,
-        instructions=INSTRUCTIONS
-    )
+def load_batch_tool() -> FunctionTool:
+    from azure.ai.agents.models import FunctionTool
 
+    return FunctionTool(functions=cqa_batch_tool.FUNCTIONS)
 
-def main():
-    endpoint = get_project_endpoint()
-    client = create_project_client(endpoint)
-    tool = load_openapi_tool()
 
-    agent_id = os.getenv(AGENT_ENV_KEY)
-    if not agent_id:
-        agent = create_agent(client, tool)
-    else:
-        agent = update_agent(client, agent_id, tool)
+def load_tool_definitions() -> list:
+    if USE_BATCH_TOOL:
+        return load_batch_tool().definitions
+    return load_openapi_tool().definitions
 
-    print(f"{AGENT_NAME} ready with ID: {agent.id}")
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Create or update the {AGENT_NAME}.")
+    parser.add_argument("--force", action="store_true", help="update the agent even if its definition is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="show which fields would change, without calling Azure")
+    args = parser.parse_args()
+    ensure_agent(sys.modules[__name__], get_project_endpoint(), create_project_client, force=args.force, dry_run=args.dry_run)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,16 @@
+from __future__ import annotations
+
+import argparse
 import os
+import sys
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from azure.identity import DefaultAzureCredential
-from azure.ai.projects import AIProjectClient
-from azure.ai.agents.models import BingGroundingTool
+
+from credential import CachedCredential
+from registry import ensure_agent
+
+if TYPE_CHECKING:
+    from azure.ai.projects import AIProjectClient
 
 # Load environment variables from .env
 load_dotenv()
@@ -11,7 +19,6 @@ load_dotenv()
 MODEL_NAME = "gpt-4.1-mini"
 AGENT_NAME = "FAQ Agent JSON Formatter"
 AGENT_ENV_KEY = "FAQ_AGENT_TO_JSON_ID"
-CONNECTION_ID = "/subscriptions/8038977e-bdd7-447a-a194-d640a385ebcf/resourceGroups/rg-admin-0541/providers/Microsoft.CognitiveServices/accounts/mabolan-build-2025-demo-resource/projects/mabolan-build-2025-demo/connections/binggourndingbuild"
 
 INSTRUCTIONS = """Reformat the answers to this format:
 ```json
@@ -35,7 +42,7 @@ RESPONSE_FORMAT = {
                             "question_id": {"type": "string"},
                             "answer": {"type": "string"},
                         },
-                        "required": ["question", "answer"],
+                        "required": ["question_id", "answer"],
                     },
                 },
                 "unanswered_questions": {
@@ -59,48 +66,17 @@ def get_project_endpoint() -> str:
 
 
 def create_project_client(endpoint: str) -> AIProjectClient:
-    return AIProjectClient(endpoint=endpoint, credential=DefaultAzureCredential())
-
-
-def load_bing_tool() -> BingGroundingTool:
-    return BingGroundingTool(connection_id=CONNECTION_ID)
-
+    from azure.ai.projects import AIProjectClient
 
-def create_agent(client: AIProjectClient, tool: BingGroundingTool):
-    agent = client.agents.create_agent(
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        response_format=RESPONSE_FORMAT,
-        instructions=INSTRUCTIONS
-    )
-    with open(".env", "a") as f:
-        f.write(f"\n{AGENT_ENV_KEY}={agent.id}")
-    return agent
-
-
-def update_agent(client: AIProjectClient, agent_id: str, tool: BingGroundingTool):
-    return client.agents.update_agent(
-        agent_id=agent_id,
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        response_format=RESPONSE_FORMAT,
-        instructions=INSTRUCTIONS
-    )
+    return AIProjectClient(endpoint=endpoint, credential=CachedCredential())
 
 
 def main():
-    endpoint = get_project_endpoint()
-    client = create_project_client(endpoint)
-
-    tool = load_bing_tool()
-
-    agent_id = os.getenv(AGENT_ENV_KEY)
-    if not agent_id:
-        agent = create_agent(client, tool)
-    else:
-        agent = update_agent(client, agent_id, tool)
-
-    print(f"{AGENT_NAME} ready with ID: {agent.id}")
+    parser = argparse.ArgumentParser(description=f"Create or update the {AGENT_NAME}.")
+    parser.add_argument("--force", action="store_true", help="update the agent even if its definition is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="show which fields would change, without calling Azure")
+    args = parser.parse_args()
+    ensure_agent(sys.modules[__name__], get_project_endpoint(), create_project_client, force=args.force, dry_run=args.dry_run)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import argparse
+import csv
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+# Same default as QueryKBInput.confidenceScoreThreshold in tools/cqa_tool.json.
+DEFAULT_CONFIDENCE_THRESHOLD = 0.6
+# Knowledge base export used by the pipeline to answer FAQ hits locally.
+FAQ_KB_PATH_ENV = "FAQ_KB_PATH"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOPWORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "how", "i", "in", "is", "it", "me",
+    "my", "of", "on", "or", "the", "to", "what", "when", "where", "which", "who", "why", "with", "you",
+}
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in normalize(text).split(" ") if token and token not in STOPWORDS]
+
+
+class FaqIndex:
+    def __init__(self):
+        # One "document" per question phrasing; several may point at the same QnA pair.
+        self.qnas = {}
+        self._doc_qna = []
+        self._doc_terms = []
+        self._doc_len = []
+        self._exact = {}
+        self._postings = defaultdict(list)
+        self._weights = {}
+        self._idf = {}
+        self._doc_self = []
+        self._avg_len = 0.0
+        self._stale = True
+
+    def __len__(self) -> int:
+        return len(self.qnas)
+
+    def add(self, qna_id, questions: list[str], answer: str):
+        qna_id = str(qna_id)
+        entry = self.qnas.setdefault(qna_id, {"id": qna_id, "answer": answer, "questions": []})
+        entry["answer"] = answer
+        for question in questions:
+            entry["questions"].append(question)
+            doc = len(self._doc_qna)
+            terms = Counter(tokenize(question))
+            self._doc_qna.append(qna_id)
+            self._doc_terms.append(terms)
+            self._doc_len.append(sum(terms.values()))
+            self._exact.setdefault(normalize(question), qna_id)
+            for term, tf in terms.items():
+                self._postings[term].append((doc, tf))
+        self._stale = True
+
+    def _prepare(self):
+        if not self._stale or not self._doc_qna:
+            return
+        n = len(self._doc_qna)
+        self._avg_len = sum(self._doc_len) / n
+        self._idf = {term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for term, docs in self._postings.items()}
+        self._doc_self = [self._self_score(terms) for terms in self._doc_terms]
+        # Precomputed BM25 contribution of each (term, doc) pair; a query is then just sums.
+        self._weights = {
+            term: [(doc, self._term_score(term, tf, self._doc_len[doc])) for doc, tf in docs]
+            for term, docs in self._postings.items()
+        }
+        self._stale = False
+
+    def _term_score(self, term: str, tf: int, doc_len: int) -> float:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / self._avg_len)
+        return self._idf.get(term, 0.0) * tf * (BM25_K1 + 1) / (tf + norm)
+
+    def _self_score(self, terms: Counter) -> float:
+        length = sum(terms.values())
+        return sum(self._term_score(term, tf, length) for term, tf in terms.items())
+
+    def query(self, question: str, top: int = 5, confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD) -> list[dict]:
+        self._prepare()
+        qna_id = self._exact.get(normalize(question))
+        if qna_id is not None:
+            return [self._answer(qna_id, 1.0)]
+
+        terms = Counter(tokenize(question))
+        scores = defaultdict(float)
+        for term in terms:
+            for doc, weight in self._weights.get(term, ()):
+                scores[doc] += weight
+        if not scores:
+            return []
+
+        # BM25 is unbounded. Scale it to CQA's 0..1 confidenceScore by how much of the question
+        # and how much of the KB phrasing the match covers (each relative to its own self-score).
+        # Question terms the KB knows but this phrasing lacks ("deploy" asked, "debug" indexed) mean
+        # a different question, so their share of the question is taken off again, squared. Words
+        # the KB never uses (greetings, filler) carry no IDF and cost nothing.
+        query_self = self._self_score(terms)
+        query_len = sum(terms.values())
+        known = {term: self._term_score(term, tf, query_len) for term, tf in terms.items() if term in self._idf}
+        best = {}
+        for doc, score in heapq.nlargest(max(4 * top, 16), scores.items(), key=itemgetter(1)):
+            missing = sum(weight for term, weight in known.items() if term not in self._doc_terms[doc])
+            confidence = (score / query_self) * (score / self._doc_self[doc]) * (1 - missing / query_self) ** 2
+            qna_id = self._doc_qna[doc]
+            best[qna_id] = max(best.get(qna_id, 0.0), confidence)
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        return [self._answer(qna_id, score) for qna_id, score in ranked[:top] if score >= confidence_threshold]
+
+    def answer(self, question: str, confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD) -> dict | None:
+        answers = self.query(question, top=1, confidence_threshold=confidence_threshold)
+        return answers[0] if answers else None
+
+    def _answer(self, qna_id: str, score: float) -> dict:
+        entry = self.qnas[qna_id]
+        return {"id": qna_id, "answer": entry["answer"], "questions": entry["questions"], "confidenceScore": round(min(score, 1.0), 4)}
+
+
+def load_kb(path: str) -> FaqIndex:
+    index = FaqIndex()
+    if path.endswith((".tsv", ".txt")):
+        # Custom Question Answering / QnA Maker TSV export: one row per question phrasing.
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            grouped = {}
+            for number, row in enumerate(csv.DictReader(f, delimiter="\t")):
+                qna_id = row.get("QnaId") or row.get("Id") or str(number)
+                grouped.setdefault(qna_id, {"questions": [], "answer": row["Answer"]})["questions"].append(row["Question"])
+        for qna_id, qna in grouped.items():
+            index.add(qna_id, qna["questions"], qna["answer"])
+        return index
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        # CQA project export ({"Assets": {"Qnas": [...]}}) or the REST list-qnas payload ({"value": [...]}).
+        data = data.get("Assets", {}).get("Qnas") or data.get("qnas") or data.get("value") or []
+    for number, qna in enumerate(data):
+        qna = {key.lower(): value for key, value in qna.items()}
+        index.add(qna.get("id", number), qna.get("questions", []), qna["answer"])
+    return index
+
+
+def load_default_kb() -> FaqIndex | None:
+    path = os.getenv(FAQ_KB_PATH_ENV)
+    return load_kb(path) if path else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer questions from a local FAQ knowledge base export.")
+    parser.add_argument("kb", help="knowledge base export (.tsv or .json)")
+    parser.add_argument("questions", nargs="+")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    index = load_kb(args.kb)
+    for question in args.questions:
+        answer = index.answer(question, args.threshold)
+        if answer:
+            print(f"{question} -> [{answer['confidenceScore']:.2f}] {answer['answer']}")
+        else:
+            print(f"{question} -> (no match, ask the FAQ agent)")
+
+
+if __name__ == "__main__":
+    main()
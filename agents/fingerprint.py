@@ -0,0 +1,79 @@
+import difflib
+import hashlib
+import json
+
+# Fields of an agent definition that are sent to create_agent/update_agent.
+DEFINITION_FIELDS = ("model", "name", "instructions", "tools", "response_format")
+
+
+def _plain(value):
+    # SDK models (e.g. OpenApiToolDefinition) serialize themselves to the wire format.
+    if hasattr(value, "as_dict"):
+        return _plain(value.as_dict())
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def load_tools(module) -> list | None:
+    if hasattr(module, "load_tool_definitions"):
+        return module.load_tool_definitions()
+    tool = getattr(module, "TOOL", None)
+    if tool is None:
+        return None
+    return tool if isinstance(tool, list) else [tool]
+
+
+def agent_definition(module) -> dict:
+    definition = {
+        "model": module.MODEL_NAME,
+        "name": module.AGENT_NAME,
+        "instructions": module.INSTRUCTIONS,
+    }
+    tools = load_tools(module)
+    if tools:
+        definition["tools"] = tools
+    response_format = getattr(module, "RESPONSE_FORMAT", None)
+    if response_format:
+        definition["response_format"] = response_format
+    return definition
+
+
+def canonical_definition(definition: dict) -> dict:
+    return {field: _plain(definition.get(field)) for field in DEFINITION_FIELDS}
+
+
+def canonical_json(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def fingerprint(definition: dict) -> str:
+    canonical = canonical_definition(definition)
+    return hashlib.sha256(canonical_json(canonical).encode("utf-8")).hexdigest()
+
+
+def changed_fields(old: dict | None, new: dict) -> list[str]:
+    new = canonical_definition(new)
+    if old is None:
+        return [field for field in DEFINITION_FIELDS if new[field] is not None]
+    old = canonical_definition(old)
+    return [field for field in DEFINITION_FIELDS if canonical_json(old[field]) != canonical_json(new[field])]
+
+
+def _lines(value) -> list[str]:
+    if isinstance(value, str):
+        return value.splitlines()
+    return json.dumps(value, indent=2, sort_keys=True).splitlines()
+
+
+def diff_definitions(old: dict | None, new: dict) -> str:
+    old = canonical_definition(old or {})
+    new = canonical_definition(new)
+    lines = []
+    for field in changed_fields(old, new):
+        before = _lines(old[field])
+        after = _lines(new[field])
+        lines.extend(difflib.unified_diff(before, after, f"{field} (deployed)", f"{field} (local)", lineterm=""))
+    return "\n".join(lines)
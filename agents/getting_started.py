@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 from azure.identity import DefaultAzureCredential
 from azure.ai.projects import AIProjectClient
 
+from registry import AgentRegistry
+
 # Load environment variables from .env
 load_dotenv()
 
@@ -35,7 +37,8 @@ agent = client.agents.create_agent(
 )
 
 # Save the agent ID for later use
-with open(".env", "a") as f:
-    f.write(f"\n{AGENT_ENV_KEY}={agent.id}")
+registry = AgentRegistry()
+registry.record(AGENT_ENV_KEY, agent.id, endpoint=endpoint)
+registry.export_env()
 
 print(f"{AGENT_NAME} created with ID: {agent.id}")
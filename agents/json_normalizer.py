@@ -0,0 +1,184 @@
+import json
+import re
+from typing import Awaitable, Callable, NamedTuple
+
+from faq_agent_to_json import RESPONSE_FORMAT
+from faq_index import normalize
+from schema import compile_response_format
+
+# faq_agent_to_json.py and rag_agent_to_json.py share the same answered_questions schema.
+validate_answers = compile_response_format(RESPONSE_FORMAT)
+# Stricter check of the agents' own JSON, to find the items that need asking again.
+check_items = compile_response_format(RESPONSE_FORMAT, non_empty=True)
+
+DONT_KNOW = re.compile(
+    r"\b(i\s+don'?t\s+know|i\s+do\s+not\s+know|no\s+answer\s+(was\s+)?found|"
+    r"not\s+found\s+in\s+the\s+(faq|knowledge\s+base)|(couldn'?t|could\s+not)\s+find)\b",
+    re.IGNORECASE,
+)
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+# "233414: answer", "- **233414**: answer", "ID 233414 - answer", "1. 233414: answer"
+_ID_LINE = re.compile(
+    r"^\s*(?:[-*•]\s*|\d+[.)]\s*)?(?:\*\*)?(?:(?:question\s*)?id\s*[:#]?\s*)?"
+    r"([A-Za-z0-9_-]{3,})(?:\*\*)?\s*[:\-–—]\s*(?:\*\*)?\s*(.*)$",
+    re.IGNORECASE,
+)
+_ANSWER_PREFIX = re.compile(r"^\s*(?:[-*]\s*)?(?:\*\*)?answer(?:\*\*)?\s*:\s*(?:\*\*)?\s*", re.IGNORECASE)
+
+
+def _json_candidates(text: str):
+    yield from _FENCE.findall(text)
+    yield text
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        yield text[start:end + 1]
+    start, end = text.find("["), text.rfind("]")
+    if 0 <= start < end:
+        yield text[start:end + 1]
+
+
+def _from_json(data) -> dict | None:
+    # Returns {question_id: answer or None}.
+    if isinstance(data, dict) and "answered_questions" in data:
+        answers = {str(item.get("question_id", item.get("id"))): item.get("answer") for item in data.get("answered_questions") or [] if isinstance(item, dict)}
+        answers.update({str(question_id): None for question_id in data.get("unanswered_questions") or [] if question_id})
+        return answers
+    if isinstance(data, dict) and isinstance(data.get("answers"), list):
+        data = data["answers"]
+    if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+        return {str(item.get("question_id", item.get("id"))): item.get("answer") for item in data}
+    if isinstance(data, dict) and all(isinstance(value, (str, type(None))) for value in data.values()):
+        return {str(key): value for key, value in data.items()}
+    return None
+
+
+def _from_lines(text: str, questions: dict) -> dict | None:
+    answers = {}
+    current = None
+    for line in text.splitlines():
+        match = _ID_LINE.match(line)
+        question_id = match.group(1) if match else None
+        if question_id and (question_id in questions if questions else any(c.isdigit() for c in question_id)):
+            current = question_id
+            content = match.group(2).strip()
+            # Models often echo "ID: question" and put the answer on the next line.
+            if questions and normalize(content) == normalize(questions[current]):
+                content = ""
+            answers[current] = [content] if content else []
+        elif current and line.strip():
+            answers[current].append(_ANSWER_PREFIX.sub("", line).strip())
+    return {question_id: "\n".join(parts).strip() for question_id, parts in answers.items()} or None
+
+
+def _item_issues(data) -> dict:
+    # {question_id: issue} for the answered_questions items of data that fail the schema.
+    items = data.get("answered_questions") if isinstance(data, dict) else None
+    issues = {}
+    for issue in check_items(data) if isinstance(items, list) else []:
+        if len(issue.path) > 1 and issue.path[0] == "answered_questions":
+            item = items[issue.path[1]]
+            question_id = item.get("question_id", item.get("id")) if isinstance(item, dict) else None
+            if question_id not in (None, ""):
+                issues.setdefault(str(question_id), str(issue))
+    return issues
+
+
+def _parse(text: str, questions: dict) -> tuple[dict | None, dict]:
+    # ({question_id: answer or None}, {question_id: schema issue}) from the first JSON candidate that
+    # has answers, else from "ID: answer" lines.
+    for candidate in _json_candidates(text):
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            # Models often leave a comma after the last item or property.
+            try:
+                data = json.loads(_TRAILING_COMMA.sub(r"\1", candidate))
+            except ValueError:
+                continue
+        found = _from_json(data)
+        if found:
+            return found, _item_issues(data)
+    return _from_lines(text, questions), {}
+
+
+def _is_answer(answer) -> bool:
+    return isinstance(answer, str) and bool(answer.strip()) and not DONT_KNOW.search(answer)
+
+
+def check_answers(text: str, questions: dict | None = None) -> tuple[dict | None, dict]:
+    # Returns (answers, gaps). answers is what parse_answers returns; gaps maps each question_id whose
+    # item is missing, empty or invalid (and so counts as unanswered in answers) to what is wrong with it.
+    # Questions the agent says it can't answer are not gaps.
+    questions = questions or {}
+    found, invalid = _parse(text, questions)
+    if questions and found:
+        found = {question_id: answer for question_id, answer in found.items() if question_id in questions}
+    if not found:
+        return None, {question_id: "no answer could be parsed" for question_id in questions}
+
+    ids = list(questions) or list(found)
+    gaps = {}
+    for question_id in ids:
+        answer = found.get(question_id)
+        if question_id in invalid:
+            gaps[question_id] = invalid[question_id]
+        elif question_id not in found:
+            gaps[question_id] = "missing"
+        elif answer is not None and not (isinstance(answer, str) and answer.strip()):
+            gaps[question_id] = "empty answer"
+    result = {
+        "answered_questions": [
+            {"question_id": question_id, "answer": found[question_id].strip()}
+            for question_id in ids if _is_answer(found.get(question_id))
+        ],
+        "unanswered_questions": [question_id for question_id in ids if not _is_answer(found.get(question_id))],
+    }
+    return (result if not validate_answers(result) else None), gaps
+
+
+def parse_answers(text: str, questions: dict | None = None) -> dict | None:
+    # questions maps question_id -> question text (as sent to the FAQ/RAG agent), when known.
+    return check_answers(text, questions)[0]
+
+
+def merge_answers(answers: dict | None, update: dict | None, ids: list) -> dict | None:
+    # answers with the items of update taking the place of theirs; ids orders the result.
+    if update is None:
+        return answers
+    merged = {item["question_id"]: item["answer"] for item in (answers or {}).get("answered_questions", [])}
+    for question_id in (answers or {}).get("unanswered_questions", []) + update["unanswered_questions"]:
+        merged[question_id] = None
+    merged.update({item["question_id"]: item["answer"] for item in update["answered_questions"]})
+    return {
+        "answered_questions": [{"question_id": question_id, "answer": merged[question_id]} for question_id in ids if merged.get(question_id)],
+        "unanswered_questions": [question_id for question_id in ids if not merged.get(question_id)],
+    }
+
+
+class NormalizedAnswers(NamedTuple):
+    answers: dict | None
+    used_formatter: bool
+    checks: tuple  # (step, gaps) per output checked, step being "output", "formatter" or "retry"
+
+
+async def normalize_answers(
+    text: str,
+    questions: dict | None = None,
+    formatter: Callable[[str], Awaitable[str]] | None = None,
+    retry: Callable[[dict], Awaitable[str]] | None = None,
+) -> NormalizedAnswers:
+    # The *_to_json agent is only run when parsing fails. If items are still missing or invalid,
+    # retry(gaps) asks again for just those question IDs and its answers replace theirs.
+    questions = questions or {}
+    result, gaps = check_answers(text, questions)
+    checks = [("output", gaps)]
+    used_formatter = result is None and formatter is not None
+    if used_formatter:
+        result, gaps = check_answers(await formatter(text), questions)
+        checks.append(("formatter", gaps))
+    if gaps and retry is not None and questions:
+        update, gaps = check_answers(await retry(gaps), {question_id: questions[question_id] for question_id in gaps})
+        result = merge_answers(result, update, list(questions))
+        checks.append(("retry", gaps))
+    return NormalizedAnswers(result, used_formatter, tuple(checks))
@@ -0,0 +1,879 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Protocol
+
+from dotenv import load_dotenv
+from azure.ai.agents.models import AsyncFunctionTool, MessageRole
+
+import doc_search_tool
+import faq_agent
+import faq_agent_to_json
+import rag_agent
+import rag_agent_to_json
+import reply_agent
+import tracing
+import triage_agent
+from answer_cache import AnswerCache
+from cascade import MINI_MODULES, Cascade, mini_stage
+from coalesce import QuestionCoalescer
+from dedup import DuplicateIndex, body_key
+from cassette import REPLAY_HOST, Cassette, CassetteAdapter, CassetteMissError, RecordingTransport, Replayer, ReplayCredential, ReplayTransport
+from faq_index import FAQ_KB_PATH_ENV, FaqIndex, load_default_kb
+from json_normalizer import normalize_answers
+from registry import AgentRegistry
+from reply_template import REPLY_ENDPOINT_ENV, ReplySendError, TemplateReplies, load_default_replies, polish_reason, render_reply
+from router import QuestionRouter
+from run_executor import RunCancelledError, RunOutcome, poll_run, stream_run
+from scheduler import INTERACTIVE, RateLimitError, RateLimitScheduler, default_scheduler, parse_retry_after
+from schema import SchemaIssue, ValidationStats, compile_response_format
+from speculate import ANSWER_MODES, SpeculativeRag
+from thread_pool import ThreadManager
+from tracing import SPAN_KIND_CLIENT, Span, Tracer, tracer as default_tracer
+
+# Load environment variables from .env
+load_dotenv()
+
+# Pipeline stage -> the script that provisions its agent (AGENT_ENV_KEY, MODEL_NAME).
+STAGE_MODULES = {
+    "triage": triage_agent,
+    "faq": faq_agent,
+    "faq_to_json": faq_agent_to_json,
+    "rag": rag_agent,
+    "rag_to_json": rag_agent_to_json,
+    "reply": reply_agent,
+}
+QUESTION_ID_LENGTH = 6
+QUESTION_ID_ALPHABET = string.ascii_letters + string.digits
+# Question IDs are random, so replayed cassettes match them by shape ("Ab12Cd: ...").
+QUESTION_ID_PATTERN = rf"\b[A-Za-z0-9]{{{QUESTION_ID_LENGTH}}}(?=: )"
+# Same prompts as the .NET host (SupportBuddy).
+FORMATTER_MESSAGE = "convert to json"
+REPLY_MESSAGE = "Please compose a response email using the following answers:\n"
+# Follow-ups on the same thread when an output has missing or invalid items; only those are asked again.
+TRIAGE_RETRY_MESSAGE = "Your breakdown didn't match the expected JSON format:\n{issues}\nReply with the corrected JSON only."
+ANSWERS_RETRY_MESSAGE = "Some answers were missing or invalid ({gaps}). Answer just these questions again, in the same format as before:\n"
+
+validate_triage = compile_response_format(triage_agent.RESPONSE_FORMAT, non_empty=True)
+
+
+class AgentRunError(RuntimeError):
+    pass
+
+
+@dataclass
+class RunResult:
+    text: str
+    thread_id: str
+    run_id: str | None = None
+    usage: dict = field(default_factory=dict)
+    citations: list = field(default_factory=list)
+    ttft: float | None = None
+
+
+class AgentClient(Protocol):
+    async def run(self, agent_id: str, message: str, thread_id: str | None = None) -> RunResult:
+        ...
+
+
+class FoundryAgentClient:
+    # Runs agents through an azure.ai.projects.aio.AIProjectClient (or fake_foundry.FakeProjectClient).
+    # mode "stream" consumes the run's event stream (falling back to polling if streaming fails);
+    # mode "poll" polls with adaptive backoff. on_delta(agent_id, text) sees message text as it streams.
+    # With a scheduler, each run waits for quota on its model deployment (models maps agent ID -> model).
+    # Every run is a span named after the agent (names maps agent ID -> AGENT_NAME), with tool calls as
+    # child spans.
+    def __init__(
+        self,
+        project_client,
+        mode: str = "stream",
+        scheduler: RateLimitScheduler | None = None,
+        models: dict | None = None,
+        priority: int = INTERACTIVE,
+        on_delta: Callable[[str, str], None] | None = None,
+        names: dict | None = None,
+        tracer: Tracer | None = None,
+    ):
+        self.agents = project_client.agents
+        self.mode = mode if hasattr(self.agents.runs, "stream") else "poll"
+        self.scheduler = scheduler
+        self.models = models or {}
+        self.priority = priority
+        self.on_delta = on_delta
+        self.names = names or {}
+        self.tracer = tracer or default_tracer
+        self.functions = None
+        functions = set()
+        # Function tools are executed here, on the event loop, so only their async versions are
+        # registered: a sync tool would hold up every other email while it runs.
+        if faq_agent.USE_BATCH_TOOL:
+            # The batched FAQ tool is a function tool, so its calls are executed here.
+            import cqa_batch_tool
+            functions |= cqa_batch_tool.ASYNC_FUNCTIONS
+        if rag_agent.USE_DOCS_TOOL:
+            # So is the RAG agent's search over the local docs index.
+            functions |= doc_search_tool.ASYNC_FUNCTIONS
+        if functions:
+            functions = {self.tracer.traced_tool(function) for function in functions}
+            self.functions = AsyncFunctionTool(functions)
+            self.agents.enable_auto_function_calls(functions)
+
+    async def _execute(self, thread_id: str, agent_id: str) -> RunOutcome:
+        # Polled runs only list their steps when spans are exported, since that costs a request.
+        list_steps = bool(self.tracer.exporters)
+        if self.mode == "stream":
+            on_delta = (lambda text: self.on_delta(agent_id, text)) if self.on_delta else None
+            outcome = await stream_run(self.agents, thread_id, agent_id, self.functions, on_delta, list_steps=list_steps)
+        else:
+            outcome = await poll_run(self.agents, thread_id, agent_id, self.functions, list_steps=list_steps)
+        run = outcome.run
+        error = run.last_error or {}
+        if run.status == "failed" and error.get("code") == "rate_limit_exceeded":
+            raise RateLimitError(error.get("message", "Rate limit exceeded"), parse_retry_after(error.get("message")))
+        return outcome
+
+    async def run(self, agent_id: str, message: str, thread_id: str | None = None) -> RunResult:
+        name = self.names.get(agent_id, agent_id)
+        model = self.models.get(agent_id)
+        attributes = {"gen_ai.operation.name": "invoke_agent", "gen_ai.agent.id": agent_id, "gen_ai.agent.name": name, "gen_ai.request.model": model}
+        with self.tracer.span(name, attributes, SPAN_KIND_CLIENT) as span, doc_search_tool.collect() as passages:
+            result = await self._run(span, agent_id, message, thread_id)
+            # Doc passages the answer cites by URL count as citations, like Bing's url_citation annotations.
+            result.citations += doc_search_tool.cited(result.text, passages)
+            span.update({"gen_ai.thread.id": result.thread_id, "gen_ai.thread.run.id": result.run_id})
+            return result
+
+    async def _run(self, span, agent_id: str, message: str, thread_id: str | None) -> RunResult:
+        if thread_id is None:
+            thread_id = (await self.agents.threads.create()).id
+        await self.agents.messages.create(thread_id=thread_id, role=MessageRole.USER, content=message)
+
+        queued = time.perf_counter()
+        dispatches = []
+
+        def execute():
+            dispatches.append(time.perf_counter())
+            return self._execute(thread_id, agent_id)
+
+        try:
+            if self.scheduler is None:
+                outcome = await execute()
+            else:
+                outcome = await self.scheduler.run(
+                    self.models.get(agent_id, agent_id), execute, self.priority, key=agent_id,
+                    usage=lambda outcome: outcome.run.usage.total_tokens if outcome.run.usage else 0,
+                )
+        except RunCancelledError as e:
+            usage = e.run.usage if e.run is not None else None
+            span.update({
+                "gen_ai.thread.id": thread_id,
+                "gen_ai.thread.run.id": e.run.id if e.run is not None else None,
+                "run.status": e.run.status if e.run is not None else "cancelled",
+                "gen_ai.usage.input_tokens": usage.prompt_tokens if usage else None,
+                "gen_ai.usage.output_tokens": usage.completion_tokens if usage else None,
+            })
+            raise
+        run = outcome.run
+        span.update({
+            "queue.wait": round(dispatches[0] - queued, 4),
+            "queue.retries": len(dispatches) - 1,
+            "run.mode": outcome.mode,
+            "run.requests": outcome.requests,
+            "run.ttft": round(outcome.ttft, 4) if outcome.ttft is not None else None,
+            "gen_ai.usage.input_tokens": run.usage.prompt_tokens if run.usage else None,
+            "gen_ai.usage.output_tokens": run.usage.completion_tokens if run.usage else None,
+        })
+        for step in outcome.tool_steps:
+            # Local function tools have their own spans (traced_tool); these are the server-side ones.
+            if step["type"] != "function":
+                self.tracer.record(
+                    f"execute_tool {step['name']}", step["start_ns"], step["end_ns"],
+                    {"gen_ai.tool.name": step["name"], "gen_ai.tool.type": step["type"]},
+                    error=None if step["status"] in (None, "completed") else f"tool call {step['status']}",
+                )
+        if run.status != "completed":
+            raise AgentRunError(f"Run {run.id} of agent {agent_id} ended with status {run.status}: {run.last_error}")
+
+        # A streamed run already delivered the final message.
+        reply = outcome.message or await self.agents.messages.get_last_message_by_role(thread_id=thread_id, role=MessageRole.AGENT)
+        text = "\n".join(part.text.value for part in reply.text_messages) if reply else ""
+        citations = [
+            {"url": annotation.url_citation.url, "title": annotation.url_citation.title}
+            for annotation in (reply.url_citation_annotations if reply else [])
+        ]
+        usage = {"prompt_tokens": run.usage.prompt_tokens, "completion_tokens": run.usage.completion_tokens} if run.usage else {}
+        return RunResult(text, thread_id, run.id, usage, citations, outcome.ttft)
+
+
+class Timeline:
+    # Wall-clock spans per stage; each span names the spans it waited for.
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.origin = clock()
+        self.spans = {}
+
+    async def span(self, name: str, after: list, awaitable):
+        start = self.clock() - self.origin
+        try:
+            return await awaitable
+        finally:
+            self.spans[name] = {"start": start, "end": self.clock() - self.origin, "after": list(after)}
+
+    def timings(self) -> dict:
+        return {name: round(span["end"] - span["start"], 4) for name, span in self.spans.items()}
+
+    def critical_path(self) -> list[str]:
+        # Walk back from the span that finished last through the dependency that finished last.
+        if not self.spans:
+            return []
+        name = max(self.spans, key=lambda n: self.spans[n]["end"])
+        path = [name]
+        while True:
+            after = [n for n in self.spans[name]["after"] if n in self.spans]
+            if not after:
+                return path[::-1]
+            name = max(after, key=lambda n: self.spans[n]["end"])
+            path.append(name)
+
+
+def new_question_id() -> str:
+    return "".join(random.choices(QUESTION_ID_ALPHABET, k=QUESTION_ID_LENGTH))
+
+
+def format_email(email: dict) -> str:
+    return f"ID: {email.get('id', '')}\nFrom: {email.get('from', '')}\nTo: {email.get('to', '')}\nSubject: {email.get('subject', '')}\n\n{email.get('body', '')}"
+
+
+def load_agent_ids(endpoint: str | None = None, stages: dict | None = None) -> tuple[dict, dict]:
+    # Returns (stage -> agent ID, agent ID -> model) for stages (default STAGE_MODULES). Prefers the
+    # registry entry for this project, falls back to the .env value and the script's MODEL_NAME.
+    endpoint = endpoint or os.getenv("PROJECT_ENDPOINT")
+    registry = AgentRegistry()
+    agent_ids, models = {}, {}
+    for stage, module in (stages or STAGE_MODULES).items():
+        entry = registry.lookup(module.AGENT_ENV_KEY, endpoint) if endpoint else None
+        agent_id = entry["agent_id"] if entry else os.getenv(module.AGENT_ENV_KEY)
+        if not agent_id:
+            raise EnvironmentError(f"{module.AGENT_ENV_KEY} is not set; provision the agents first (python agents/provision.py).")
+        agent_ids[stage] = agent_id
+        models[agent_id] = ((entry or {}).get("definition") or {}).get("model", module.MODEL_NAME)
+    return agent_ids, models
+
+
+def check_triage(text: str) -> tuple[dict | None, list]:
+    try:
+        breakdown = json.loads(text)
+    except ValueError as e:
+        return None, [SchemaIssue((), f"invalid JSON: {e}")]
+    return breakdown, validate_triage(breakdown)
+
+
+def answers_retry_message(gaps: dict, questions: dict) -> str:
+    reasons = "; ".join(f"{question_id}: {reason}" for question_id, reason in gaps.items())
+    return ANSWERS_RETRY_MESSAGE.format(gaps=reasons) + "".join(f"{question_id}: {questions[question_id]}\n" for question_id in gaps)
+
+
+def first_answer(answers: dict | None) -> str | None:
+    answered = answers["answered_questions"] if answers else []
+    return answered[0]["answer"] if answered else None
+
+
+@dataclass
+class EmailJob:
+    # State of one email as it moves through the triage, answer and reply stages.
+    email: dict
+    timeline: Timeline = field(default_factory=Timeline)
+    usage: dict = field(default_factory=dict)
+    ttft: dict = field(default_factory=dict)
+    thread_id: str | None = None
+    threads: list = field(default_factory=list)
+    breakdown: dict = field(default_factory=dict)
+    answers: list = field(default_factory=list)
+    reply: str | None = None
+    error: str | None = None
+    span: Span | None = None  # parent of the email's agent run spans, ended by EmailPipeline.finish
+    cascade: dict = field(default_factory=dict)  # run name -> "mini", or why the full agent ran instead
+    routes: dict = field(default_factory=dict)  # question ID -> "faq", "rag", "both", or "faq+rag" after a fallback
+    coalesced: list = field(default_factory=list)  # question IDs answered by another email's runs
+    duplicate_of: str | None = None  # ID of the earlier email with the same body whose triage and answers were reused
+    shared: dict | None = None  # futures of the triage output and answers, shared with its duplicates
+    reply_template: str | None = None  # "sent", or why the Reply Agent wrote the reply instead
+    speculation: dict = field(default_factory=dict)  # question ID -> "faq" (RAG cancelled or unused) or "rag"
+    retries: dict = field(default_factory=dict)  # run name -> "repaired" or "unrepaired", for outputs asked again
+
+    @property
+    def unanswered(self) -> list:
+        return [answer for answer in self.answers if not answer["answer"]]
+
+    def result(self) -> dict:
+        if self.error:
+            return {"email_id": self.email.get("id"), "status": "error", "error": self.error}
+        return {
+            "email_id": self.email.get("id"),
+            "status": "needs_user" if self.unanswered else "replied",
+            "questions": self.answers,
+            "issues": self.breakdown.get("issues", []),
+            "reply": self.reply,
+            "timings": self.timeline.timings(),
+            "critical_path": self.timeline.critical_path(),
+            "total": round(self.timeline.clock() - self.timeline.origin, 4),
+            "ttft": self.ttft,
+            "usage": self.usage,
+            **({"cascade": self.cascade} if self.cascade else {}),
+            **({"routes": self.routes} if self.routes else {}),
+            **({"coalesced": self.coalesced} if self.coalesced else {}),
+            **({"duplicate_of": self.duplicate_of} if self.duplicate_of else {}),
+            **({"reply_template": self.reply_template} if self.reply_template else {}),
+            **({"speculation": self.speculation} if self.speculation else {}),
+            **({"retries": self.retries} if self.retries else {}),
+        }
+
+
+class EmailPipeline:
+    # With a ThreadManager, triage/FAQ/RAG runs start on pooled threads (reply and the formatters
+    # reuse the thread of the stage before them) and every thread is deleted once the email is done.
+    # With a Cascade, the RAG and Reply stages first run their mini twins (agent_ids["rag_mini"],
+    # agent_ids["reply_mini"]) and only run the full agent when the twin's output fails the check.
+    # The Reply twin only runs with TemplateReplies, which sends its accepted drafts.
+    # With a QuestionRouter, each question goes to FAQ, RAG or both depending on how well it matches the KB.
+    # With a QuestionCoalescer, a question already being answered for another email waits for that answer.
+    # With a DuplicateIndex, an email that repeats an earlier one reuses the triage output and answers of the earlier one.
+    # With TemplateReplies, replies that only list the answers are rendered locally and posted to the Reply
+    # trigger; the Reply Agent writes the ones with issues, an upset tone or long/formatted answers.
+    # answer_mode (speculate.ANSWER_MODES) decides how a question asked of both FAQ and RAG is answered.
+    def __init__(
+        self,
+        client: AgentClient,
+        agent_ids: dict,
+        faq_index: FaqIndex | None = None,
+        answer_cache: AnswerCache | None = None,
+        threads: ThreadManager | None = None,
+        tracer: Tracer | None = None,
+        cascade: Cascade | None = None,
+        router: QuestionRouter | None = None,
+        coalescer: QuestionCoalescer | None = None,
+        duplicates: DuplicateIndex | None = None,
+        replies: TemplateReplies | None = None,
+        answer_mode: str = "both",
+    ):
+        if answer_mode not in ANSWER_MODES:
+            raise ValueError(f"Unknown answer mode {answer_mode!r}; expected one of {', '.join(ANSWER_MODES)}.")
+        self.client = client
+        self.agent_ids = agent_ids
+        self.faq_index = faq_index
+        self.answer_cache = answer_cache
+        self.threads = threads
+        self.tracer = tracer or default_tracer
+        self.cascade = cascade
+        self.router = router
+        self.coalescer = coalescer
+        self.duplicates = duplicates
+        self.replies = replies
+        self.answer_mode = answer_mode
+        self.validation = ValidationStats()
+        self.speculation = SpeculativeRag() if answer_mode == "speculative" else None
+
+    async def _start(self, job: EmailJob, stage: str, message: str, thread_id: str | None) -> RunResult:
+        if thread_id is None and self.threads is not None:
+            # A mini twin starts on a thread from its stage's pool.
+            thread_id = await self.threads.acquire(stage.removesuffix("_mini"))
+            job.threads.append(thread_id)
+        with self.tracer.use(job.span):
+            return await self.client.run(self.agent_ids[stage], message, thread_id)
+
+    def _cascades(self, stage: str) -> bool:
+        return self.cascade is not None and stage in self.cascade.stages
+
+    def _release(self, job: EmailJob, thread_id: str):
+        if self.threads is not None and thread_id in job.threads:
+            job.threads.remove(thread_id)
+            self.threads.release(thread_id)
+
+    async def close(self):
+        if self.speculation is not None:
+            await self.speculation.drain()
+        if self.threads is not None:
+            await self.threads.close()
+
+    def finish(self, job: EmailJob):
+        # Hands the email's remaining threads back for deletion; call once its result is recorded.
+        for thread_id in list(job.threads):
+            self._release(job, thread_id)
+        self._share(job, "triage", None)
+        self._share(job, "answers", None)
+        if job.span is not None:
+            if job.error:
+                job.span.fail(job.error)
+            job.span.update({
+                "email.status": "error" if job.error else "needs_user" if job.unanswered else "replied",
+                "email.questions": len(job.answers),
+                "gen_ai.usage.input_tokens": job.usage.get("prompt_tokens", 0),
+                "gen_ai.usage.output_tokens": job.usage.get("completion_tokens", 0),
+            })
+            self.tracer.end(job.span)
+
+    async def _run(self, job: EmailJob, name: str, after: list, stage: str, message: str, thread_id: str | None = None) -> RunResult:
+        try:
+            result = await job.timeline.span(name, after, self._start(job, stage, message, thread_id))
+        except RunCancelledError as e:
+            # The tokens a cancelled run used are billed all the same.
+            usage = e.run.usage if e.run is not None else None
+            if usage:
+                for key in ("prompt_tokens", "completion_tokens"):
+                    job.usage[key] = job.usage.get(key, 0) + usage[key]
+            if self.speculation is not None:
+                self.speculation.record_cancelled(usage)
+            raise
+        if result.ttft is not None:
+            job.ttft[name] = round(result.ttft, 4)
+        for key, tokens in result.usage.items():
+            job.usage[key] = job.usage.get(key, 0) + tokens
+        return result
+
+    async def _ask_once(self, job: EmailJob, stage: str, agent: str, question_id: str, question: str, after: list) -> tuple[dict | None, list]:
+        # One run of the stage's agent (or its mini twin) on its own thread. For the full agent, the
+        # *_to_json formatter only runs if the output can't be parsed; a twin's unparsable output escalates instead.
+        # Items still missing or invalid are asked again, on the same thread, by the full agent.
+        name = f"{agent}:{question_id}"
+        questions = {question_id: question}
+        result = await self._run(job, name, after, agent, f"{question_id}: {question}")
+        citations, last = list(result.citations), [name]
+
+        async def formatter(text: str) -> str:
+            last[:] = [f"{stage}_to_json:{question_id}"]
+            formatted = await self._run(job, last[0], [name], f"{stage}_to_json", FORMATTER_MESSAGE, result.thread_id)
+            return formatted.text
+
+        async def retry(gaps: dict) -> str:
+            retried = await self._run(job, f"{agent}_retry:{question_id}", last, agent, answers_retry_message(gaps, questions), result.thread_id)
+            citations.extend(retried.citations)
+            return retried.text
+
+        full = agent == stage
+        try:
+            normalized = await normalize_answers(result.text, questions, formatter if full else None, retry if full else None)
+        finally:
+            self._release(job, result.thread_id)
+        for step, gaps in normalized.checks:
+            if step == "retry":
+                self.validation.record_retry(agent, gaps)
+                job.retries[name] = "unrepaired" if gaps else "repaired"
+            else:
+                self.validation.record(f"{stage}_to_json" if step == "formatter" else agent, gaps)
+        return normalized.answers, citations
+
+    async def _ask(self, job: EmailJob, stage: str, question_id: str, question: str, after: list = ("triage",)) -> tuple[str | None, list]:
+        mini = None
+        if self._cascades(stage):
+            start = time.perf_counter()
+            answers, citations = await self._ask_once(job, stage, mini_stage(stage), question_id, question, list(after))
+            mini = time.perf_counter() - start
+            reason = self.cascade.check(stage, first_answer(answers), citations, answers is not None)
+            job.cascade[f"{stage}:{question_id}"] = reason or "mini"
+            if reason is None:
+                self.cascade.record(stage, mini, None)
+                return first_answer(answers), citations
+        start = time.perf_counter()
+        after = [f"{mini_stage(stage)}:{question_id}"] if mini is not None else list(after)
+        answers, citations = await self._ask_once(job, stage, stage, question_id, question, after)
+        if mini is not None:
+            self.cascade.record(stage, mini, reason, time.perf_counter() - start)
+        return first_answer(answers), citations
+
+    async def _faq(self, job: EmailJob, question_id: str, question: str) -> tuple[str | None, list]:
+        hit = self.faq_index.answer(question) if self.faq_index else None
+        if hit:
+            return hit["answer"], []
+        return await self._ask(job, "faq", question_id, question)
+
+    async def _rag(self, job: EmailJob, question_id: str, question: str, after: list = ("triage",)) -> tuple[str | None, list]:
+        hit = self.answer_cache.get(question) if self.answer_cache else None
+        if hit:
+            return hit["answer"], hit["citations"]
+        answer, citations = await self._ask(job, "rag", question_id, question, after)
+        if answer and self.answer_cache is not None:
+            self.answer_cache.put(question, answer, citations)
+        return answer, citations
+
+    async def _answer(self, job: EmailJob, question_id: str, question: str) -> dict:
+        if self.coalescer is None:
+            return await self._answer_once(job, question_id, question)
+
+        async def answer() -> tuple[dict, int]:
+            result = await self._answer_once(job, question_id, question)
+            # Agent runs for this question are the timeline spans named "<stage>:<question ID>".
+            return result, sum(1 for name in job.timeline.spans if name.endswith(f":{question_id}"))
+
+        result, shared = await self.coalescer.run(question, answer)
+        if shared:
+            job.coalesced.append(question_id)
+        # Another email's answer keeps this email's question ID and wording.
+        return {**result, "id": question_id, "question": question}
+
+    async def _answer_once(self, job: EmailJob, question_id: str, question: str) -> dict:
+        route = "both"
+        if self.router is not None:
+            route = job.routes[question_id] = self.router.route(question)
+        if route == "faq" or (route == "both" and self.answer_mode == "sequential"):
+            faq_answer, _ = await self._faq(job, question_id, question)
+            if faq_answer:
+                return {"id": question_id, "question": question, "answer": faq_answer, "source": "faq", "citations": []}
+            if route == "faq":
+                # Routed to FAQ only, but the FAQ agent had no answer: ask RAG after all.
+                self.router.fallback()
+                job.routes[question_id] = "faq+rag"
+            rag_answer, citations = await self._rag(job, question_id, question, [f"faq:{question_id}"])
+        elif route == "rag":
+            faq_answer = None
+            rag_answer, citations = await self._rag(job, question_id, question)
+        elif self.speculation is not None:
+            faq_answer, rag_answer, citations = await self.speculation.run(
+                lambda: self._faq(job, question_id, question),
+                lambda: self._rag(job, question_id, question),
+            )
+            job.speculation[question_id] = "rag" if rag_answer else "faq"
+        else:
+            (faq_answer, _), (rag_answer, citations) = await asyncio.gather(
+                self._faq(job, question_id, question),
+                self._rag(job, question_id, question),
+            )
+        # Same merge as OrchestratorAgent: a RAG answer replaces the FAQ answer when there is one.
+        if rag_answer:
+            return {"id": question_id, "question": question, "answer": rag_answer, "source": "rag", "citations": citations}
+        return {"id": question_id, "question": question, "answer": faq_answer, "source": "faq" if faq_answer else None, "citations": []}
+
+    async def triage(self, job: EmailJob):
+        job.span = job.span or self.tracer.start_span("email", {"email.id": job.email.get("id")})
+        if self.duplicates is not None and await self._reuse_triage(job):
+            return
+        triaged = False
+        try:
+            await self._triage(job)
+            triaged = True
+        finally:
+            self._share(job, "triage", job.breakdown if triaged else None)
+
+    async def _reuse_triage(self, job: EmailJob) -> bool:
+        # A duplicate of an email processed or in progress takes that email's triage output (and
+        # later its answers). Otherwise this email is indexed for the ones after it.
+        body = job.email.get("body") or ""
+        if not body.strip():
+            return False
+        signature, key = self.duplicates.signature(body), body_key(body)
+        match = self.duplicates.find(signature, key)
+        if match is not None:
+            original, _ = match
+            breakdown = await job.timeline.span("triage", [], asyncio.shield(original["triage"]))
+            if breakdown is not None:
+                job.duplicate_of, job.shared, job.breakdown = original["email_id"], original, breakdown
+                return True
+        loop = asyncio.get_running_loop()
+        job.shared = {"email_id": job.email.get("id"), "triage": loop.create_future(), "answers": loop.create_future()}
+        self.duplicates.add(signature, key, job.shared)
+        return False
+
+    def _share(self, job: EmailJob, key: str, value):
+        # Hands this email's triage output or answers (None if it has none) to its duplicates.
+        if job.shared is not None and job.duplicate_of is None and not job.shared[key].done():
+            job.shared[key].set_result(value)
+
+    async def _triage(self, job: EmailJob):
+        triage = await self._run(job, "triage", [], "triage", format_email(job.email))
+        job.thread_id = triage.thread_id
+        breakdown, issues = check_triage(triage.text)
+        self.validation.record("triage", issues)
+        if issues:
+            # Ask for a corrected breakdown on the same thread rather than triaging the email again.
+            message = TRIAGE_RETRY_MESSAGE.format(issues="\n".join(map(str, issues)))
+            breakdown, issues = check_triage((await self._run(job, "triage_retry", ["triage"], "triage", message, job.thread_id)).text)
+            self.validation.record_retry("triage", issues)
+            job.retries["triage"] = "unrepaired" if issues else "repaired"
+        if issues:
+            raise AgentRunError(f"Triage Agent returned an unexpected shape: {'; '.join(map(str, issues))}")
+        job.breakdown = breakdown
+
+    async def follow(self, job: EmailJob) -> bool:
+        # A duplicate takes the earlier email's answers once they are ready. False if that email has none,
+        # in which case answer() answers this one on its own.
+        answers = await job.timeline.span("answers", ["triage"], asyncio.shield(job.shared["answers"]))
+        if answers is None:
+            job.shared = None
+            return False
+        job.answers = [dict(answer) for answer in answers]
+        return True
+
+    async def answer(self, job: EmailJob):
+        if job.duplicate_of is not None and job.shared is not None and await self.follow(job):
+            return
+        questions = {new_question_id(): question for question in job.breakdown.get("questions", [])}
+        answered = False
+        try:
+            job.answers = await asyncio.gather(*(self._answer(job, qid, q) for qid, q in questions.items()))
+            answered = True
+        finally:
+            self._share(job, "answers", job.answers if answered else None)
+
+    async def reply(self, job: EmailJob):
+        if self.replies is None:
+            await self._agent_reply(job)
+            return
+        # Replies that are just the answers in a list are rendered and sent without a model run.
+        reason = polish_reason(job.email, job.breakdown, job.answers)
+        job.reply_template = reason or "sent"
+        start = time.perf_counter()
+        if reason is None:
+            job.reply = render_reply(job.email, job.answers)
+            await job.timeline.span("reply", self._reply_after(job), self._send_reply(job))
+        else:
+            await self._agent_reply(job)
+        self.replies.record(reason, time.perf_counter() - start)
+
+    async def _send_reply(self, job: EmailJob):
+        attributes = {"http.request.method": "POST", "server.address": self.replies.host, "email.id": job.email.get("id")}
+        with self.tracer.use(job.span), self.tracer.span("send_reply", attributes, SPAN_KIND_CLIENT):
+            await self.replies.send(job.email.get("id"), job.reply)
+
+    def _reply_after(self, job: EmailJob) -> list:
+        return [name for name in job.timeline.spans if name != "triage"] or ["triage"]
+
+    async def _agent_reply(self, job: EmailJob):
+        message = REPLY_MESSAGE + "".join(f"Q: {answer['question']}\nA: {answer['answer']}\n\n" for answer in job.answers)
+        if job.thread_id is None:
+            # A duplicate has no triage thread holding the email, so the reply run gets it in the message.
+            message = format_email(job.email) + "\n\n" + message
+        after = self._reply_after(job)
+        mini = None
+        # The mini twin has no Outlook tool, so its draft is only worth writing when TemplateReplies can send it.
+        if self._cascades("reply") and self.replies is not None:
+            start = time.perf_counter()
+            draft = (await self._run(job, "reply_mini", after, "reply_mini", message, job.thread_id)).text
+            mini = time.perf_counter() - start
+            reason = self.cascade.check("reply", draft)
+            job.cascade["reply"] = reason or "mini"
+            if reason is None:
+                self.cascade.record("reply", mini, None)
+                job.reply = draft
+                await job.timeline.span("reply", ["reply_mini"], self._send_reply(job))
+                return
+            after = ["reply_mini"]
+        start = time.perf_counter()
+        job.reply = (await self._run(job, "reply", after, "reply", message, job.thread_id)).text
+        if mini is not None:
+            self.cascade.record("reply", mini, reason, time.perf_counter() - start)
+
+    async def process(self, email: dict) -> dict:
+        job = EmailJob(email)
+        try:
+            await self.triage(job)
+            await self.answer(job)
+            if not job.unanswered:
+                await self.reply(job)
+            return job.result()
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.finish(job)
+
+
+@asynccontextmanager
+async def open_pipeline(
+    fake: bool = False,
+    speed: float = 1.0,
+    priority: int = INTERACTIVE,
+    scheduler: RateLimitScheduler | None = None,
+    mode: str = "stream",
+    on_reply_delta: Callable[[str], None] | None = None,
+    fake_options: dict | None = None,
+    record: str | None = None,
+    replay: str | None = None,
+    replay_timing: bool = True,
+    cascade: bool = False,
+    route: bool = False,
+    coalesce: bool = False,
+    duplicates: DuplicateIndex | None = None,
+    template_replies: bool = False,
+    answer_mode: str = "both",
+):
+    # on_reply_delta receives the Reply Agent's HTML as it is generated. fake_options are passed to
+    # FakeProjectClient (rtt, jitter, failure_rate, seed, ...). record writes the Foundry and CQA traffic
+    # to a cassette; replay serves it from one instead of Azure, with (replay_timing) or without the
+    # recorded latencies. cascade runs the mini twins of the RAG and Reply agents first (cascade.py); the
+    # Reply twin only with template_replies, which sends its accepted drafts.
+    # route sends each question to FAQ, RAG or both by its match against the FAQ KB (router.py).
+    # coalesce shares the answer to a question that another email is already asking (coalesce.py).
+    # duplicates detects emails that repeat an earlier one and reuses the earlier email's work (dedup.py).
+    # template_replies renders plain replies locally and posts them to the Reply trigger (reply_template.py);
+    # with fake and no REPLY_ENDPOINT they go to an in-process stub of the trigger.
+    # answer_mode is "both", "sequential" or "speculative" (speculate.py).
+    faq_index = load_default_kb()
+    answer_cache = AnswerCache(os.getenv("RAG_CACHE_PATH")) if os.getenv("RAG_CACHE_PATH") else None
+    router = None
+    if route:
+        kb = faq_index
+        if kb is None and fake:
+            from fake_foundry import fake_kb
+            kb = fake_kb()
+        if kb is None:
+            raise EnvironmentError(f"Routing needs the FAQ knowledge base export; set {FAQ_KB_PATH_ENV}.")
+        router = QuestionRouter(kb)
+    replies, reply_stub = None, None
+    if template_replies:
+        replies = load_default_replies()
+        if replies is None and fake:
+            from reply_stub_server import ReplyStubServer
+            reply_stub = ReplyStubServer(("127.0.0.1", 0)).start()
+            replies = TemplateReplies(reply_stub.endpoint)
+        if replies is None:
+            raise EnvironmentError(f"Template replies are posted to the Logic App's Reply trigger; set {REPLY_ENDPOINT_ENV} to its callback URL.")
+    stages = {**STAGE_MODULES, **{mini_stage(stage): module for stage, module in MINI_MODULES.items()}} if cascade else STAGE_MODULES
+
+    def pipeline(project_client, agent_ids: dict, models: dict) -> EmailPipeline:
+        missing = [stage for stage in stages if stage not in agent_ids]
+        if missing:
+            raise EnvironmentError(f"No agent for {', '.join(missing)}; provision the mini twins first (python agents/provision.py --cascade).")
+        on_delta = None
+        if on_reply_delta:
+            def on_delta(agent_id: str, text: str):
+                if agent_id in (agent_ids["reply"], agent_ids.get("reply_mini")):
+                    on_reply_delta(text)
+        names = {agent_ids[stage]: module.AGENT_NAME for stage, module in stages.items()}
+        client = FoundryAgentClient(project_client, mode, scheduler, models, priority, on_delta, names)
+        threads = ThreadManager(project_client.agents)
+        threads.start()
+        return EmailPipeline(
+            client, agent_ids, faq_index, answer_cache, threads,
+            cascade=Cascade() if cascade else None,
+            router=router,
+            coalescer=QuestionCoalescer() if coalesce else None,
+            duplicates=duplicates,
+            replies=replies,
+            answer_mode=answer_mode,
+        )
+
+    try:
+        if fake:
+            # The fake has no quota unless one is configured, so its runs are not held back.
+            scheduler = scheduler or RateLimitScheduler(limits={})
+            from fake_foundry import FAKE_AGENT_IDS, FakeProjectClient, docs_function_calls
+            models = {FAKE_AGENT_IDS[stage]: module.MODEL_NAME for stage, module in stages.items()}
+            if rag_agent.USE_DOCS_TOOL:
+                fake_options = {"function_calls": {FAKE_AGENT_IDS[stage]: docs_function_calls for stage in ("rag", "rag_mini")}, **(fake_options or {})}
+            async with FakeProjectClient(speed=speed, **(fake_options or {})) as project_client:
+                email_pipeline = pipeline(project_client, FAKE_AGENT_IDS, models)
+                try:
+                    yield email_pipeline
+                finally:
+                    await email_pipeline.close()
+        elif replay:
+            import cqa_batch_tool
+            from azure.ai.projects.aio import AIProjectClient
+
+            cassette = Cassette.load(replay)
+            replayer = Replayer(cassette, timing=replay_timing, normalizers=[QUESTION_ID_PATTERN])
+            cqa_batch_tool.install_adapter(CassetteAdapter(replayer=replayer))
+            scheduler = scheduler or default_scheduler()
+            endpoint = REPLAY_HOST + cassette.meta["project_path"]
+            async with ReplayCredential() as credential, AIProjectClient(endpoint=endpoint, credential=credential, transport=ReplayTransport(replayer)) as project_client:
+                email_pipeline = pipeline(project_client, cassette.meta["agent_ids"], cassette.meta["models"])
+                try:
+                    yield email_pipeline
+                finally:
+                    await email_pipeline.close()
+        else:
+            from azure.ai.projects.aio import AIProjectClient
+            from credential import AsyncCachedCredential
+
+            endpoint = os.getenv("PROJECT_ENDPOINT")
+            if not endpoint:
+                raise EnvironmentError("PROJECT_ENDPOINT is not set in the environment.")
+            agent_ids, models = load_agent_ids(endpoint, stages)
+            scheduler = scheduler or default_scheduler()
+            options = {}
+            if record:
+                import cqa_batch_tool
+                from urllib.parse import urlsplit
+
+                cassette = Cassette(record, {"project_path": urlsplit(endpoint).path, "agent_ids": agent_ids, "models": models})
+                cqa_batch_tool.install_adapter(CassetteAdapter(cassette=cassette))
+                options["transport"] = RecordingTransport(cassette)
+            try:
+                async with AsyncCachedCredential() as credential, AIProjectClient(endpoint=endpoint, credential=credential, **options) as project_client:
+                    email_pipeline = pipeline(project_client, agent_ids, models)
+                    try:
+                        yield email_pipeline
+                    finally:
+                        await email_pipeline.close()
+            finally:
+                # What was recorded before an error is still worth replaying.
+                if record:
+                    cassette.save()
+    finally:
+        if replies is not None:
+            await replies.close()
+        if reply_stub is not None:
+            reply_stub.shutdown()
+        if answer_cache is not None:
+            answer_cache.save()
+
+
+async def run_pipeline(
+    email: dict,
+    fake: bool = False,
+    speed: float = 1.0,
+    mode: str = "stream",
+    on_reply_delta: Callable[[str], None] | None = None,
+    **options,
+) -> dict:
+    # options: record, replay, replay_timing, cascade, route, coalesce, template_replies and answer_mode, see open_pipeline.
+    async with open_pipeline(fake, speed, mode=mode, on_reply_delta=on_reply_delta, **options) as pipeline:
+        return await pipeline.process(email)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the triage -> FAQ/RAG -> reply flow for one email.")
+    parser.add_argument("email", help='JSON file with "id", "from", "to", "subject" and "body"')
+    parser.add_argument("--fake", action="store_true", help="run against the in-process fake Foundry (fake_foundry.py)")
+    parser.add_argument("--speed", type=float, default=1.0, help="scale the fake's simulated latency")
+    parser.add_argument("--poll", action="store_true", help="poll runs instead of streaming them")
+    parser.add_argument("--stream-reply", action="store_true", help="print the reply HTML to stderr as it is generated")
+    parser.add_argument("--record", metavar="CASSETTE", help="record the Foundry and CQA traffic to a cassette (.jsonl or .jsonl.gz)")
+    parser.add_argument("--replay", metavar="CASSETTE", help="answer from a recorded cassette instead of Azure")
+    parser.add_argument("--no-timing", action="store_true", help="with --replay, don't wait the recorded latencies")
+    parser.add_argument("--trace", metavar="FILE", help="append OTLP/JSON spans of the agent runs and tool calls to FILE")
+    parser.add_argument("--trace-console", action="store_true", help="print a line per finished span to stderr")
+    parser.add_argument("--cascade", action="store_true", help="run the mini twins of the RAG and Reply agents first")
+    parser.add_argument("--route", action="store_true", help="send each question to FAQ, RAG or both by its match against the FAQ KB")
+    parser.add_argument("--template-replies", action="store_true", help="render plain replies locally and post them to the Reply trigger (REPLY_ENDPOINT)")
+    parser.add_argument("--answer-mode", choices=ANSWER_MODES, default="both", help="run FAQ and RAG together, RAG only after an FAQ miss, or RAG speculatively (cancelled on an FAQ answer)")
+    args = parser.parse_args()
+    tracing.configure(args.trace, args.trace_console)
+
+    with open(args.email, "r", encoding="utf-8") as f:
+        email = json.load(f)
+    on_reply_delta = (lambda text: print(text, end="", file=sys.stderr, flush=True)) if args.stream_reply else None
+    try:
+        result = asyncio.run(run_pipeline(
+            email, args.fake, args.speed, "poll" if args.poll else "stream", on_reply_delta,
+            record=args.record, replay=args.replay, replay_timing=not args.no_timing, cascade=args.cascade, route=args.route,
+            template_replies=args.template_replies, answer_mode=args.answer_mode,
+        ))
+    except (AgentRunError, ReplySendError, CassetteMissError, EnvironmentError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        tracing.tracer.shutdown()
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"critical path: {' -> '.join(result['critical_path'])} ({result['total']:.2f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
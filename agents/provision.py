@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import TYPE_CHECKING
+from dotenv import load_dotenv
+
+import buddy_agent
+import cascade
+import faq_agent
+import faq_agent_to_json
+import rag_agent
+import rag_agent_to_json
+import reply_agent
+import triage_agent
+from fingerprint import agent_definition, canonical_definition, changed_fields, diff_definitions, fingerprint
+from registry import ENV_PATH, AgentRegistry
+
+if TYPE_CHECKING:
+    from azure.ai.projects.aio import AIProjectClient
+
+# Load environment variables from .env
+load_dotenv()
+
+# Agents created by `python agents/provision.py`, in the order they are reported.
+# rag_agent_custom_search.py is an alternative to rag_agent.py (same AGENT_ENV_KEY)
+# and getting_started.py is a standalone sample, so neither is provisioned here.
+AGENT_MODULES = [
+    triage_agent,
+    faq_agent,
+    faq_agent_to_json,
+    rag_agent,
+    rag_agent_to_json,
+    reply_agent,
+    buddy_agent,
+]
+# Mini twins of the RAG and Reply agents, also provisioned with --cascade.
+CASCADE_MODULES = list(cascade.MINI_MODULES.values())
+
+
+def get_project_endpoint() -> str:
+    endpoint = os.getenv("PROJECT_ENDPOINT")
+    if not endpoint:
+        raise EnvironmentError("PROJECT_ENDPOINT is not set in the environment.")
+    return endpoint
+
+
+def is_up_to_date(entry: dict | None, definition_hash: str) -> bool:
+    return bool(entry) and entry.get("definition_hash") == definition_hash
+
+
+async def provision_agent(client: AIProjectClient, module, definition: dict, agent_id: str | None):
+    start = time.perf_counter()
+
+    if not agent_id:
+        agent = await client.agents.create_agent(**definition)
+    else:
+        agent = await client.agents.update_agent(agent_id=agent_id, **definition)
+
+    return agent, time.perf_counter() - start
+
+
+def print_dry_run(registry: AgentRegistry, endpoint: str, pending: list):
+    for module, definition, agent_id in pending:
+        entry = registry.lookup(module.AGENT_ENV_KEY, endpoint) or {}
+        action = f"update {agent_id}" if agent_id else "create"
+        fields = changed_fields(entry.get("definition"), definition) if entry.get("definition") else ["(no recorded definition)"]
+        print(f"{module.AGENT_NAME}: would {action}; changed: {', '.join(fields)}")
+        if entry.get("definition"):
+            print(diff_definitions(entry["definition"], definition))
+
+
+async def provision_all(client: AIProjectClient, pending: list) -> list:
+    return await asyncio.gather(*(provision_agent(client, *item) for item in pending), return_exceptions=True)
+
+
+async def provision(
+    modules: list,
+    force: bool = False,
+    dry_run: bool = False,
+    client=None,
+    endpoint: str | None = None,
+    registry: AgentRegistry | None = None,
+    env_path: str = ENV_PATH,
+) -> bool:
+    # client, endpoint and registry default to the project in PROJECT_ENDPOINT and .agents.json;
+    # bench_suite.py passes a fake client and a throwaway registry.
+    start = time.perf_counter()
+    endpoint = endpoint or get_project_endpoint()
+    registry = registry or AgentRegistry()
+
+    pending = []
+    for module in modules:
+        definition = agent_definition(module)
+        entry = registry.lookup(module.AGENT_ENV_KEY, endpoint)
+        if not force and is_up_to_date(entry, fingerprint(definition)):
+            print(f"{module.AGENT_NAME} unchanged, skipping ({entry['agent_id']})")
+            continue
+        agent_id = entry["agent_id"] if entry else os.getenv(module.AGENT_ENV_KEY)
+        pending.append((module, definition, agent_id))
+
+    if dry_run:
+        print_dry_run(registry, endpoint, pending)
+        return True
+    if not pending:
+        print(f"All {len(modules)} agents up to date ({time.perf_counter() - start:.3f}s)")
+        return True
+
+    if client is not None:
+        results = await provision_all(client, pending)
+    else:
+        from azure.ai.projects.aio import AIProjectClient
+        from credential import AsyncCachedCredential
+
+        # One credential and one client (and therefore one transport / connection pool)
+        # are shared by every agent so the credential chain is only walked once.
+        async with AsyncCachedCredential() as credential:
+            async with AIProjectClient(endpoint=endpoint, credential=credential) as client:
+                results = await provision_all(client, pending)
+
+    ok = True
+    for (module, definition, _), result in zip(pending, results):
+        if isinstance(result, BaseException):
+            ok = False
+            print(f"{module.AGENT_NAME} failed: {result}")
+        else:
+            agent, elapsed = result
+            registry.record(
+                module.AGENT_ENV_KEY,
+                agent.id,
+                endpoint=endpoint,
+                definition_hash=fingerprint(definition),
+                definition=canonical_definition(definition),
+            )
+            print(f"{module.AGENT_NAME} ready with ID: {agent.id} ({elapsed:.2f}s)")
+    registry.export_env(env_path)
+
+    print(f"Provisioned {len(pending)} of {len(modules)} agents in {time.perf_counter() - start:.2f}s")
+    return ok
+
+
+def select_modules(keys: list[str], with_cascade: bool = False) -> list:
+    modules = AGENT_MODULES + CASCADE_MODULES if with_cascade else AGENT_MODULES
+    if not keys:
+        return modules
+    by_key = {module.AGENT_ENV_KEY: module for module in AGENT_MODULES + CASCADE_MODULES}
+    unknown = [key for key in keys if key not in by_key]
+    if unknown:
+        raise SystemExit(f"Unknown agent(s): {', '.join(unknown)}. Choose from {', '.join(by_key)}.")
+    return [by_key[key] for key in keys]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or update all agents concurrently.")
+    parser.add_argument("agents", nargs="*", metavar="AGENT_ENV_KEY", help="only provision these agents")
+    parser.add_argument("--force", action="store_true", help="update agents even if their definition is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="show which agents and fields would change, without calling Azure")
+    parser.add_argument("--cascade", action="store_true", help="also provision the mini twins used by pipeline.py --cascade")
+    args = parser.parse_args()
+
+    ok = asyncio.run(provision(select_modules(args.agents, args.cascade), force=args.force, dry_run=args.dry_run))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
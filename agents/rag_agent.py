@@ -1,8 +1,17 @@
+from __future__ import annotations
+
+import argparse
 import os
+import sys
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from azure.identity import DefaultAzureCredential
-from azure.ai.projects import AIProjectClient
-from azure.ai.agents.models import BingGroundingTool
+
+from credential import CachedCredential
+import doc_search_tool
+from registry import ensure_agent
+
+if TYPE_CHECKING:
+    from azure.ai.projects import AIProjectClient
 
 # Load environment variables from .env
 load_dotenv()
@@ -12,6 +21,7 @@ MODEL_NAME = "gpt-4.1"
 AGENT_NAME = "RAG Agent"
 AGENT_ENV_KEY = "RAG_AGENT_ID"
 CONNECTION_ID = "/subscriptions/8038977e-bdd7-447a-a194-d640a385ebcf/resourceGroups/rg-admin-0541/providers/Microsoft.CognitiveServices/accounts/mabolan-build-2025-demo-resource/projects/mabolan-build-2025-demo/connections/binggourndingbuild"
+TOOL = [{"type": "bing_grounding", "bing_grounding": {"connections": [{"connection_id": CONNECTION_ID}]}}]
 
 INSTRUCTIONS = """You will be given question and answering them on behalf of Mads Bolaris, the Product owner of Azure AI Foundry Agent Service.
 
@@ -23,6 +33,15 @@ You must not provide answers that don't have citations from Bing. This includes
 
 Do not provide answers to any questions about the future since this are things Mads should answer. You can only provide answers to questions about the past or present. If you are asked about the future, you must say "I don't know" for that specific question so that Mads can answer it himself."""
 
+# RAG_DOCS_TOOL=1 adds the search_docs function tool (doc_search_tool.py), which searches the local
+# index of internal docs built by doc_index.py, so questions the docs answer don't need a web search.
+# Function tools run in the caller's process, so only pipeline.py and batch.py can use the agent then.
+USE_DOCS_TOOL = os.getenv("RAG_DOCS_TOOL") == "1"
+if USE_DOCS_TOOL:
+    INSTRUCTIONS += """
+
+Before searching Bing, call search_docs with each question to search the internal documentation. If its passages answer a question, answer from them and cite each passage you used by putting its url in square brackets, for example [guides/setup.md#regions]. These count as citations, and you don't need to search Bing for that question."""
+
 
 def get_project_endpoint() -> str:
     endpoint = os.getenv("PROJECT_ENDPOINT")
@@ -32,48 +51,25 @@ def get_project_endpoint() -> str:
 
 
 def create_project_client(endpoint: str) -> AIProjectClient:
-    return AIProjectClient(endpoint=endpoint, credential=DefaultAzureCredential())
+    from azure.ai.projects import AIProjectClient
 
+    return AIProjectClient(endpoint=endpoint, credential=CachedCredential())
 
-def load_bing_tool() -> BingGroundingTool:
-    return BingGroundingTool(connection_id=CONNECTION_ID)
 
+def load_tool_definitions() -> list:
+    if USE_DOCS_TOOL:
+        from azure.ai.agents.models import FunctionTool
 
-def create_agent(client: AIProjectClient, tool: BingGroundingTool):
-    agent = client.agents.create_agent(
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        tools=[{'type': 'bing_grounding', 'bing_grounding': {'connections': [{'connection_id': '/subscriptions/8038977e-bdd7-447a-a194-d640a385ebcf/resourceGroups/rg-admin-0541/providers/Microsoft.CognitiveServices/accounts/mabolan-build-2025-demo-resource/projects/mabolan-build-2025-demo/connections/binggourndingbuild'}]}}],
-        instructions=INSTRUCTIONS
-    )
-    with open(".env", "a") as f:
-        f.write(f"\n{AGENT_ENV_KEY}={agent.id}")
-    return agent
-
-
-def update_agent(client: AIProjectClient, agent_id: str, tool: BingGroundingTool):
-    return client.agents.update_agent(
-        agent_id=agent_id,
-        model=MODEL_NAME,
-        name=AGENT_NAME,
-        tools=[{'type': 'bing_grounding', 'bing_grounding': {'connections': [{'connection_id': '/subscriptions/8038977e-bdd7-447a-a194-d640a385ebcf/resourceGroups/rg-admin-0541/providers/Microsoft.CognitiveServices/accounts/mabolan-build-2025-demo-resource/projects/mabolan-build-2025-demo/connections/binggourndingbuild'}]}}],
-        instructions=INSTRUCTIONS
-    )
+        return TOOL + FunctionTool(functions=doc_search_tool.FUNCTIONS).definitions
+    return TOOL
 
 
 def main():
-    endpoint = get_project_endpoint()
-    client = create_project_client(endpoint)
-
-    tool = load_bing_tool()
-
-    agent_id = os.getenv(AGENT_ENV_KEY)
-    if not agent_id:
-        agent = create_agent(client, tool)
-    else:
-        agent = update_agent(client, agent_id, tool)
-
-    print(f"{AGENT_NAME} ready with ID: {agent.id}")
+    parser = argparse.ArgumentParser(description=f"Create or update the {AGENT_NAME}.")
+    parser.add_argument("--force", action="store_true", help="update the agent even if its definition is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="show which fields would change, without calling Azure")
+    args = parser.parse_args()
+    ensure_agent(sys.modules[__name__], get_project_endpoint(), create_project_client, force=args.force, dry_run=args.dry_run)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+import rag_agent
+
+# gpt-4.1-mini twin of the RAG Agent, with the same instructions and tools. In cascade mode
+# (pipeline.py --cascade) it answers first and the RAG Agent only runs when its answer fails the
+# confidence check in cascade.py. Provisioned by `python agents/provision.py --cascade`.
+MODEL_NAME = "gpt-4.1-mini"
+AGENT_NAME = "RAG Agent (mini)"
+AGENT_ENV_KEY = "RAG_MINI_AGENT_ID"
+TOOL = rag_agent.TOOL
+load_tool_definitions = rag_agent.load_tool_definitions
+INSTRUCTIONS = rag_agent.INSTRUCTIONS
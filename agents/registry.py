@@ -0,0 +1,167 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable
+
+from fingerprint import agent_definition, canonical_definition, changed_fields, diff_definitions, fingerprint
+
+# Agent IDs (one entry per AGENT_ENV_KEY) live here; .env is regenerated from it.
+REGISTRY_PATH = ".agents.json"
+ENV_PATH = ".env"
+
+
+@contextmanager
+def file_lock(path: str):
+    with open(f"{path}.lock", "a+") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def atomic_write(path: str, data: str | bytes):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _env_key(line: str) -> str | None:
+    line = line.strip()
+    if not line or line.startswith("#") or "=" not in line:
+        return None
+    key = line.split("=", 1)[0].strip()
+    return key.removeprefix("export ").strip()
+
+
+class AgentRegistry:
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+        self._entries = self._read()
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def keys(self):
+        return self._entries.keys()
+
+    def get(self, key: str) -> dict | None:
+        return self._entries.get(key)
+
+    def lookup(self, key: str, endpoint: str) -> dict | None:
+        # IDs recorded against another project are meaningless for this one.
+        entry = self._entries.get(key)
+        if entry and entry.get("endpoint") == endpoint:
+            return entry
+        return None
+
+    def record(self, key: str, agent_id: str, endpoint: str, definition_hash: str | None = None, definition: dict | None = None) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        with file_lock(self.path):
+            # Re-read under the lock so concurrent writers don't lose each other's entries.
+            entries = self._read()
+            previous = entries.get(key) or {}
+            same_agent = previous.get("agent_id") == agent_id and previous.get("endpoint") == endpoint
+            entries[key] = {
+                "agent_id": agent_id,
+                "endpoint": endpoint,
+                "created_at": previous.get("created_at", now) if same_agent else now,
+                "updated_at": now,
+                "definition_hash": definition_hash,
+                "definition": definition,
+            }
+            atomic_write(self.path, json.dumps(entries, indent=2, sort_keys=True) + "\n")
+            self._entries = entries
+        return entries[key]
+
+    def export_env(self, path: str = ENV_PATH):
+        # Keep unrelated settings (PROJECT_ENDPOINT, ...) and write exactly one line per agent.
+        with file_lock(self.path):
+            self._entries = self._read()
+            lines = []
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    lines = [line.rstrip("\n") for line in f if _env_key(line) not in self._entries]
+            while lines and not lines[-1].strip():
+                lines.pop()
+            lines.extend(f"{key}={entry['agent_id']}" for key, entry in sorted(self._entries.items()))
+            atomic_write(path, "\n".join(lines) + "\n")
+
+
+def ensure_agent(
+    module,
+    endpoint: str,
+    connect: Callable,
+    force: bool = False,
+    dry_run: bool = False,
+    registry: AgentRegistry | None = None,
+    env_path: str = ENV_PATH,
+) -> str | None:
+    # What each agent script's main() does: create or update the agent from its definition
+    # (fingerprint.agent_definition) unless the registry already has it with the same definition.
+    # connect(endpoint) returns a (sync) AIProjectClient and is only called when there is something to do.
+    # dry_run prints what would change, like provision.py --dry-run, and returns the current ID (if any).
+    registry = registry or AgentRegistry()
+    definition = agent_definition(module)
+    definition_hash = fingerprint(definition)
+
+    entry = registry.lookup(module.AGENT_ENV_KEY, endpoint)
+    if not force and entry and entry["definition_hash"] == definition_hash:
+        print(f"{module.AGENT_NAME} unchanged, ID: {entry['agent_id']}")
+        return entry["agent_id"]
+
+    agent_id = entry["agent_id"] if entry else os.getenv(module.AGENT_ENV_KEY)
+    if dry_run:
+        action = f"update {agent_id}" if agent_id else "create"
+        recorded = (entry or {}).get("definition")
+        fields = changed_fields(recorded, definition) if recorded else ["(no recorded definition)"]
+        print(f"{module.AGENT_NAME}: would {action}; changed: {', '.join(fields) or '(none, forced)'}")
+        if recorded:
+            print(diff_definitions(recorded, definition))
+        return agent_id
+
+    client = connect(endpoint)
+    if not agent_id:
+        agent = client.agents.create_agent(**definition)
+    else:
+        agent = client.agents.update_agent(agent_id=agent_id, **definition)
+
+    registry.record(
+        module.AGENT_ENV_KEY,
+        agent.id,
+        endpoint=endpoint,
+        definition_hash=definition_hash,
+        definition=canonical_definition(definition),
+    )
+    registry.export_env(env_path)
+
+    print(f"{module.AGENT_NAME} ready with ID: {agent.id}")
+    return agent.id
@@ -0,0 +1,9 @@
+# gpt-4o-mini twin of the Reply Agent. It has no Outlook tool: it only drafts. The pipeline runs it only
+# with template replies, which post a draft that passes the confidence check in cascade.py to the Reply
+# trigger; a draft that fails is never sent and the Reply Agent writes (and sends) the reply instead.
+# Provisioned by `python agents/provision.py --cascade`.
+MODEL_NAME = "gpt-4o-mini"
+AGENT_NAME = "Reply Agent (mini)"
+AGENT_ENV_KEY = "REPLY_MINI_AGENT_ID"
+
+INSTRUCTIONS = """Write a reply to the original email with the provided answers; format your reply using HTML. Return only the HTML of the reply."""
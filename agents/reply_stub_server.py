@@ -0,0 +1,84 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Query of the Reply trigger's callback URL (tools/reply_tool.json); the stub accepts any sig.
+TRIGGER_QUERY = "api-version=2016-10-01&sp=%2Ftriggers%2FReply%2Frun&sv=1.0&sig=stub"
+
+
+class ReplyStubServer(ThreadingHTTPServer):
+    # Stands in for the Logic App's Reply trigger: keeps every {"emailId", "response"} posted to it.
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency: float = 0.0, save: str | None = None):
+        super().__init__(address, ReplyStubHandler)
+        self.latency = latency
+        self.save = save
+        self.replies = []
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/workflows/stub/triggers/Reply/paths/invoke?{TRIGGER_QUERY}"
+
+    def start(self) -> "ReplyStubServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class ReplyStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if not url.path.endswith("/triggers/Reply/paths/invoke"):
+            self._reply(404, {"error": {"code": "NotFound", "message": self.path}})
+            return
+        if "sig" not in query or "api-version" not in query:
+            self._reply(401, {"error": {"code": "DirectApiAuthorizationRequired", "message": "The request must be authenticated with a sig."}})
+            return
+        if not isinstance(body.get("emailId"), str) or not isinstance(body.get("response"), str):
+            self._reply(400, {"error": {"code": "InvalidRequestContent", "message": "emailId and response are required strings."}})
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.replies.append(body)
+            if self.server.save:
+                with open(self.server.save, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(body, ensure_ascii=False) + "\n")
+        self._reply(202, {})
+
+    def _reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Logic App's Reply trigger.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated trigger latency per reply")
+    parser.add_argument("--save", metavar="FILE", help="append every posted reply to FILE as JSONL")
+    args = parser.parse_args()
+
+    server = ReplyStubServer(("127.0.0.1", args.port), args.latency_ms / 1000, args.save)
+    print(f"Reply trigger stub listening on {server.endpoint} (set REPLY_ENDPOINT to this)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
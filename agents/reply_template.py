@@ -0,0 +1,159 @@
+import asyncio
+import html
+import os
+import re
+import string
+from email.utils import parseaddr
+from urllib.parse import urlsplit
+
+from scheduler import parse_retry_after
+
+# Callback URL of the Logic App's Reply trigger (the server, path and query of tools/reply_tool.json,
+# including its sig), which the Reply Agent's Outlook tool calls.
+REPLY_ENDPOINT_ENV = "REPLY_ENDPOINT"
+SEND_TIMEOUT = 30.0
+SEND_RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+# Answers the template can't present as well as the model: long or formatted ones read better as prose.
+MAX_ANSWER_CHARS = 600
+_FORMATTED = re.compile(r"\n\s*\n|^\s*(?:[-*+]|\d+[.)]|#{1,6})\s|```", re.MULTILINE)
+# Emails that need a change of tone rather than a list of answers.
+_TONE = re.compile(
+    r"\b(?:angry|upset|frustrat\w*|disappoint\w*|unacceptable|complain\w*|terrible|awful|ridiculous|refund\w*|escalat\w*|lawyer|cancel(?:l?ing|l?ed)?)\b",
+    re.IGNORECASE,
+)
+# Bing grounding markers, e.g. 【3:0†source】; the citations are listed under the answer instead.
+_MARKER = re.compile(r"【[^】]*】")
+
+
+class HtmlTemplate:
+    # Parsed once into literal text and {field} slots; render() HTML-escapes every value except the
+    # fields in raw, which hold markup rendered by another template.
+    def __init__(self, source: str, raw: tuple = ()):
+        self.parts = [(literal, field) for literal, field, _, _ in string.Formatter().parse(source)]
+        self.raw = set(raw)
+
+    def render(self, **values) -> str:
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                value = values[field]
+                out.append(value if field in self.raw else html.escape(str(value)))
+        return "".join(out)
+
+
+# Same layout the Reply Agent writes: greeting, one list item per answered question, sign-off.
+REPLY_TEMPLATE = HtmlTemplate(
+    "<p>Hello{name},</p><p>Thanks for reaching out. Here are the answers to your questions:</p>"
+    "<ul>{items}</ul><p>Best regards,<br>Support</p>",
+    raw=("items",),
+)
+ITEM_TEMPLATE = HtmlTemplate("<li><b>{question}</b><br>{answer}{sources}</li>", raw=("answer", "sources"))
+SOURCES_TEMPLATE = HtmlTemplate("<br><small>Sources: {links}</small>", raw=("links",))
+LINK_TEMPLATE = HtmlTemplate('<a href="{url}">{title}</a>')
+
+
+def polish_reason(email: dict, breakdown: dict, answers: list) -> str | None:
+    # Why the Reply Agent should write this reply, or None if the template can.
+    if breakdown.get("issues"):
+        return "issues"
+    if _TONE.search(f"{email.get('subject', '')}\n{email.get('body', '')}"):
+        return "tone"
+    for answer in answers:
+        text = _MARKER.sub("", answer["answer"] or "")
+        if len(text) > MAX_ANSWER_CHARS:
+            return "long"
+        if _FORMATTED.search(text.strip()):
+            return "formatted"
+    return None
+
+
+def _answer_html(answer: dict) -> str:
+    text = _MARKER.sub("", answer["answer"])
+    citations = [c for c in answer.get("citations") or [] if c.get("url")]
+    for citation in citations:
+        # Answers from the docs index cite passages inline as [url].
+        text = text.replace(f"[{citation['url']}]", "")
+    text = html.escape(" ".join(text.split()))
+    links = ", ".join(LINK_TEMPLATE.render(url=c["url"], title=c.get("title") or c["url"]) for c in citations)
+    return ITEM_TEMPLATE.render(question=answer["question"], answer=text, sources=SOURCES_TEMPLATE.render(links=links) if links else "")
+
+
+def render_reply(email: dict, answers: list) -> str:
+    name = parseaddr(email.get("from", ""))[0].split()
+    return REPLY_TEMPLATE.render(name=f" {name[0]}" if name else "", items="".join(map(_answer_html, answers)))
+
+
+class ReplySendError(RuntimeError):
+    pass
+
+
+class TemplateReplies:
+    # Renders replies from the template and posts them to the Reply trigger, keeping count of the
+    # replies that skipped the Reply Agent and how long each path took.
+    def __init__(self, endpoint: str, timeout: float = SEND_TIMEOUT, retries: int = SEND_RETRIES):
+        self.endpoint = endpoint
+        self.host = urlsplit(endpoint).hostname
+        self.timeout = timeout
+        self.retries = retries
+        self._session = None
+        self.stats = {"replies": 0, "templated": 0, "template_seconds": 0.0, "agent_runs": 0, "agent_seconds": 0.0, "reasons": {}}
+
+    async def send(self, email_id: str, reply: str) -> int:
+        # Same body the Outlook tool posts (Reply-invoke); retries throttling, 5xx and connection errors.
+        import aiohttp
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        for attempt in range(self.retries + 1):
+            delay = RETRY_BACKOFF * 2 ** attempt
+            try:
+                async with self._session.post(self.endpoint, json={"emailId": email_id, "response": reply}) as response:
+                    if response.status < 300:
+                        return response.status
+                    error = f"HTTP {response.status}: {(await response.text())[:200]}"
+                    if response.status != 429 and response.status < 500:
+                        break
+                    delay = parse_retry_after(response.headers.get("Retry-After")) or delay
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt < self.retries:
+                await asyncio.sleep(delay)
+        raise ReplySendError(f"Could not post the reply to {email_id} to the Reply trigger: {error}")
+
+    def record(self, reason: str | None, seconds: float):
+        self.stats["replies"] += 1
+        if reason is None:
+            self.stats["templated"] += 1
+            self.stats["template_seconds"] += seconds
+        else:
+            self.stats["agent_runs"] += 1
+            self.stats["agent_seconds"] += seconds
+            self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + 1
+
+    def snapshot(self) -> dict:
+        # saved: seconds the templated replies saved against the Reply Agent's mean time (measured on the
+        # replies it wrote), less the time spent rendering and posting them. None until the agent replied.
+        stats = self.stats
+        agent_mean = stats["agent_seconds"] / stats["agent_runs"] if stats["agent_runs"] else None
+        return {
+            "replies": stats["replies"],
+            "templated": stats["templated"],
+            "bypass_rate": round(stats["templated"] / stats["replies"], 3) if stats["replies"] else 0.0,
+            "reasons": dict(stats["reasons"]),
+            "template_mean": round(stats["template_seconds"] / stats["templated"], 4) if stats["templated"] else None,
+            "agent_mean": round(agent_mean, 4) if agent_mean is not None else None,
+            "saved": round(stats["templated"] * agent_mean - stats["template_seconds"], 3) if agent_mean is not None else None,
+        }
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def load_default_replies() -> TemplateReplies | None:
+    endpoint = os.getenv(REPLY_ENDPOINT_ENV)
+    return TemplateReplies(endpoint) if endpoint else None
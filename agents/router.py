@@ -0,0 +1,57 @@
+import numpy as np
+
+from answer_cache import HashingEmbedder
+from faq_index import FaqIndex
+
+# A question whose score against the FAQ knowledge base reaches FAQ_THRESHOLD only goes to the FAQ
+# agent; one below RAG_THRESHOLD is out of scope for the KB and only goes to the RAG agent. Anything
+# in between goes to both. Tune with `python agents/eval_router.py`.
+DEFAULT_FAQ_THRESHOLD = 0.85
+DEFAULT_RAG_THRESHOLD = 0.35
+# Share of the score taken from BM25 confidence; the rest is vector similarity.
+LEXICAL_WEIGHT = 0.6
+ROUTES = ("faq", "rag", "both")
+
+
+class QuestionRouter:
+    # Scores a question against every phrasing in the KB: BM25 confidence (FaqIndex.query) for exact
+    # wording, and cosine similarity of hashed word/trigram vectors for rewordings and typos.
+    def __init__(
+        self,
+        index: FaqIndex,
+        faq_threshold: float = DEFAULT_FAQ_THRESHOLD,
+        rag_threshold: float = DEFAULT_RAG_THRESHOLD,
+        embedder: HashingEmbedder | None = None,
+    ):
+        self.index = index
+        self.faq_threshold = faq_threshold
+        self.rag_threshold = rag_threshold
+        self.embedder = embedder or HashingEmbedder()
+        phrasings = [question for qna in index.qnas.values() for question in qna["questions"]]
+        self._vectors = np.stack([self.embedder.embed(question) for question in phrasings]) if phrasings else np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self.stats = {"faq": 0, "rag": 0, "both": 0, "fallbacks": 0}
+
+    def score(self, question: str) -> dict:
+        matches = self.index.query(question, top=1, confidence_threshold=0.0)
+        lexical = matches[0]["confidenceScore"] if matches else 0.0
+        semantic = float(np.max(self._vectors @ self.embedder.embed(question))) if len(self._vectors) else 0.0
+        # Lexical confidence drops sharply when one key term differs, which is what separates a
+        # near miss from a rewording; the vector similarity alone would call both a match.
+        score = LEXICAL_WEIGHT * lexical + (1 - LEXICAL_WEIGHT) * max(semantic, 0.0)
+        return {"lexical": lexical, "semantic": round(semantic, 4), "score": round(score, 4)}
+
+    def route(self, question: str) -> str:
+        score = self.score(question)["score"]
+        route = "faq" if score >= self.faq_threshold else "rag" if score < self.rag_threshold else "both"
+        self.stats[route] += 1
+        return route
+
+    def fallback(self):
+        # The FAQ agent had no answer for a question routed to FAQ only, so RAG ran after all.
+        self.stats["fallbacks"] += 1
+
+    def snapshot(self) -> dict:
+        routed = self.stats["faq"] + self.stats["rag"] + self.stats["both"]
+        # Without the router every question has a RAG run.
+        avoided = self.stats["faq"] - self.stats["fallbacks"]
+        return {**self.stats, "questions": routed, "rag_runs_avoided": avoided, "faq_runs_avoided": self.stats["rag"]}
@@ -0,0 +1,214 @@
+import asyncio
+import time
+from typing import Callable, NamedTuple
+
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from azure.ai.agents.models import AsyncAgentEventHandler, AsyncFunctionTool, AsyncToolSet
+
+# Adaptive polling: the first poll waits for most of the agent's usual run time, then polls
+# start fast and back off, so short and long runs are both noticed soon after they finish.
+POLL_MIN_INTERVAL = 0.1
+POLL_MAX_INTERVAL = 1.0
+POLL_BACKOFF = 1.25
+POLL_FIRST_FRACTION = 0.8
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete")
+# How long a cancelled run may take to stop before its usage is given up on.
+CANCEL_TIMEOUT = 10.0
+# Statuses a streaming endpoint answers with when it doesn't support streaming.
+STREAM_UNSUPPORTED_STATUSES = (404, 405, 415, 501)
+
+
+class RunCancelledError(asyncio.CancelledError):
+    # Raised instead of CancelledError when the task waiting on a run is cancelled, once the run has been
+    # cancelled on the service too. run is the run as it stopped (usage included, if reported), or None
+    # if it hadn't been created yet.
+    def __init__(self, run=None):
+        super().__init__(f"Run {run.id} cancelled" if run is not None else "Run cancelled before it started")
+        self.run = run
+
+
+class RunOutcome(NamedTuple):
+    run: object
+    message: object | None  # the completed agent message, when the stream delivered it
+    ttft: float | None  # seconds from starting the run to the first text being available
+    requests: int  # HTTP requests made for the run (a stream counts as one)
+    mode: str
+    tool_steps: tuple = ()  # server-side tool calls: {"type", "name", "start_ns", "end_ns", "status"}
+
+
+# Moving average of run duration per agent ID, shared by all polled runs in the process. Agents
+# that call local functions are left out: their runs stop at requires_action well before the end.
+run_durations = {}
+
+
+class StreamEvents(AsyncAgentEventHandler):
+    # Collects what a runner needs from the event stream; requires_action is handled by the SDK.
+    def __init__(self, on_delta: Callable[[str], None] | None = None, clock=time.perf_counter):
+        super().__init__()
+        self.on_delta = on_delta
+        self.clock = clock
+        self.started = clock()
+        self.first_token = None
+        self.run = None
+        self.message = None
+        self.steps = 0
+        self.tool_calls = 0
+        self.tool_steps = {}  # step ID -> {"type", "name", "start_ns", "end_ns", "status"}
+        self.error = None
+
+    async def on_message_delta(self, delta):
+        if self.first_token is None:
+            self.first_token = self.clock()
+        if self.on_delta and delta.text:
+            self.on_delta(delta.text)
+
+    async def on_thread_message(self, message):
+        if message.status == "completed":
+            self.message = message
+
+    async def on_thread_run(self, run):
+        self.run = run
+        if run.status == "requires_action" and run.required_action:
+            self.tool_calls += len(run.required_action.submit_tool_outputs.tool_calls)
+
+    async def on_run_step(self, step):
+        if step.status == "completed":
+            self.steps += 1
+        for number, (call_type, name) in enumerate(tool_call_names(step)):
+            key = (step.id, number)
+            entry = self.tool_steps.setdefault(key, {"type": call_type, "name": name, "start_ns": time.time_ns(), "end_ns": None, "status": None})
+            if step.status != "in_progress":
+                entry["end_ns"], entry["status"] = time.time_ns(), step.status
+
+    async def on_error(self, data):
+        self.error = data
+
+
+def tool_call_names(step) -> list[tuple[str, str]]:
+    # (type, name) per tool call of a tool_calls run step; name is the function/operation when there is one.
+    details = step.step_details
+    if step.type != "tool_calls" or not details:
+        return []
+    return [(call.type, (call.get(call.type) or {}).get("name") or call.type) for call in details.tool_calls]
+
+
+def streaming_unavailable(error: Exception) -> bool:
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    return isinstance(error, HttpResponseError) and error.status_code in STREAM_UNSUPPORTED_STATUSES
+
+
+async def execute_tool_calls(functions: AsyncFunctionTool | None, tool_calls: list) -> list:
+    if functions is None:
+        raise RuntimeError(f"Run requires {len(tool_calls)} tool call(s) but no local functions are registered.")
+    toolset = AsyncToolSet()
+    toolset.add(functions)
+    return await toolset.execute_tool_calls(tool_calls)
+
+
+async def cancel_run(agents, thread_id: str, run, timeout: float = CANCEL_TIMEOUT):
+    # Cancels the run and polls until it has stopped, so the tokens it used are known. A run that
+    # finished in the meantime can't be cancelled; it is returned as last seen.
+    if run is None or run.status in TERMINAL_STATUSES:
+        return run
+    deadline = time.monotonic() + timeout
+    interval = POLL_MIN_INTERVAL
+    try:
+        run = await agents.runs.cancel(thread_id=thread_id, run_id=run.id)
+        while run.status not in TERMINAL_STATUSES and time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            interval = min(POLL_MAX_INTERVAL, interval * POLL_BACKOFF)
+            run = await agents.runs.get(thread_id=thread_id, run_id=run.id)
+    except (HttpResponseError, ServiceRequestError, ServiceResponseError):
+        pass
+    return run
+
+
+async def list_tool_steps(agents, thread_id: str, run_id: str) -> tuple:
+    # Polled runs only learn about server-side tool calls by listing the run steps afterwards; their
+    # timestamps have one-second resolution.
+    steps = []
+    async for step in agents.run_steps.list(thread_id=thread_id, run_id=run_id):
+        for call_type, name in tool_call_names(step):
+            start = step.created_at.timestamp() if step.created_at else None
+            end = (step.completed_at or step.failed_at or step.cancelled_at or step.created_at).timestamp() if start else None
+            if start is not None:
+                steps.append({"type": call_type, "name": name, "start_ns": int(start * 1e9), "end_ns": int(end * 1e9), "status": step.status})
+    return tuple(steps)
+
+
+async def poll_run(
+    agents,
+    thread_id: str,
+    agent_id: str,
+    functions: AsyncFunctionTool | None = None,
+    run=None,
+    clock=time.perf_counter,
+    list_steps: bool = False,
+) -> RunOutcome:
+    # Creates the run (unless one is passed in) and polls it with growing intervals, running
+    # local function tools on requires_action. list_steps adds the run's tool calls (one more request).
+    # If the calling task is cancelled, so is the run (RunCancelledError).
+    started = clock()
+    requests = 0
+    if run is None:
+        run = await agents.runs.create(thread_id=thread_id, agent_id=agent_id)
+        requests += 1
+    interval = POLL_MIN_INTERVAL
+    tool_calls = False
+    try:
+        if agent_id in run_durations and run.status not in TERMINAL_STATUSES:
+            await asyncio.sleep(run_durations[agent_id] * POLL_FIRST_FRACTION)
+        while run.status not in TERMINAL_STATUSES:
+            if run.status == "requires_action":
+                outputs = await execute_tool_calls(functions, run.required_action.submit_tool_outputs.tool_calls)
+                run = await agents.runs.submit_tool_outputs(thread_id=thread_id, run_id=run.id, tool_outputs=outputs)
+                requests += 1
+                interval = POLL_MIN_INTERVAL
+                tool_calls = True
+                continue
+            await asyncio.sleep(interval)
+            interval = min(POLL_MAX_INTERVAL, interval * POLL_BACKOFF)
+            run = await agents.runs.get(thread_id=thread_id, run_id=run.id)
+            requests += 1
+    except asyncio.CancelledError:
+        raise RunCancelledError(await asyncio.shield(cancel_run(agents, thread_id, run)))
+    elapsed = clock() - started
+    if tool_calls:
+        run_durations.pop(agent_id, None)
+    elif run.status == "completed":
+        run_durations[agent_id] = elapsed if agent_id not in run_durations else 0.8 * run_durations[agent_id] + 0.2 * elapsed
+    tool_steps = ()
+    if list_steps:
+        tool_steps = await list_tool_steps(agents, thread_id, run.id)
+        requests += 1
+    return RunOutcome(run, None, elapsed, requests, "poll", tool_steps)
+
+
+async def stream_run(
+    agents,
+    thread_id: str,
+    agent_id: str,
+    functions: AsyncFunctionTool | None = None,
+    on_delta: Callable[[str], None] | None = None,
+    clock=time.perf_counter,
+    list_steps: bool = False,
+) -> RunOutcome:
+    # Streams the run. If the stream can't be opened or breaks, the run is finished by polling
+    # (list_steps applies to that fallback; the stream reports tool calls as they happen). If the
+    # calling task is cancelled, so is the run (RunCancelledError).
+    events = StreamEvents(on_delta, clock)
+    try:
+        async with await agents.runs.stream(thread_id=thread_id, agent_id=agent_id, event_handler=events) as stream:
+            await stream.until_done()
+    except asyncio.CancelledError:
+        raise RunCancelledError(await asyncio.shield(cancel_run(agents, thread_id, events.run)))
+    except Exception as e:
+        if not streaming_unavailable(e):
+            raise
+        outcome = await poll_run(agents, thread_id, agent_id, functions, events.run, clock, list_steps)
+        return outcome._replace(requests=outcome.requests + 1, mode="stream+poll")
+
+    ttft = events.first_token - events.started if events.first_token is not None else clock() - events.started
+    tool_steps = tuple({**step, "end_ns": step["end_ns"] or time.time_ns()} for step in events.tool_steps.values())
+    return RunOutcome(events.run, events.message, ttft, 1 + (1 if events.tool_calls else 0), "stream", tool_steps)
@@ -0,0 +1,267 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import time
+import weakref
+from typing import Awaitable, Callable, NamedTuple
+
+# Lower value runs first: a single email someone is waiting on goes ahead of batch traffic.
+INTERACTIVE = 0
+BULK = 1
+
+
+class DeploymentLimits(NamedTuple):
+    rpm: int
+    tpm: int
+
+
+# Quota per model deployment. Set these to the deployments' actual quota, or override them
+# with DEPLOYMENT_LIMITS='{"gpt-4o": {"rpm": 300, "tpm": 50000}}'.
+DEFAULT_LIMITS = {
+    "gpt-4.1": DeploymentLimits(rpm=300, tpm=50_000),
+    "gpt-4.1-mini": DeploymentLimits(rpm=1_000, tpm=200_000),
+    "gpt-4o": DeploymentLimits(rpm=300, tpm=50_000),
+    "gpt-4o-mini": DeploymentLimits(rpm=1_000, tpm=200_000),
+}
+# Azure OpenAI enforces quota over short windows, so at most ten seconds' worth of quota may burst.
+BURST_FRACTION = 1 / 6
+DEFAULT_TOKEN_ESTIMATE = 1_000
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+JITTER = 0.25
+
+_RETRY_IN = re.compile(r"try again in (\d+(?:\.\d+)?) seconds?", re.IGNORECASE)
+
+
+class RateLimitError(RuntimeError):
+    # Raised by callers for a throttled run (HTTP 429, or a run that failed with rate_limit_exceeded).
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(text: str | None) -> float | None:
+    # Accepts a Retry-After header value or a "Try again in 20 seconds" error message.
+    if not text:
+        return None
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        match = _RETRY_IN.search(text)
+        return float(match.group(1)) if match else None
+
+
+def throttle_delay(error: Exception) -> tuple[bool, float | None]:
+    # Returns (throttled, retry_after seconds if the service said).
+    if isinstance(error, RateLimitError):
+        return True, error.retry_after
+    if getattr(error, "status_code", None) == 429:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        if headers.get("retry-after-ms"):
+            return True, float(headers["retry-after-ms"]) / 1000
+        return True, parse_retry_after(headers.get("Retry-After"))
+    return False, None
+
+
+def load_limits() -> dict:
+    limits = dict(DEFAULT_LIMITS)
+    for model, value in json.loads(os.getenv("DEPLOYMENT_LIMITS", "{}")).items():
+        limits[model] = DeploymentLimits(rpm=value["rpm"], tpm=value["tpm"])
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.level = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        # Seconds until amount can be taken; requests larger than the bucket wait for a full bucket.
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        # Credit (or, when negative, charge) the bucket once actual usage is known.
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self):
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+
+class Deployment:
+    def __init__(self, name: str, limits: DeploymentLimits | None, clock, burst_fraction: float = BURST_FRACTION):
+        self.name = name
+        self.clock = clock
+        self.requests = self.tokens = None
+        if limits:
+            self.requests = TokenBucket(limits.rpm / 60, max(1.0, limits.rpm * burst_fraction), clock)
+            self.tokens = TokenBucket(limits.tpm / 60, max(1.0, limits.tpm * burst_fraction), clock)
+        self.waiting = []
+        self.changed = asyncio.Condition()
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.stats = {"dispatched": 0, "throttled": 0, "retries": 0, "failed": 0, "cancelled": 0, "tokens": 0}
+
+    def delay(self, tokens: float) -> float:
+        delay = self.paused_until - self.clock()
+        if self.requests:
+            delay = max(delay, self.requests.delay(1), self.tokens.delay(tokens))
+        return max(0.0, delay)
+
+    def take(self, tokens: float):
+        if self.requests:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        if self.requests:
+            # Whatever the buckets believed, the service says the quota is used up.
+            self.requests.drain()
+            self.tokens.drain()
+
+
+class RateLimitScheduler:
+    # Every agent run goes through run(); runs wait per model deployment until both the request
+    # and the token bucket have room, in priority order, and back off on 429s.
+    def __init__(
+        self,
+        limits: dict | None = None,
+        clock=time.monotonic,
+        max_retries: int = MAX_RETRIES,
+        rng: random.Random | None = None,
+        burst_fraction: float = BURST_FRACTION,
+    ):
+        self.limits = load_limits() if limits is None else limits
+        self.clock = clock
+        self.burst_fraction = burst_fraction
+        self.max_retries = max_retries
+        self.rng = rng or random.Random()
+        self.deployments = {}
+        self.estimates = {}
+        self._seq = itertools.count()
+
+    def deployment(self, model: str) -> Deployment:
+        if model not in self.deployments:
+            self.deployments[model] = Deployment(model, self.limits.get(model), self.clock, self.burst_fraction)
+        return self.deployments[model]
+
+    async def _acquire(self, deployment: Deployment, tokens: float, priority: int):
+        entry = (priority, next(self._seq))
+        async with deployment.changed:
+            heapq.heappush(deployment.waiting, entry)
+            try:
+                while True:
+                    delay = None
+                    if deployment.waiting[0] == entry:
+                        delay = deployment.delay(tokens)
+                        if delay <= 0:
+                            heapq.heappop(deployment.waiting)
+                            deployment.take(tokens)
+                            deployment.changed.notify_all()
+                            return
+                    try:
+                        await asyncio.wait_for(deployment.changed.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in deployment.waiting:
+                    deployment.waiting.remove(entry)
+                    heapq.heapify(deployment.waiting)
+                    deployment.changed.notify_all()
+                raise
+
+    def _backoff(self, retry_after: float | None, attempt: int) -> float:
+        if retry_after is None:
+            return self.rng.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        return retry_after * (1 + self.rng.uniform(0, JITTER))
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable],
+        priority: int = INTERACTIVE,
+        key: str | None = None,
+        usage: Callable[[object], int] | None = None,
+    ):
+        # call is invoked again on a retry. key groups runs whose token use is similar (e.g. an agent ID);
+        # usage(result) returns the tokens a run actually used so the estimate and the bucket can be corrected.
+        deployment = self.deployment(model)
+        key = key or model
+        for attempt in range(self.max_retries + 1):
+            estimate = self.estimates.get(key, DEFAULT_TOKEN_ESTIMATE)
+            await self._acquire(deployment, estimate, priority)
+            deployment.in_flight += 1
+            try:
+                result = await call()
+            except asyncio.CancelledError:
+                deployment.stats["cancelled"] += 1
+                raise
+            except Exception as e:
+                throttled, retry_after = throttle_delay(e)
+                if not throttled:
+                    deployment.stats["failed"] += 1
+                    raise
+                deployment.stats["throttled"] += 1
+                if attempt == self.max_retries:
+                    deployment.stats["failed"] += 1
+                    raise
+                deployment.stats["retries"] += 1
+                async with deployment.changed:
+                    deployment.pause(self._backoff(retry_after, attempt))
+                    deployment.changed.notify_all()
+                continue
+            finally:
+                deployment.in_flight -= 1
+
+            deployment.stats["dispatched"] += 1
+            if usage is not None:
+                actual = usage(result)
+                deployment.stats["tokens"] += actual
+                if deployment.tokens:
+                    deployment.tokens.adjust(estimate - actual)
+                self.estimates[key] = actual if key not in self.estimates else 0.8 * self.estimates[key] + 0.2 * actual
+            return result
+
+    def snapshot(self) -> dict:
+        now = self.clock()
+        return {
+            model: {
+                "queued": len(deployment.waiting),
+                "in_flight": deployment.in_flight,
+                "paused_for": round(max(0.0, deployment.paused_until - now), 2),
+                **deployment.stats,
+            }
+            for model, deployment in self.deployments.items()
+        }
+
+
+_schedulers = weakref.WeakKeyDictionary()
+
+
+def default_scheduler() -> RateLimitScheduler:
+    # One scheduler per event loop, shared by every pipeline and batch run in the process.
+    loop = asyncio.get_running_loop()
+    if loop not in _schedulers:
+        _schedulers[loop] = RateLimitScheduler()
+    return _schedulers[loop]
@@ -0,0 +1,134 @@
+from typing import Callable, NamedTuple
+
+
+class SchemaIssue(NamedTuple):
+    path: tuple
+    message: str
+
+    def __str__(self) -> str:
+        location = "".join(f"[{part}]" if isinstance(part, int) else f".{part}" for part in self.path).lstrip(".")
+        return f"{location or '<root>'}: {self.message}"
+
+
+Validator = Callable[[object, tuple], list]
+
+_TYPES = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def _compile(schema: dict, non_empty: bool = False) -> Validator:
+    # Build the checks once; validating is then a walk over closures with no schema lookups.
+    # non_empty also rejects strings that are empty or only whitespace.
+    checks = []
+
+    expected = schema.get("type")
+    if expected:
+        names = expected if isinstance(expected, list) else [expected]
+        type_checks = [_TYPES[name] for name in names]
+        label = " or ".join(names)
+
+        def check_type(value, path):
+            if not any(check(value) for check in type_checks):
+                return [SchemaIssue(path, f"expected {label}, got {type(value).__name__}")]
+            return []
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+
+        def check_enum(value, path):
+            return [] if value in allowed else [SchemaIssue(path, f"must be one of {allowed}")]
+        checks.append(check_enum)
+
+    if non_empty and "string" in (expected if isinstance(expected, list) else [expected]):
+        def check_blank(value, path):
+            return [SchemaIssue(path, "must not be empty")] if isinstance(value, str) and not value.strip() else []
+        checks.append(check_blank)
+
+    properties = {name: _compile(sub, non_empty) for name, sub in schema.get("properties", {}).items()}
+    required = list(schema.get("required", []))
+    closed = schema.get("additionalProperties") is False
+    if properties or required or closed:
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return []
+            issues = [SchemaIssue(path + (name,), "required property is missing") for name in required if name not in value]
+            for name, item in value.items():
+                if name in properties:
+                    issues.extend(properties[name](item, path + (name,)))
+                elif closed:
+                    issues.append(SchemaIssue(path + (name,), "unexpected property"))
+            return issues
+        checks.append(check_object)
+
+    if "items" in schema or "minItems" in schema:
+        item_validator = _compile(schema.get("items", {}), non_empty)
+        min_items = schema.get("minItems", 0)
+
+        def check_array(value, path):
+            if not isinstance(value, list):
+                return []
+            issues = [SchemaIssue(path, f"expected at least {min_items} items")] if len(value) < min_items else []
+            for index, item in enumerate(value):
+                issues.extend(item_validator(item, path + (index,)))
+            return issues
+        checks.append(check_array)
+
+    if "minLength" in schema:
+        min_length = schema["minLength"]
+
+        def check_length(value, path):
+            if isinstance(value, str) and len(value) < min_length:
+                return [SchemaIssue(path, f"must be at least {min_length} characters")]
+            return []
+        checks.append(check_length)
+
+    def validate(value, path=()):
+        issues = []
+        for check in checks:
+            issues.extend(check(value, path))
+        return issues
+    return validate
+
+
+def compile_schema(schema: dict, non_empty: bool = False) -> Validator:
+    return _compile(schema, non_empty)
+
+
+def compile_response_format(response_format: dict, non_empty: bool = False) -> Validator:
+    return compile_schema(response_format["json_schema"]["schema"], non_empty)
+
+
+class ValidationStats:
+    # Per agent: outputs checked, outputs with invalid or missing items, follow-up runs asking for just
+    # those items, and follow-ups that fixed all of them.
+    def __init__(self):
+        self.agents = {}
+
+    def _stats(self, agent: str) -> dict:
+        return self.agents.setdefault(agent, {"checked": 0, "failed": 0, "failed_items": 0, "retries": 0, "repaired": 0})
+
+    def record(self, agent: str, issues):
+        stats = self._stats(agent)
+        stats["checked"] += 1
+        if issues:
+            stats["failed"] += 1
+            stats["failed_items"] += len(issues)
+
+    def record_retry(self, agent: str, issues):
+        stats = self._stats(agent)
+        stats["retries"] += 1
+        stats["repaired"] += not issues
+
+    def snapshot(self) -> dict:
+        return {
+            agent: {**stats, "failure_rate": round(stats["failed"] / stats["checked"], 3) if stats["checked"] else 0.0}
+            for agent, stats in sorted(self.agents.items())
+        }
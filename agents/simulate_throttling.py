@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from batch import BatchRunner
+from fake_foundry import FAKE_AGENT_IDS, FakeProjectClient, FakeQuota
+from pipeline import STAGE_MODULES, EmailPipeline, FoundryAgentClient
+from scheduler import BULK, INTERACTIVE, DeploymentLimits, RateLimitScheduler
+
+QUESTIONS = [
+    "Which regions support Agent Service?",
+    "How much does Agent Service cost?",
+    "How does file search work?",
+    "Which models can I use with Agent Service?",
+    "How do I connect a SharePoint site?",
+]
+# The fake enforces quota over one-second windows, so the scheduler may only burst one second's worth.
+WINDOW = 1.0
+
+
+def write_emails(path: str, count: int, rng: random.Random):
+    with open(path, "w", encoding="utf-8") as f:
+        for number in range(count):
+            body = " ".join(rng.sample(QUESTIONS, 2))
+            f.write(json.dumps({"id": f"bulk-{number}", "from": "a@contoso.com", "to": "support@contoso.com", "subject": "Questions", "body": body}) + "\n")
+
+
+async def simulate(limits: dict, bulk: int, interactive: int, use_scheduler: bool, prioritize: bool, speed: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    models = {FAKE_AGENT_IDS[stage]: module.MODEL_NAME for stage, module in STAGE_MODULES.items()}
+    quotas = {model: FakeQuota(int(l.rpm * WINDOW / 60), int(l.tpm * WINDOW / 60), WINDOW) for model, l in limits.items()}
+    scheduler = RateLimitScheduler(limits, burst_fraction=WINDOW / 60, rng=rng) if use_scheduler else None
+
+    async with FakeProjectClient(speed=speed, models=models, quotas=quotas) as project_client:
+        def pipeline(priority: int) -> EmailPipeline:
+            client = FoundryAgentClient(project_client, scheduler=scheduler, models=models, priority=priority)
+            return EmailPipeline(client, FAKE_AGENT_IDS)
+
+        interactive_pipeline = pipeline(INTERACTIVE if prioritize else BULK)
+        interactive_latency, interactive_errors = [], 0
+
+        async def interactive_emails():
+            nonlocal interactive_errors
+            for number in range(interactive):
+                await asyncio.sleep(0.5)
+                email = {"id": f"interactive-{number}", "subject": "Question", "body": rng.choice(QUESTIONS)}
+                start = time.perf_counter()
+                try:
+                    await interactive_pipeline.process(email)
+                    interactive_latency.append(time.perf_counter() - start)
+                except Exception:
+                    interactive_errors += 1
+
+        with tempfile.TemporaryDirectory() as tmp:
+            emails_path, results_path = os.path.join(tmp, "emails.jsonl"), os.path.join(tmp, "results.jsonl")
+            write_emails(emails_path, bulk, rng)
+            runner = BatchRunner(pipeline(BULK), results_path, workers={"triage": 8, "answer": 16, "reply": 8})
+            summary, _ = await asyncio.gather(runner.run(emails_path), interactive_emails())
+
+    return {
+        "bulk": summary,
+        "interactive_p50": statistics.median(interactive_latency) if interactive_latency else None,
+        "interactive_errors": interactive_errors,
+        "endpoint_429s": sum(quota.throttled for quota in quotas.values()),
+        "scheduler": scheduler.snapshot() if scheduler else {},
+    }
+
+
+def report(name: str, result: dict):
+    bulk = result["bulk"]
+    p50 = f"{result['interactive_p50']:.2f}s" if result["interactive_p50"] is not None else "n/a"
+    print(f"{name}:")
+    print(f"  bulk: {bulk['processed']} emails, {bulk['error']} errors, {bulk['emails_per_minute']:.0f} emails/min, p50 {bulk['p50']:.2f}s p95 {bulk['p95']:.2f}s")
+    print(f"  interactive: p50 {p50}, {result['interactive_errors']} errors")
+    print(f"  429s returned by the endpoint: {result['endpoint_429s']}")
+    for model, stats in result["scheduler"].items():
+        print(f"  {model}: dispatched {stats['dispatched']}, throttled {stats['throttled']}, failed {stats['failed']}, tokens {stats['tokens']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate bulk and interactive traffic against a fake endpoint that returns 429s.")
+    parser.add_argument("--bulk", type=int, default=60, help="emails in the bulk batch")
+    parser.add_argument("--interactive", type=int, default=5, help="single emails sent while the batch runs")
+    parser.add_argument("--speed", type=float, default=0.02, help="scale the fake's simulated latency")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Per-minute quotas, scaled down so the simulation saturates them in a few seconds.
+    limits = {
+        "gpt-4.1": DeploymentLimits(rpm=1_200, tpm=120_000),
+        "gpt-4.1-mini": DeploymentLimits(rpm=3_000, tpm=600_000),
+        "gpt-4o": DeploymentLimits(rpm=600, tpm=150_000),
+    }
+    for name, use_scheduler, prioritize in [
+        ("no scheduler", False, False),
+        ("scheduler, no priorities", True, False),
+        ("scheduler, interactive first", True, True),
+    ]:
+        report(name, asyncio.run(simulate(limits, args.bulk, args.interactive, use_scheduler, prioritize, args.speed, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+# How the FAQ and RAG agents share a question (EmailPipeline answer_mode):
+# "both" runs them together and prefers the RAG answer, "sequential" asks RAG only when FAQ has no
+# answer, "speculative" starts RAG with FAQ and cancels it when FAQ answers.
+ANSWER_MODES = ("both", "sequential", "speculative")
+
+
+class SpeculativeRag:
+    # Runs the RAG path speculatively next to the FAQ path. A confident FAQ answer wins and the RAG
+    # run still in progress is cancelled (runs.cancel); an FAQ miss falls back to the RAG answer, which
+    # has been running since FAQ started. The FAQ answer doesn't wait for the cancellation to go through;
+    # cancelled runs report the tokens they had used (record_cancelled) and drain() waits for the rest.
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._cancelling = set()
+        self.stats = {
+            "questions": 0,
+            "faq_answered": 0,
+            "rag_cancelled": 0,
+            "rag_needed": 0,
+            "head_start_seconds": 0.0,
+            "runs_cancelled": 0,
+            "wasted_tokens": 0,
+        }
+
+    async def run(
+        self,
+        faq: Callable[[], Awaitable[tuple[str | None, list]]],
+        rag: Callable[[], Awaitable[tuple[str | None, list]]],
+    ) -> tuple[str | None, str | None, list]:
+        # Returns (FAQ answer, RAG answer, citations); only one of the answers is set.
+        self.stats["questions"] += 1
+        started = self.clock()
+        task = asyncio.ensure_future(rag())
+        finished = []
+        task.add_done_callback(lambda _: finished.append(self.clock()))
+        try:
+            faq_answer, _ = await faq()
+        except BaseException:
+            task.cancel()
+            await asyncio.wait([task])
+            raise
+        if faq_answer:
+            self.stats["faq_answered"] += 1
+            if task.done():
+                if not task.cancelled():
+                    task.exception()  # the RAG answer isn't needed, so neither is its error
+            else:
+                task.cancel()
+                self.stats["rag_cancelled"] += 1
+                self._cancelling.add(task)
+                task.add_done_callback(self._cancelling.discard)
+            return faq_answer, None, []
+        self.stats["rag_needed"] += 1
+        # Time the RAG path had already run when FAQ came back empty: what sequential would have added.
+        self.stats["head_start_seconds"] += (finished[0] if finished else self.clock()) - started
+        rag_answer, citations = await task
+        return None, rag_answer, citations
+
+    def record_cancelled(self, usage: dict | None):
+        self.stats["runs_cancelled"] += 1
+        self.stats["wasted_tokens"] += sum((usage or {}).get(key, 0) for key in ("prompt_tokens", "completion_tokens"))
+
+    async def drain(self):
+        if self._cancelling:
+            await asyncio.wait(list(self._cancelling))
+
+    def snapshot(self) -> dict:
+        questions = self.stats["questions"]
+        return {
+            **self.stats,
+            "head_start_seconds": round(self.stats["head_start_seconds"], 3),
+            "cancel_rate": round(self.stats["rag_cancelled"] / questions, 3) if questions else 0.0,
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules under test are the scripts in agents/, imported by name.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pipeline
+from batch import run_batch
+
+NAMES = ["Ana", "Bo", "Cy", "Di"]
+
+
+def write_emails(path, count: int):
+    # count emails that are resent copies of len(NAMES) originals, interleaved.
+    with open(path, "w", encoding="utf-8") as f:
+        for number in range(count):
+            name = NAMES[number % len(NAMES)]
+            email = {"id": f"e{number}", "from": f"{name.lower()}@contoso.com", "to": "support@contoso.com", "subject": "Pricing",
+                     "body": f"Hi, this is {name}. How much does Agent Service cost? Thanks, {name}"}
+            f.write(json.dumps(email) + "\n")
+
+
+def run(tmp_path, count: int) -> tuple[dict, list]:
+    write_emails(tmp_path / "emails.jsonl", count)
+    results_path = tmp_path / "results.jsonl"
+
+    async def scenario():
+        # More duplicates than answer workers; a duplicate holding a worker while its original waits
+        # behind it in the answer queue used to hang the batch.
+        workers = {"triage": 8, "answer": 1, "reply": 1}
+        return await asyncio.wait_for(run_batch(str(tmp_path / "emails.jsonl"), str(results_path), fake=True, speed=0.01, workers=workers, dedup=True), 20)
+
+    summary = asyncio.run(scenario())
+    return summary, [json.loads(line) for line in results_path.read_text().splitlines()]
+
+
+def test_duplicates_do_not_hold_answer_workers(tmp_path):
+    summary, results = run(tmp_path, 40)
+    assert summary["replied"] == 40 and summary["error"] == 0
+    assert summary["dedup"]["duplicates"] == 36
+    duplicates = [result for result in results if "duplicate_of" in result]
+    assert len(duplicates) == 36
+    # Only the originals ran triage and FAQ/RAG.
+    assert summary["spans"]["Triage Agent"]["count"] == len(NAMES)
+    by_id = {result["email_id"]: result for result in results}
+    assert all(result["questions"] == by_id[result["duplicate_of"]]["questions"] for result in duplicates)
+
+
+def test_duplicate_of_a_failed_email_is_answered_on_its_own(tmp_path, monkeypatch):
+    answer_once = pipeline.EmailPipeline._answer_once
+    failed = []
+
+    async def fail_first(self, job, question_id, question):
+        if not failed:
+            failed.append(job.email["id"])
+            raise pipeline.AgentRunError("FAQ Agent failed")
+        return await answer_once(self, job, question_id, question)
+
+    monkeypatch.setattr(pipeline.EmailPipeline, "_answer_once", fail_first)
+    summary, results = run(tmp_path, 8)
+    assert summary["error"] == 1 and summary["replied"] == 7
+    errored = next(result for result in results if result["status"] == "error")
+    assert errored["email_id"] == failed[0]
+    # Its duplicates reused its triage output but not its answers.
+    followers = [result for result in results if result.get("duplicate_of") == failed[0]]
+    assert followers and all(result["status"] == "replied" and result["questions"][0]["answer"] for result in followers)
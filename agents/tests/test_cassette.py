@@ -0,0 +1,62 @@
+import asyncio
+import json
+import os
+
+from azure.ai.agents.aio import AgentsClient
+from azure.core.pipeline.transport import AsyncHttpTransport
+from azure.core.rest import HttpRequest
+
+from cassette import Cassette, RecordingTransport, Replayer, ReplayCredential, ReplayTransport, _ReplayResponse
+
+ENDPOINT = "https://test.services.ai.azure.com/api/projects/test"
+EVENTS = [b"event: thread.run.created\ndata: {\"id\": \"run_1\"}\n\n", b"event: done\ndata: [DONE]\n\n"]
+
+
+class CannedTransport(AsyncHttpTransport):
+    # Answers the two requests below without a network.
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send(self, request, **kwargs):
+        if request.url.split("?")[0].endswith("/threads"):
+            content = json.dumps({"id": "thread_abc", "object": "thread"}).encode()
+            return _ReplayResponse(request, 200, {"content-type": "application/json", "x-ms-request-id": "1"}, None, content=content)
+        return _ReplayResponse(request, 200, {"content-type": "text/event-stream"}, chunks(EVENTS))
+
+
+async def chunks(items):
+    for item in items:
+        yield item
+
+
+async def exchange(transport) -> tuple:
+    async with AgentsClient(endpoint=ENDPOINT, credential=ReplayCredential(), transport=transport) as client:
+        thread = await client.send_request(HttpRequest("POST", f"{ENDPOINT}/threads?api-version=v1", json={}))
+        thread_id = thread.json()["id"]
+        run = HttpRequest("POST", f"{ENDPOINT}/threads/{thread_id}/runs?api-version=v1", json={"assistant_id": "asst_1", "stream": True})
+        response = await client.send_request(run, stream=True)
+        events = b"".join([chunk async for chunk in response.iter_bytes()])
+        assert response.is_closed
+        return thread_id, events
+
+
+def test_recorded_exchange_replays_the_same(tmp_path):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    cassette = Cassette(path, {"project_path": "/api/projects/test"})
+    recorded = asyncio.run(exchange(RecordingTransport(cassette, inner=CannedTransport())))
+    cassette.save()
+    assert os.listdir(tmp_path) == ["traffic.jsonl.gz"]
+
+    loaded = Cassette.load(path)
+    assert [interaction["headers"] for interaction in loaded.interactions] == [{"content-type": "application/json"}, {"content-type": "text/event-stream"}]
+    replayed = asyncio.run(exchange(ReplayTransport(Replayer(loaded, timing=False))))
+    assert replayed == recorded == ("thread_abc", b"".join(EVENTS))
@@ -0,0 +1,32 @@
+import asyncio
+
+from coalesce import QuestionCoalescer, coalesce_key
+
+
+def test_case_and_punctuation_do_not_change_the_key():
+    assert coalesce_key("How much does Agent Service cost?") == coalesce_key("  how much does agent service COST ")
+
+
+def test_word_order_and_question_words_change_the_key():
+    assert coalesce_key("Can I move an agent from East US to West US?") != coalesce_key("Can I move an agent from West US to East US?")
+    assert coalesce_key("When is Agent Service available?") != coalesce_key("Where is Agent Service available?")
+    assert coalesce_key("Is it free?") != coalesce_key("It is free?")
+
+
+def test_only_identical_questions_share_an_answer():
+    coalescer = QuestionCoalescer()
+
+    async def answer(text: str):
+        await asyncio.sleep(0.01)
+        return {"answer": text}, 2
+
+    async def scenario():
+        return await asyncio.gather(
+            coalescer.run("Can I move an agent from East US to West US?", lambda: answer("east to west")),
+            coalescer.run("can i move an agent from east us to west us", lambda: answer("unused")),
+            coalescer.run("Can I move an agent from West US to East US?", lambda: answer("west to east")),
+        )
+
+    results = asyncio.run(scenario())
+    assert [(result["answer"], shared) for result, shared in results] == [("east to west", False), ("east to west", True), ("west to east", False)]
+    assert coalescer.stats["saved_runs"] == 2
@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import cqa_batch_tool
+from cqa_stub_server import CqaStubServer
+from faq_index import FaqIndex
+
+
+def test_async_batch_leaves_the_event_loop_free(monkeypatch):
+    index = FaqIndex()
+    index.add("1", ["How much does Agent Service cost?"], "It is billed per model token.")
+    server = CqaStubServer(("127.0.0.1", 0), index, latency=0.2).start()
+    monkeypatch.setenv("CQA_ENDPOINT", server.endpoint)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await cqa_batch_tool.query_knowledgebase_batch_async(["How much does Agent Service cost?", "Who wins the cup?"])
+        task.cancel()
+        return json.loads(result), ticks
+
+    try:
+        result, ticks = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    assert [a["answer"] for a in result["answers"]] == ["It is billed per model token.", None]
+    assert ticks >= 10  # the loop kept running during the 0.2s queries
+    assert cqa_batch_tool.query_knowledgebase_batch_async.__name__ == "query_knowledgebase_batch"
+
+
+def test_sync_and_async_tools_share_their_setup(monkeypatch):
+    index = FaqIndex()
+    index.add("1", ["How much does Agent Service cost?"], "It is billed per model token.")
+    server = CqaStubServer(("127.0.0.1", 0), index).start()
+    monkeypatch.setenv("CQA_ENDPOINT", server.endpoint)
+    batches = []
+    batch = cqa_batch_tool._batch
+    monkeypatch.setattr(cqa_batch_tool, "_batch", lambda: batches.append(1) or batch())
+    questions = ["How much does Agent Service cost?", "Who wins the cup?"]
+    try:
+        sync = cqa_batch_tool.query_knowledgebase_batch(questions)
+        async_ = asyncio.run(cqa_batch_tool.query_knowledgebase_batch_async(questions))
+    finally:
+        server.shutdown()
+    assert len(batches) == 2
+    assert json.loads(sync) == json.loads(async_)
+    assert [a["answer"] for a in json.loads(sync)["answers"]] == ["It is billed per model token.", None]
@@ -0,0 +1,109 @@
+import json
+import os
+import stat
+import time
+
+import pytest
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ClientAuthenticationError
+
+import credential
+from credential import REFRESH_MARGIN, CachedCredential, TokenStore, token_key
+
+SCOPE = "https://ai.azure.com/.default"
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="file modes are only checked on POSIX")
+
+
+class EnvironmentCredential:
+    pass
+
+
+class FakeChain:
+    # DefaultAzureCredential with only the remembered link, or the whole chain when link is None.
+    def __init__(self, link, fails: bool, calls: list):
+        self.link, self.fails, self.calls = link, fails, calls
+        self.closed = False
+        self._successful_credential = None
+
+    def get_token(self, *scopes, **options):
+        self.calls.append(self.link)
+        if self.fails:
+            raise ClientAuthenticationError("az login has expired")
+        self._successful_credential = EnvironmentCredential()
+        return AccessToken(f"token-{len(self.calls)}", int(time.time()) + 3600)
+
+    def close(self):
+        self.closed = True
+
+
+def write_store(path, tokens: dict, link: str | None = None, mode: int = 0o600):
+    path.write_text(json.dumps({"link": link, "tokens": tokens}))
+    os.chmod(path, mode)
+
+
+def cached(token: str, expires_in: int) -> dict:
+    return {token_key((SCOPE,)): {"token": token, "expires_on": int(time.time()) + expires_in}}
+
+
+@pytest.mark.parametrize("mode", [0o640, 0o604, 0o660])
+def test_file_readable_by_others_is_ignored(tmp_path, mode):
+    path = tmp_path / "tokens.json"
+    write_store(path, cached("secret", 3600), link="AzureCliCredential", mode=mode)
+    store = TokenStore(str(path))
+    assert store.tokens == {} and store.link is None
+
+
+def test_owner_only_file_is_loaded(tmp_path):
+    path = tmp_path / "tokens.json"
+    write_store(path, cached("secret", 3600), link="AzureCliCredential")
+    store = TokenStore(str(path))
+    assert store.link == "AzureCliCredential"
+    assert store.get(token_key((SCOPE,))).token == "secret"
+
+
+def test_saved_file_is_owner_only(tmp_path):
+    path = tmp_path / "cache" / "tokens.json"
+    store = TokenStore(str(path))
+    store.put(token_key((SCOPE,)), AccessToken("secret", int(time.time()) + 3600), "AzureCliCredential")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+    assert TokenStore(str(path)).link == "AzureCliCredential"
+
+
+def test_expiring_token_is_not_reused(tmp_path, monkeypatch):
+    path = tmp_path / "tokens.json"
+    write_store(path, cached("stale", REFRESH_MARGIN - 1), link="AzureCliCredential")
+    calls = []
+    monkeypatch.setattr(credential, "_chain", lambda link, aio: FakeChain(link, False, calls))
+    token = CachedCredential(str(path)).get_token(SCOPE)
+    assert token.token == "token-1" and calls == ["AzureCliCredential"]
+    # The new token replaces the stale one on disk and is reused without the chain.
+    calls.clear()
+    assert CachedCredential(str(path)).get_token(SCOPE).token == "token-1" and calls == []
+
+
+def test_failing_remembered_link_falls_back_to_the_full_chain(tmp_path, monkeypatch):
+    path = tmp_path / "tokens.json"
+    write_store(path, {}, link="AzureCliCredential")
+    calls, chains = [], []
+
+    def chain(link, aio):
+        chains.append(FakeChain(link, link is not None, calls))
+        return chains[-1]
+
+    monkeypatch.setattr(credential, "_chain", chain)
+    token = CachedCredential(str(path)).get_token(SCOPE)
+    assert token.token == "token-2"
+    assert calls == ["AzureCliCredential", None]
+    assert chains[0].closed
+    # The link that worked this time is remembered instead.
+    assert TokenStore(str(path)).link == "EnvironmentCredential"
+
+
+def test_authentication_error_without_a_remembered_link_is_raised(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(credential, "_chain", lambda link, aio: FakeChain(link, True, calls))
+    with pytest.raises(ClientAuthenticationError):
+        CachedCredential(str(tmp_path / "tokens.json")).get_token(SCOPE)
+    assert calls == [None]
@@ -0,0 +1,25 @@
+from dedup import DuplicateIndex, body_key
+
+BODY = "Hi team, my order {number} was charged twice. Can you refund one of the charges? Thanks, Ana"
+
+
+def lookup(index: DuplicateIndex, body: str):
+    return index.find(index.signature(body), body_key(body))
+
+
+def test_resent_email_is_a_duplicate():
+    index = DuplicateIndex(max_entries=10)
+    body = BODY.format(number=1001)
+    index.add(index.signature(body), body_key(body), "first")
+    match = lookup(index, "  hi TEAM, my order 1001 was charged twice.\nCan you refund one of the charges?? Thanks, Ana")
+    assert match is not None and match[0] == "first"
+
+
+def test_emails_that_differ_in_a_number_are_not_duplicates():
+    index = DuplicateIndex(max_entries=100)
+    for number in range(40):
+        body = BODY.format(number=1000 + number)
+        assert lookup(index, body) is None
+        index.add(index.signature(body), body_key(body), number)
+    assert index.stats["duplicates"] == 0
+    assert index.stats["rejected"] > 0  # similar enough to be checked, then told apart
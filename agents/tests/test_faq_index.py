@@ -0,0 +1,34 @@
+from faq_index import FaqIndex
+
+QUESTIONS = [
+    "How do I {action} a vector store using the logic apps?",
+    "How do I {action} a file search index using the python sdk?",
+    "How do I {action} a thread using the portal?",
+]
+
+
+def build_index() -> FaqIndex:
+    index = FaqIndex()
+    for number, action in enumerate(["debug", "create", "export"]):
+        for offset, question in enumerate(QUESTIONS):
+            index.add(f"{number}-{offset}", [question.format(action=action)], f"Steps to {action}.")
+    return index
+
+
+def test_paraphrase_with_filler_words_is_answered():
+    answer = build_index().answer("hey team, HOW I debug a file search index using the python sdk??")
+    assert answer is not None and answer["id"] == "0-1"
+
+
+def test_question_that_swaps_a_key_term_is_not_answered():
+    index = build_index()
+    for action in ("deploy", "monitor", "configure"):
+        # "deploy" is not in this KB; add it elsewhere so the index knows the word.
+        index.add(f"other-{action}", [f"Can I {action} agents in bulk?"], "Yes.")
+    for action in ("deploy", "monitor", "configure"):
+        for question in QUESTIONS:
+            assert index.answer(question.format(action=action)) is None
+
+
+def test_out_of_scope_question_is_not_answered():
+    assert build_index().answer("Is the weather in Seattle nice in May?") is None
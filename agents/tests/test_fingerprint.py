@@ -0,0 +1,52 @@
+import copy
+
+import pytest
+
+from fingerprint import changed_fields, diff_definitions, fingerprint
+
+TOOL = {"type": "openapi", "openapi": {"name": "faq", "description": "FAQ lookup", "spec": {"openapi": "3.0.1", "paths": {"/query": {"post": {"operationId": "query"}}}}}}
+DEFINITION = {"model": "gpt-4.1-mini", "name": "FAQ Agent", "instructions": "Answer from the FAQ.", "tools": [TOOL]}
+
+
+class SdkTool:
+    # Stands in for an SDK model such as OpenApiToolDefinition.
+    def as_dict(self):
+        return copy.deepcopy(TOOL)
+
+
+def reordered(value):
+    if isinstance(value, dict):
+        return {key: reordered(value[key]) for key in reversed(list(value))}
+    if isinstance(value, list):
+        return [reordered(item) for item in value]
+    return value
+
+
+def test_key_order_does_not_change_the_fingerprint():
+    assert fingerprint(reordered(DEFINITION)) == fingerprint(DEFINITION)
+    assert fingerprint({**DEFINITION, "tools": [SdkTool()]}) == fingerprint(DEFINITION)
+    assert changed_fields(DEFINITION, reordered(DEFINITION)) == []
+
+
+def test_unsent_fields_do_not_change_the_fingerprint():
+    assert fingerprint({**DEFINITION, "description": "local note"}) == fingerprint(DEFINITION)
+
+
+@pytest.mark.parametrize("field, value", [
+    ("instructions", "Answer from the FAQ only."),
+    ("model", "gpt-4.1"),
+    ("tools", [{**TOOL, "openapi": {**TOOL["openapi"], "description": "FAQ search"}}]),
+    ("tools", []),
+    ("response_format", {"type": "json_object"}),
+])
+def test_a_changed_field_changes_the_fingerprint(field, value):
+    changed = {**DEFINITION, field: value}
+    assert fingerprint(changed) != fingerprint(DEFINITION)
+    assert changed_fields(DEFINITION, changed) == [field]
+
+
+def test_diff_shows_only_the_changed_field():
+    diff = diff_definitions(DEFINITION, {**DEFINITION, "instructions": "Answer from the FAQ only."})
+    assert diff.splitlines()[:2] == ["--- instructions (deployed)", "+++ instructions (local)"]
+    assert "-Answer from the FAQ." in diff and "+Answer from the FAQ only." in diff
+    assert "model" not in diff
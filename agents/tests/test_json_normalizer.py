@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pytest
+
+from bench_json_normalizer import FIXTURES_PATH, load_samples
+from json_normalizer import check_answers, normalize_answers, parse_answers
+
+QUESTIONS = {"aB3x9Q": "What regions is Agent Service available in?", "K2m7Zp": "How is Agent Service billed?"}
+
+
+def output(*items, unanswered=()) -> str:
+    return json.dumps({"answered_questions": [{"question_id": question_id, "answer": answer} for question_id, answer in items], "unanswered_questions": list(unanswered)})
+
+
+@pytest.mark.parametrize("sample", load_samples(FIXTURES_PATH), ids=lambda sample: sample["output"][:30])
+def test_recorded_outputs_parse_as_expected(sample):
+    # The samples with expected_answered None have no IDs or JSON to recover, so they still need the formatter.
+    result = parse_answers(sample["output"], sample["questions"])
+    answered = [item["question_id"] for item in result["answered_questions"]] if result else None
+    assert answered == sample["expected_answered"]
+
+
+def test_fenced_json_with_trailing_commas_parses():
+    text = 'Here you go:\n```json\n{"answered_questions": [{"question_id": "aB3x9Q", "answer": "East US",}, {"question_id": "K2m7Zp", "answer": "Per token"},],\n "unanswered_questions": [],}\n```'
+    result, gaps = check_answers(text, QUESTIONS)
+    assert gaps == {}
+    assert result == {"answered_questions": [{"question_id": "aB3x9Q", "answer": "East US"}, {"question_id": "K2m7Zp", "answer": "Per token"}], "unanswered_questions": []}
+
+
+def test_schema_violations_are_gaps():
+    result, gaps = check_answers(output(("aB3x9Q", "East US"), ("K2m7Zp", "  ")), QUESTIONS)
+    assert gaps == {"K2m7Zp": "answered_questions[1].answer: must not be empty"}
+    assert result["unanswered_questions"] == ["K2m7Zp"]
+
+
+def test_unparseable_output_runs_the_formatter():
+    async def formatter(text):
+        return output(("aB3x9Q", "East US"), ("K2m7Zp", "Per token"))
+
+    normalized = asyncio.run(normalize_answers("Sure! It is available in many regions.", QUESTIONS, formatter=formatter))
+    assert normalized.used_formatter
+    assert [step for step, _ in normalized.checks] == ["output", "formatter"]
+    assert len(normalized.answers["answered_questions"]) == 2
+
+
+def test_retry_asks_again_for_just_the_invalid_items():
+    asked = []
+
+    async def retry(gaps):
+        asked.append(dict(gaps))
+        return output(("K2m7Zp", "Per model token and tool call."))
+
+    normalized = asyncio.run(normalize_answers(output(("aB3x9Q", "East US"), ("K2m7Zp", "")), QUESTIONS, retry=retry))
+    assert list(asked[0]) == ["K2m7Zp"]
+    assert normalized.checks[-1] == ("retry", {})
+    assert normalized.answers == {
+        "answered_questions": [{"question_id": "aB3x9Q", "answer": "East US"}, {"question_id": "K2m7Zp", "answer": "Per model token and tool call."}],
+        "unanswered_questions": [],
+    }
+
+
+def test_gives_up_after_one_retry():
+    calls = []
+
+    async def retry(gaps):
+        calls.append(gaps)
+        return "I still can't answer that."
+
+    normalized = asyncio.run(normalize_answers(output(("aB3x9Q", "East US"), ("K2m7Zp", "")), QUESTIONS, retry=retry))
+    assert len(calls) == 1
+    assert normalized.checks[-1] == ("retry", {"K2m7Zp": "no answer could be parsed"})
+    # What did parse is kept; the item that never validated is reported as unanswered.
+    assert normalized.answers == {"answered_questions": [{"question_id": "aB3x9Q", "answer": "East US"}], "unanswered_questions": ["K2m7Zp"]}
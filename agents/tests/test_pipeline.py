@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from pipeline import AgentRunError, open_pipeline
+
+EMAIL = {"id": "e1", "from": "a@contoso.com", "to": "support@contoso.com", "subject": "Pricing", "body": "How much does Agent Service cost?"}
+
+
+def test_pipeline_cleans_up_after_an_error():
+    state = {}
+
+    async def scenario():
+        with pytest.raises(AgentRunError):
+            async with open_pipeline(True, 0.01, fake_options={"failure_rate": 1.0, "seed": 1}) as pipeline:
+                state["fake"] = pipeline.client.agents
+                await pipeline.process(EMAIL)
+        state["pending"] = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    asyncio.run(scenario())
+    assert state["fake"]._threads == {}
+    assert state["pending"] == []
+
+
+def test_close_without_thread_pool():
+    async def scenario():
+        async with open_pipeline(True, 0.01) as pipeline:
+            await pipeline.threads.close()
+            pipeline.threads = None
+        return True
+
+    assert asyncio.run(scenario())
+
+
+def test_accepted_mini_reply_is_sent(monkeypatch):
+    from reply_stub_server import ReplyStubServer
+
+    stub = ReplyStubServer(("127.0.0.1", 0)).start()
+    monkeypatch.setenv("REPLY_ENDPOINT", stub.endpoint)
+    # An upset tone needs a written reply, so the mini Reply twin drafts it.
+    email = {**EMAIL, "body": "I am upset. How much does Agent Service cost?"}
+
+    async def scenario(template_replies: bool):
+        async with open_pipeline(True, 0.01, cascade=True, template_replies=template_replies) as pipeline:
+            return await pipeline.process(email)
+
+    try:
+        result = asyncio.run(scenario(True))
+        assert result["cascade"]["reply"] == "mini"
+        assert stub.replies == [{"emailId": "e1", "response": result["reply"]}]
+        # Without TemplateReplies nothing could send a draft, so the Reply Agent writes the reply.
+        result = asyncio.run(scenario(False))
+        assert "reply" not in result["cascade"] and "reply_mini" not in result["timings"]
+        assert len(stub.replies) == 1
+    finally:
+        stub.shutdown()
+
+
+def test_template_replies_use_reply_endpoint_or_the_fake_stub(monkeypatch):
+    async def endpoint() -> str:
+        async with open_pipeline(True, 0.01, template_replies=True) as pipeline:
+            return pipeline.replies.endpoint
+
+    monkeypatch.setenv("REPLY_ENDPOINT", "http://127.0.0.1:9/reply")
+    assert asyncio.run(endpoint()) == "http://127.0.0.1:9/reply"
+    # Without REPLY_ENDPOINT the fake posts to an in-process stub of the Reply trigger.
+    monkeypatch.delenv("REPLY_ENDPOINT")
+    assert asyncio.run(endpoint()).startswith("http://127.0.0.1:")
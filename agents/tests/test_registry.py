@@ -0,0 +1,80 @@
+import json
+import multiprocessing
+import os
+from types import SimpleNamespace
+
+import triage_agent
+from registry import AgentRegistry, ensure_agent
+
+ENDPOINT = "https://example.services.ai.azure.com/api/projects/test"
+
+
+def record_many(path: str, worker: int, count: int):
+    for number in range(count):
+        AgentRegistry(path).record(f"AGENT_{worker}_{number}", f"asst_{worker}_{number}", ENDPOINT)
+
+
+def test_concurrent_writers_keep_every_entry(tmp_path):
+    path = str(tmp_path / ".agents.json")
+    workers = [multiprocessing.Process(target=record_many, args=(path, worker, 20)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    with open(path) as f:
+        entries = json.load(f)
+    assert len(entries) == 80
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_export_env_keeps_other_settings(tmp_path):
+    registry = AgentRegistry(str(tmp_path / ".agents.json"))
+    env_path = tmp_path / ".env"
+    env_path.write_text(f"PROJECT_ENDPOINT={ENDPOINT}\nTRIAGE_AGENT_ID=asst_old\n")
+    registry.record("TRIAGE_AGENT_ID", "asst_new", ENDPOINT)
+    registry.export_env(str(env_path))
+    assert env_path.read_text() == f"PROJECT_ENDPOINT={ENDPOINT}\nTRIAGE_AGENT_ID=asst_new\n"
+
+
+class FakeAgents:
+    def __init__(self):
+        self.calls = []
+
+    def create_agent(self, **definition):
+        self.calls.append(("create", None, definition))
+        return SimpleNamespace(id="asst_1")
+
+    def update_agent(self, agent_id, **definition):
+        self.calls.append(("update", agent_id, definition))
+        return SimpleNamespace(id=agent_id)
+
+
+def test_ensure_agent_skips_unchanged_definitions(tmp_path, monkeypatch):
+    monkeypatch.delenv(triage_agent.AGENT_ENV_KEY, raising=False)
+    registry = AgentRegistry(str(tmp_path / ".agents.json"))
+    env_path = str(tmp_path / ".env")
+    agents = FakeAgents()
+    connect = lambda endpoint: SimpleNamespace(agents=agents)
+
+    assert ensure_agent(triage_agent, ENDPOINT, connect, registry=registry, env_path=env_path) == "asst_1"
+    assert ensure_agent(triage_agent, ENDPOINT, lambda endpoint: None, registry=registry, env_path=env_path) == "asst_1"
+    ensure_agent(triage_agent, ENDPOINT, connect, force=True, registry=registry, env_path=env_path)
+    monkeypatch.setattr(triage_agent, "INSTRUCTIONS", "Changed.")
+    ensure_agent(triage_agent, ENDPOINT, connect, registry=registry, env_path=env_path)
+
+    assert [(action, agent_id) for action, agent_id, _ in agents.calls] == [("create", None), ("update", "asst_1"), ("update", "asst_1")]
+    assert agents.calls[-1][2]["instructions"] == "Changed."
+    assert registry.get(triage_agent.AGENT_ENV_KEY)["agent_id"] == "asst_1"
+
+
+def test_ensure_agent_dry_run_does_not_connect(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv(triage_agent.AGENT_ENV_KEY, raising=False)
+    registry = AgentRegistry(str(tmp_path / ".agents.json"))
+
+    def connect(endpoint):
+        raise AssertionError("dry run connected")
+
+    assert ensure_agent(triage_agent, ENDPOINT, connect, dry_run=True, registry=registry, env_path=str(tmp_path / ".env")) is None
+    assert "Triage Agent: would create" in capsys.readouterr().out
+    assert list(registry.keys()) == []
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+from eval_router import evaluate, load_labeled, synthetic
+from fake_foundry import fake_kb
+from pipeline import open_pipeline
+from router import QuestionRouter
+
+LABELED_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "router_labeled.jsonl")
+# Labeled questions against the fake Foundry's FAQ KB. A near miss is labeled "rag", but the router
+# isn't confident either way and sends it to both.
+EXPECTED_ROUTES = {"exact": "faq", "paraphrase": "faq", "near_miss": "both", "out_of_scope": "rag"}
+
+
+@pytest.mark.parametrize("kind, question, label", load_labeled(LABELED_PATH), ids=lambda value: str(value)[:40])
+def test_labeled_questions_are_routed(kind, question, label):
+    assert QuestionRouter(fake_kb()).route(question) == EXPECTED_ROUTES[kind]
+
+
+def test_synthetic_accuracy_does_not_regress():
+    # eval_router.py's synthetic KB: every FAQ and out-of-scope question routed right, near misses to both.
+    index, labeled = synthetic(300, 1000, random.Random(7))
+    totals = evaluate(QuestionRouter(index), labeled)["totals"]
+    assert totals["wrong"] == 0
+    assert totals["correct"] / totals["questions"] >= 0.78
+
+
+def test_faq_route_falls_back_to_rag_when_faq_has_no_answer():
+    question = "How does file search work?"
+
+    async def scenario():
+        async with open_pipeline(True, 0.01, route=True) as pipeline:
+            # Trust every FAQ match, so a question the KB can't answer is routed to FAQ only.
+            pipeline.router.faq_threshold = 0.0
+            result = await pipeline.process({"id": "r1", "from": "a@contoso.com", "to": "support@contoso.com", "subject": "Search", "body": question})
+        return result, pipeline.router.snapshot()
+
+    result, stats = asyncio.run(scenario())
+    assert result["status"] == "replied"
+    assert [(q["question"], q["source"]) for q in result["questions"]] == [(question, "rag")]
+    assert list(result["routes"].values()) == ["faq+rag"]
+    assert stats["fallbacks"] == 1 and stats["rag_runs_avoided"] == 0
@@ -0,0 +1,140 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from scheduler import BULK, INTERACTIVE, DeploymentLimits, RateLimitError, RateLimitScheduler, TokenBucket, parse_retry_after, throttle_delay
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class NoJitter(random.Random):
+    def uniform(self, a, b):
+        return a
+
+
+async def advance(scheduler: RateLimitScheduler, model: str, clock: ManualClock, seconds: float):
+    # Move the clock and wake the deployment's waiters, which would otherwise sleep in real time.
+    clock.now += seconds
+    deployment = scheduler.deployment(model)
+    async with deployment.changed:
+        deployment.changed.notify_all()
+    await settle()
+
+
+async def settle():
+    # Let every task that can make progress without the clock do so.
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    clock = ManualClock()
+    bucket = TokenBucket(rate=2.0, capacity=10.0, clock=clock)
+    bucket.take(10)
+    assert bucket.delay(4) == 2.0
+    clock.now += 1
+    assert bucket.delay(4) == 1.0
+    clock.now += 100
+    assert bucket.delay(10) == 0.0 and bucket.level == 10.0
+    # More than the bucket holds waits for a full bucket instead of forever.
+    bucket.take(10)
+    assert bucket.delay(50) == 5.0
+
+
+def test_adjust_credits_unused_tokens():
+    clock = ManualClock()
+    bucket = TokenBucket(rate=1.0, capacity=100.0, clock=clock)
+    bucket.take(80)
+    bucket.adjust(80 - 30)  # estimated 80, used 30
+    assert bucket.level == 70.0
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RateLimitError("throttled", retry_after=3.0), 3.0),
+    (SimpleNamespace(status_code=429, response=SimpleNamespace(headers={"Retry-After": "7"})), 7.0),
+    (SimpleNamespace(status_code=429, response=SimpleNamespace(headers={"retry-after-ms": "1500", "Retry-After": "7"})), 1.5),
+    (SimpleNamespace(status_code=429, response=SimpleNamespace(headers={})), None),
+])
+def test_throttle_delay_reads_retry_after(error, expected):
+    assert throttle_delay(error) == (True, expected)
+
+
+def test_other_errors_are_not_throttling():
+    assert throttle_delay(SimpleNamespace(status_code=500)) == (False, None)
+    assert parse_retry_after("Rate limit exceeded. Try again in 20 seconds.") == 20.0
+
+
+def test_429_pauses_the_deployment_until_retry_after_then_recovers():
+    clock = ManualClock()
+    scheduler = RateLimitScheduler(limits={"m": DeploymentLimits(rpm=600, tpm=600_000)}, clock=clock, rng=NoJitter())
+    calls = []
+
+    async def call():
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise RateLimitError("429", retry_after=5.0)
+        return "ok"
+
+    async def scenario():
+        first = asyncio.create_task(scheduler.run("m", call))
+        await settle()
+        deployment = scheduler.deployment("m")
+        assert scheduler.snapshot()["m"]["paused_for"] == 5.0
+        assert deployment.requests.level <= 0 and deployment.tokens.level <= 0
+        # Nothing else is dispatched while paused, whatever its priority.
+        second = asyncio.create_task(scheduler.run("m", call, priority=INTERACTIVE))
+        await advance(scheduler, "m", clock, 4.9)
+        assert len(calls) == 1 and scheduler.snapshot()["m"]["queued"] == 2
+        # Once Retry-After has passed and the drained buckets refill, runs go again.
+        await advance(scheduler, "m", clock, 1.0)
+        return await asyncio.wait_for(asyncio.gather(first, second), 1)
+
+    assert asyncio.run(scenario()) == ["ok", "ok"]
+    assert calls[1] >= 1005.0
+    assert {k: scheduler.snapshot()["m"][k] for k in ("throttled", "retries", "dispatched")} == {"throttled": 1, "retries": 1, "dispatched": 2}
+
+
+def test_interactive_runs_go_before_queued_bulk_runs():
+    clock = ManualClock()
+    # One request of burst, then one request every 10 seconds.
+    scheduler = RateLimitScheduler(limits={"m": DeploymentLimits(rpm=6, tpm=600_000)}, clock=clock, rng=NoJitter())
+    order = []
+
+    def call(name):
+        async def run():
+            order.append(name)
+        return run
+
+    async def scenario():
+        await scheduler.run("m", call("first"), priority=BULK)
+        bulk = asyncio.create_task(scheduler.run("m", call("bulk"), priority=BULK))
+        await settle()
+        interactive = asyncio.create_task(scheduler.run("m", call("interactive"), priority=INTERACTIVE))
+        await settle()
+        await advance(scheduler, "m", clock, 10)
+        assert order == ["first", "interactive"]
+        await advance(scheduler, "m", clock, 10)
+        await asyncio.wait_for(asyncio.gather(bulk, interactive), 1)
+
+    asyncio.run(scenario())
+    assert order == ["first", "interactive", "bulk"]
+
+
+def test_gives_up_after_max_retries():
+    clock = ManualClock()
+    scheduler = RateLimitScheduler(limits={}, clock=clock, max_retries=2, rng=NoJitter())
+
+    async def call():
+        raise RateLimitError("429", retry_after=0.0)
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(scheduler.run("m", call))
+    assert scheduler.snapshot()["m"]["throttled"] == 3 and scheduler.snapshot()["m"]["failed"] == 1
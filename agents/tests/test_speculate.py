@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from bench_speculate import FAQ_QUESTIONS, RAG_QUESTIONS
+from pipeline import open_pipeline
+from speculate import SpeculativeRag
+
+
+def email(question: str) -> dict:
+    return {"id": "spec", "from": "a@contoso.com", "to": "support@contoso.com", "subject": "Question", "body": question}
+
+
+def process(question: str) -> tuple[dict, dict, dict, dict]:
+    # (result, speculation stats, scheduler stats of the RAG deployment, threads left on the fake)
+    async def scenario():
+        async with open_pipeline(True, 0.01, answer_mode="speculative") as pipeline:
+            result = await pipeline.process(email(question))
+        return result, pipeline.speculation.snapshot(), pipeline.client.scheduler.snapshot()["gpt-4.1"], pipeline.client.agents._threads
+
+    return asyncio.run(scenario())
+
+
+def test_faq_answer_cancels_the_rag_run():
+    result, speculation, rag, threads = process(FAQ_QUESTIONS[0])
+    assert [question["source"] for question in result["questions"]] == ["faq"]
+    assert list(result["speculation"].values()) == ["faq"]
+    assert (speculation["faq_answered"], speculation["rag_cancelled"], speculation["rag_needed"]) == (1, 1, 0)
+    # The losing RAG run was cancelled on the fake; its tokens are still counted.
+    assert rag["cancelled"] == 1 and rag["dispatched"] == 0
+    assert speculation["runs_cancelled"] == 1 and speculation["wasted_tokens"] > 0
+    assert threads == {}
+
+
+def test_faq_miss_falls_back_to_the_running_rag_answer():
+    result, speculation, rag, threads = process(RAG_QUESTIONS[0])
+    assert [question["source"] for question in result["questions"]] == ["rag"]
+    assert list(result["speculation"].values()) == ["rag"]
+    assert (speculation["faq_answered"], speculation["rag_cancelled"], speculation["rag_needed"]) == (0, 0, 1)
+    assert rag["cancelled"] == 0 and rag["dispatched"] == 1
+    assert speculation["head_start_seconds"] > 0
+    assert threads == {}
+
+
+def test_faq_error_cancels_rag_and_is_raised():
+    speculation = SpeculativeRag()
+    rag_cancelled = asyncio.Event()
+
+    async def faq():
+        await asyncio.sleep(0)
+        raise RuntimeError("faq failed")
+
+    async def rag():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            rag_cancelled.set()
+            raise
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await speculation.run(faq, rag)
+        return rag_cancelled.is_set()
+
+    assert asyncio.run(scenario())
+
+
+def test_rag_error_is_ignored_once_faq_has_answered():
+    speculation = SpeculativeRag()
+
+    async def faq():
+        await asyncio.sleep(0.01)
+        return "From the FAQ", []
+
+    async def rag():
+        raise RuntimeError("rag failed")
+
+    assert asyncio.run(speculation.run(faq, rag)) == ("From the FAQ", None, [])
+    assert speculation.snapshot()["rag_cancelled"] == 0
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from toolspec import compile_spec, minify_spec
+
+SPEC = {
+    "openapi": "3.0.3",
+    "info": {"title": "Orders", "version": "1.0", "contact": {"name": "Support"}, "x-logo": "logo.png"},
+    "servers": [{"url": "https://orders.contoso.com"}],
+    "paths": {
+        "/orders": {
+            "post": {
+                "operationId": "CreateOrder",
+                "externalDocs": {"url": "https://docs.contoso.com"},
+                "x-ms-visibility": "important",
+                "parameters": [{"name": "x-request-id", "in": "header", "schema": {"type": "string"}, "example": "abc"}],
+                "requestBody": {
+                    "content": {
+                        "application/json": {
+                            "schema": {
+                                "type": "object",
+                                "properties": {
+                                    "example": {"type": "string", "example": "a sample"},
+                                    "license": {"type": "string"},
+                                    "x-priority": {"type": "integer", "default": {"x-keep": 1}},
+                                },
+                                "required": ["example", "license", "x-priority"],
+                            },
+                            "examples": {"one": {"value": {}}},
+                        }
+                    }
+                },
+                "responses": {"200": {"description": "OK", "content": {"application/json": {"schema": {"type": "object"}}}}},
+            }
+        }
+    },
+}
+
+
+def test_minify_strips_keywords_but_keeps_names():
+    spec = minify_spec(json.loads(json.dumps(SPEC)))
+    operation = spec["paths"]["/orders"]["post"]
+    schema = operation["requestBody"]["content"]["application/json"]["schema"]
+    assert spec["info"] == {"title": "Orders", "version": "1.0"}
+    assert "externalDocs" not in operation and "x-ms-visibility" not in operation
+    assert operation["parameters"] == [{"name": "x-request-id", "in": "header", "schema": {"type": "string"}}]
+    assert "examples" not in operation["requestBody"]["content"]["application/json"]
+    # Property names that look like keywords are kept, so "required" still points at them.
+    assert schema["properties"] == {
+        "example": {"type": "string"},
+        "license": {"type": "string"},
+        "x-priority": {"type": "integer", "default": {"x-keep": 1}},
+    }
+    assert set(schema["required"]) <= set(schema["properties"])
+    assert operation["responses"] == {"200": {"description": "OK"}}
+
+
+def test_compiled_tool_specs_keep_their_operations():
+    tools = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools")
+    for name in ("cqa_tool.json", "reply_tool.json"):
+        with open(os.path.join(tools, name)) as f:
+            source = json.load(f)
+        compiled = compile_spec(source, name)
+        assert compiled["paths"].keys() == source["paths"].keys()
+
+
+def test_compile_rejects_specs_without_operation_ids():
+    spec = json.loads(json.dumps(SPEC))
+    del spec["paths"]["/orders"]["post"]["operationId"]
+    with pytest.raises(ValueError, match="no operationId"):
+        compile_spec(spec)
@@ -0,0 +1,98 @@
+import json
+import random
+
+import pytest
+
+from tracing import SERVICE_NAME, SCOPE_NAME, SPAN_KIND_CLIENT, STATUS_ERROR, STATUS_OK, LatencyHistogram, OtlpFileExporter, Tracer
+
+MS = 1_000_000  # nanoseconds
+
+
+def test_histogram_percentiles_of_known_latencies():
+    histogram = LatencyHistogram()
+    # 1 ms to 1000 ms, shuffled: the exact p50 is 0.5 s and p99 is 0.99 s.
+    latencies = [ms / 1000 for ms in range(1, 1001)]
+    random.Random(3).shuffle(latencies)
+    for seconds in latencies:
+        histogram.add(seconds)
+    assert histogram.percentile(0.50) == pytest.approx(0.5, rel=0.01)
+    assert histogram.percentile(0.99) == pytest.approx(0.99, rel=0.01)
+    assert (histogram.min, histogram.max, histogram.count) == (0.001, 1.0, 1000)
+    assert histogram.percentile(1.0) == 1.0
+
+
+def test_histogram_is_exact_for_small_values_and_clamps_to_min_max():
+    histogram = LatencyHistogram()
+    for micros in (10, 20, 30):
+        histogram.add(micros / 1_000_000)
+    assert [histogram.percentile(p) for p in (0.0, 0.5, 1.0)] == [10e-6, 20e-6, 30e-6]
+    histogram = LatencyHistogram()
+    histogram.add(0.123456)
+    assert histogram.percentile(0.5) == histogram.percentile(0.99) == 0.123456
+    assert LatencyHistogram().percentile(0.5) == 0.0
+
+
+def test_summary_from_recorded_spans():
+    tracer = Tracer()
+    for ms in range(1, 101):
+        tracer.record("invoke_agent faq", 0, ms * MS, {"gen_ai.usage.input_tokens": 10, "gen_ai.usage.output_tokens": 2})
+    tracer.record("execute_tool lookup", 0, 5 * MS)
+    summary = tracer.summary()
+    assert list(summary) == ["execute_tool lookup", "invoke_agent faq"]
+    faq = summary["invoke_agent faq"]
+    assert faq["count"] == 100 and faq["max"] == 0.1
+    assert faq["p50"] == pytest.approx(0.05, rel=0.01) and faq["p99"] == pytest.approx(0.099, rel=0.01)
+    assert (faq["runs"], faq["input_tokens"], faq["output_tokens"]) == (100, 1000, 200)
+    # Spans without usage have latency but no token totals.
+    assert summary["execute_tool lookup"]["p50"] == 0.005 and "runs" not in summary["execute_tool lookup"]
+
+
+def test_otlp_json_export(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    exporter = OtlpFileExporter(str(path), batch_size=2)
+    tracer = Tracer([exporter], rng=random.Random(1))
+    with tracer.span("email", {"email.id": "e1"}) as email:
+        tracer.record("invoke_agent rag", 1_000 * MS, 1_250 * MS, {"gen_ai.request.model": "gpt-4.1", "gen_ai.usage.input_tokens": 120, "cached": False, "score": 0.5, "urls": ["a", "b"]}, SPAN_KIND_CLIENT, error=TimeoutError("run timed out"))
+    with pytest.raises(ValueError):
+        with tracer.span("execute_tool lookup"):
+            raise ValueError("bad input")
+    tracer.shutdown()
+
+    requests = [json.loads(line) for line in path.read_text().splitlines()]
+    # Two spans fill the first batch; shutdown writes the rest.
+    assert [len(request["resourceSpans"][0]["scopeSpans"][0]["spans"]) for request in requests] == [2, 1]
+    resource_spans = requests[0]["resourceSpans"][0]
+    assert resource_spans["resource"] == {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]}
+    assert resource_spans["scopeSpans"][0]["scope"] == {"name": SCOPE_NAME}
+
+    rag, email_span = resource_spans["scopeSpans"][0]["spans"]
+    assert set(email_span) == {"traceId", "spanId", "name", "kind", "startTimeUnixNano", "endTimeUnixNano", "attributes", "status"}
+    assert len(email_span["traceId"]) == 32 and len(email_span["spanId"]) == 16
+    assert email_span["spanId"] == email.span_id and email_span["status"] == {"code": STATUS_OK}
+    assert rag["traceId"] == email_span["traceId"] and rag["parentSpanId"] == email_span["spanId"]
+    assert (rag["name"], rag["kind"], rag["startTimeUnixNano"], rag["endTimeUnixNano"]) == ("invoke_agent rag", SPAN_KIND_CLIENT, str(1_000 * MS), str(1_250 * MS))
+    assert rag["attributes"] == [
+        {"key": "gen_ai.request.model", "value": {"stringValue": "gpt-4.1"}},
+        {"key": "gen_ai.usage.input_tokens", "value": {"intValue": "120"}},
+        {"key": "cached", "value": {"boolValue": False}},
+        {"key": "score", "value": {"doubleValue": 0.5}},
+        {"key": "urls", "value": {"arrayValue": {"values": [{"stringValue": "a"}, {"stringValue": "b"}]}}},
+    ]
+    assert rag["status"] == {"code": STATUS_ERROR, "message": "TimeoutError: run timed out"}
+
+    tool = requests[1]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert "parentSpanId" not in tool and tool["traceId"] != email_span["traceId"]
+    assert tool["status"] == {"code": STATUS_ERROR, "message": "ValueError: bad input"}
+
+
+def test_traced_tool_keeps_the_signature_and_records_a_span():
+    tracer = Tracer()
+
+    def lookup(question: str) -> str:
+        """Looks up a question."""
+        return question.upper()
+
+    traced = tracer.traced_tool(lookup)
+    assert traced("hi") == "HI"
+    assert (traced.__name__, traced.__doc__) == ("lookup", "Looks up a question.")
+    assert tracer.summary()["execute_tool lookup"]["count"] == 1
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+# Warm threads kept per pipeline stage. Reply and the *_to_json formatters reuse the thread of the
+# stage before them (triage and FAQ/RAG), so they don't need a pool of their own.
+DEFAULT_POOL_SIZES = {"triage": 2, "faq": 4, "rag": 4}
+# Cap on threads that exist server-side at once (pooled, in use, or waiting to be deleted).
+DEFAULT_MAX_LIVE = 256
+
+
+class ThreadManager:
+    # Hands out pre-created threads and deletes them in the background once a job is done with them.
+    def __init__(self, agents, pool_sizes: dict | None = None, max_live: int = DEFAULT_MAX_LIVE, clock=time.monotonic):
+        self.agents = agents
+        self.pool_sizes = DEFAULT_POOL_SIZES if pool_sizes is None else pool_sizes
+        self.max_live = max_live
+        self.clock = clock
+        self.pools = {key: [] for key in self.pool_sizes}
+        self.leases = {}  # thread ID -> lease time
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "deleted": 0, "delete_failures": 0}
+        self._live = asyncio.Semaphore(max_live)
+        self._tasks = set()
+        self._refilling = set()
+        self._closed = False
+
+    def _background(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _create(self) -> str:
+        await self._live.acquire()
+        try:
+            thread = await self.agents.threads.create()
+        except BaseException:
+            self._live.release()
+            raise
+        self.stats["created"] += 1
+        return thread.id
+
+    async def _delete(self, thread_id: str):
+        try:
+            await self.agents.threads.delete(thread_id=thread_id)
+            self.stats["deleted"] += 1
+        except Exception:
+            # Left behind server-side; counted so it shows up as a leak.
+            self.stats["delete_failures"] += 1
+        finally:
+            self._live.release()
+
+    async def _refill(self, key: str):
+        try:
+            while not self._closed and len(self.pools[key]) < self.pool_sizes[key] and not self._live.locked():
+                self.pools[key].append(await self._create())
+        except Exception:
+            pass  # acquire() creates threads on demand if the pool stays empty
+        finally:
+            self._refilling.discard(key)
+
+    def _schedule_refill(self, key: str):
+        if key in self.pools and key not in self._refilling and not self._closed:
+            self._refilling.add(key)
+            self._background(self._refill(key))
+
+    def start(self):
+        for key in self.pools:
+            self._schedule_refill(key)
+
+    async def acquire(self, key: str) -> str:
+        pool = self.pools.get(key)
+        if pool:
+            thread_id = pool.pop()
+            self.stats["hits"] += 1
+        else:
+            thread_id = await self._create()
+            self.stats["misses"] += 1
+        self.leases[thread_id] = self.clock()
+        self._schedule_refill(key)
+        return thread_id
+
+    def release(self, thread_id: str):
+        if self.leases.pop(thread_id, None) is not None:
+            self._background(self._delete(thread_id))
+
+    async def close(self):
+        # Deletes pooled threads and waits for pending deletes. Threads still leased are reported, not deleted.
+        self._closed = True
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        pooled = [thread_id for pool in self.pools.values() for thread_id in pool]
+        for pool in self.pools.values():
+            pool.clear()
+        await asyncio.gather(*(self._delete(thread_id) for thread_id in pooled))
+
+    def hit_rate(self) -> float:
+        acquired = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / acquired if acquired else 0.0
+
+    def snapshot(self) -> dict:
+        now = self.clock()
+        oldest = min(self.leases.values(), default=None)
+        return {
+            **self.stats,
+            "hit_rate": round(self.hit_rate(), 3),
+            "pooled": sum(len(pool) for pool in self.pools.values()),
+            "leased": len(self.leases),
+            "oldest_lease_age": round(now - oldest, 2) if oldest is not None else 0.0,
+            "live": self.stats["created"] - self.stats["deleted"],
+        }
@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import json
+import os
+
+from registry import atomic_write
+
+# Compiled (resolved, validated, minified) OpenAPI specs, keyed by the hash of their source.
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "tools", ".compiled")
+# Bump whenever compile_spec() output changes so stale cache entries are ignored.
+COMPILER_VERSION = "2"
+
+HTTP_METHODS = {"get", "put", "post", "delete", "options", "head", "patch", "trace"}
+# Keys the model never needs to pick an operation or fill in its arguments.
+STRIPPED_KEYS = {"example", "examples", "externalDocs", "termsOfService", "contact", "license"}
+# Objects keyed by names the spec author chose (property names, status codes, media types, component
+# names, ...) rather than by keywords, so a property called "example" or "x-request-id" is kept.
+NAME_MAPS = {
+    "properties", "patternProperties", "dependentSchemas", "definitions", "$defs", "paths", "webhooks",
+    "responses", "content", "headers", "encoding", "variables", "callbacks", "links", "mapping", "scopes",
+    "schemas", "parameters", "requestBodies", "securitySchemes", "pathItems",
+}
+# Keywords whose values are data (or, for security, scheme names) and are kept as they are.
+LITERAL_KEYS = {"default", "enum", "const", "security"}
+
+_memo = {}
+
+
+def resolve_refs(spec: dict) -> dict:
+    import jsonref
+
+    resolved = jsonref.replace_refs(spec, proxies=False, lazy_load=False)
+    # Every schema is now inlined where it is used.
+    resolved.get("components", {}).pop("schemas", None)
+    return resolved
+
+
+def validate_spec(spec: dict, source: str = "spec"):
+    if not str(spec.get("openapi", "")).startswith("3."):
+        raise ValueError(f"{source}: only OpenAPI 3.x specs are supported.")
+    if not spec.get("info", {}).get("title"):
+        raise ValueError(f"{source}: info.title is required.")
+    if not spec.get("servers") or not spec["servers"][0].get("url"):
+        raise ValueError(f"{source}: at least one server url is required.")
+    if not spec.get("paths"):
+        raise ValueError(f"{source}: no paths defined.")
+
+    schemes = spec.get("components", {}).get("securitySchemes", {})
+    for requirement in spec.get("security", []):
+        for name in requirement:
+            if name not in schemes:
+                raise ValueError(f"{source}: security scheme '{name}' is not defined.")
+
+    operation_ids = set()
+    for path, item in spec["paths"].items():
+        for method, operation in item.items():
+            if method not in HTTP_METHODS:
+                continue
+            operation_id = operation.get("operationId")
+            if not operation_id:
+                raise ValueError(f"{source}: {method.upper()} {path} has no operationId.")
+            if operation_id in operation_ids:
+                raise ValueError(f"{source}: duplicate operationId '{operation_id}'.")
+            operation_ids.add(operation_id)
+            for parameter in operation.get("parameters", []):
+                if "$ref" in json.dumps(parameter):
+                    raise ValueError(f"{source}: unresolved $ref in {operation_id} parameters.")
+                if not parameter.get("name") or parameter.get("in") not in {"query", "header", "path", "cookie"}:
+                    raise ValueError(f"{source}: invalid parameter in {operation_id}.")
+
+
+def _minify_item(key: str, item):
+    if key in LITERAL_KEYS:
+        return item
+    if key in NAME_MAPS and isinstance(item, dict):
+        return {name: _minify(value) for name, value in item.items()}
+    return _minify(item)
+
+
+def _minify(value):
+    # value is an OpenAPI / JSON Schema object (or a list of them): its keys are keywords.
+    if isinstance(value, dict):
+        return {
+            key: _minify_item(key, item)
+            for key, item in value.items()
+            if key not in STRIPPED_KEYS and not key.startswith("x-") and not (key == "deprecated" and item is False)
+        }
+    if isinstance(value, list):
+        return [_minify(item) for item in value]
+    return value
+
+
+def minify_spec(spec: dict) -> dict:
+    spec = _minify(spec)
+    spec["info"] = {key: spec["info"][key] for key in ("title", "version") if key in spec["info"]}
+    for scheme in spec.get("components", {}).get("securitySchemes", {}).values():
+        scheme.pop("description", None)
+    for item in spec["paths"].values():
+        for method, operation in item.items():
+            if method not in HTTP_METHODS:
+                continue
+            # The model only sees the response body, never its schema.
+            for response in operation.get("responses", {}).values():
+                response.pop("content", None)
+    return spec
+
+
+def compile_spec(spec: dict, source: str = "spec") -> dict:
+    spec = resolve_refs(spec)
+    validate_spec(spec, source)
+    return minify_spec(spec)
+
+
+def _cached(digest: str, compile_source, source: str) -> dict:
+    if digest in _memo:
+        return _memo[digest]
+
+    cache_path = os.path.join(CACHE_DIR, f"{digest}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            compiled = json.load(f)
+    else:
+        compiled = compile_spec(compile_source(), source)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        atomic_write(cache_path, json.dumps(compiled, separators=(",", ":")))
+
+    _memo[digest] = compiled
+    return compiled
+
+
+def load_compiled_spec(path: str) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(COMPILER_VERSION.encode() + raw).hexdigest()
+    return _cached(digest, lambda: json.loads(raw), os.path.basename(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile OpenAPI tool specs and report their size.")
+    parser.add_argument("paths", nargs="+", help="OpenAPI spec files (JSON)")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        with open(path, "r") as f:
+            original = json.dumps(resolve_refs(json.load(f)), separators=(",", ":"))
+        compiled = json.dumps(load_compiled_spec(path), separators=(",", ":"))
+        # ~4 characters per token is close enough to compare before/after.
+        print(
+            f"{path}: {len(original)} -> {len(compiled)} chars "
+            f"(~{len(original) // 4} -> ~{len(compiled) // 4} tokens)"
+        )
+
+
+if __name__ == "__main__":
+    main()
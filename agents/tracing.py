@@ -0,0 +1,304 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Spans are exported as OTLP/JSON (one ExportTraceServiceRequest per line, like the OpenTelemetry
+# Collector's file exporter) to TRACE_FILE, and/or printed to stderr with TRACE_CONSOLE=1.
+TRACE_FILE_ENV = "TRACE_FILE"
+TRACE_CONSOLE_ENV = "TRACE_CONSOLE"
+SERVICE_NAME = "supportbuddy-agents"
+SCOPE_NAME = "supportbuddy.agents"
+EXPORT_BATCH_SIZE = 256
+# Histogram resolution: values under 2**SUB_BUCKET_BITS microseconds are exact, larger ones are kept
+# within 1 / 2**(SUB_BUCKET_BITS - 1) (under 1%), like an HdrHistogram with 2 significant digits.
+SUB_BUCKET_BITS = 8
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class LatencyHistogram:
+    # Log-linear buckets over microseconds: fixed memory, no sorting, exact min/max.
+    def __init__(self, sub_bucket_bits: int = SUB_BUCKET_BITS):
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.half = self.sub_buckets // 2
+        self.bits = sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, micros: int) -> int:
+        if micros < self.sub_buckets:
+            return micros
+        shift = micros.bit_length() - self.bits
+        return self.sub_buckets + (shift - 1) * self.half + (micros >> shift) - self.half
+
+    def _value(self, index: int) -> float:
+        # Midpoint of the bucket, in microseconds.
+        if index < self.sub_buckets:
+            return float(index)
+        shift, offset = divmod(index - self.sub_buckets, self.half)
+        shift += 1
+        low = (offset + self.half) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def add(self, seconds: float):
+        micros = max(0, int(seconds * 1_000_000))
+        index = self._index(micros)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        # In seconds; p in [0, 1].
+        if not self.count:
+            return 0.0
+        rank = max(1, int(p * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._value(index) / 1_000_000, self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": round(self.percentile(0.50), 4),
+            "p95": round(self.percentile(0.95), 4),
+            "p99": round(self.percentile(0.99), 4),
+            "max": round(self.max or 0.0, 4),
+        }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: str | None, kind: int, start_ns: int, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_OK
+        self.status_message = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def update(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status, **({"message": self.status_message} if self.status_message else {})},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class OtlpFileExporter:
+    def __init__(self, path: str, batch_size: int = EXPORT_BATCH_SIZE, resource: dict | None = None):
+        self.path = path
+        self.batch_size = batch_size
+        self.resource = resource or {"service.name": SERVICE_NAME}
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span.to_otlp())
+            if len(self.spans) >= self.batch_size:
+                self._write()
+
+    def _write(self):
+        if not self.spans:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes(self.resource)},
+            "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": self.spans}],
+        }]}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, separators=(",", ":")) + "\n")
+        self.spans = []
+
+    def shutdown(self):
+        with self._lock:
+            self._write()
+
+
+class ConsoleExporter:
+    # One line per finished span: name, duration and the attributes that matter when reading along.
+    KEYS = ("gen_ai.request.model", "gen_ai.usage.input_tokens", "gen_ai.usage.output_tokens", "queue.wait", "gen_ai.tool.type", "email.status")
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def export(self, span: Span):
+        details = " ".join(f"{key.rsplit('.', 1)[-1]}={span.attributes[key]}" for key in self.KEYS if span.attributes.get(key) is not None)
+        error = f" ERROR {span.status_message}" if span.status == STATUS_ERROR else ""
+        print(f"[trace] {span.name} {span.duration * 1000:.1f} ms {details}{error}".rstrip(), file=self.stream)
+
+    def shutdown(self):
+        pass
+
+
+class Tracer:
+    # Spans for agent runs and tool calls. Every finished span also feeds a latency histogram keyed by
+    # span name, and spans with gen_ai.usage.* attributes add to that name's token totals, whether or
+    # not an exporter is configured.
+    def __init__(self, exporters: list | None = None, rng: random.Random | None = None):
+        self.exporters = exporters or []
+        self.rng = rng or random.Random()
+        self.histograms = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    def _id(self, bits: int) -> str:
+        return f"{self.rng.getrandbits(bits):0{bits // 4}x}"
+
+    def start_span(self, name: str, attributes: dict | None = None, kind: int = SPAN_KIND_INTERNAL, parent: Span | None = None, start_ns: int | None = None) -> Span:
+        # The span is not made current; use() does that. The parent defaults to the current span.
+        parent = parent or _current.get()
+        trace_id = parent.trace_id if parent else self._id(128)
+        return Span(name, trace_id, self._id(64), parent.span_id if parent else None, kind, time.time_ns() if start_ns is None else start_ns, attributes)
+
+    @contextmanager
+    def use(self, span: Span | None):
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+
+    def end(self, span: Span, end_ns: int | None = None):
+        if span.end_ns is not None:
+            return
+        span.end_ns = time.time_ns() if end_ns is None else end_ns
+        with self._lock:
+            self.histograms.setdefault(span.name, LatencyHistogram()).add(span.duration)
+            if "gen_ai.usage.input_tokens" in span.attributes or "gen_ai.usage.output_tokens" in span.attributes:
+                tokens = self.tokens.setdefault(span.name, {"runs": 0, "input_tokens": 0, "output_tokens": 0})
+                tokens["runs"] += 1
+                tokens["input_tokens"] += span.attributes.get("gen_ai.usage.input_tokens") or 0
+                tokens["output_tokens"] += span.attributes.get("gen_ai.usage.output_tokens") or 0
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, attributes: dict | None = None, kind: int = SPAN_KIND_INTERNAL):
+        span = self.start_span(name, attributes, kind)
+        try:
+            with self.use(span):
+                yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            self.end(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, attributes: dict | None = None, kind: int = SPAN_KIND_INTERNAL, error=None):
+        # A span that already happened, e.g. a server-side tool call reported by a run step.
+        span = self.start_span(name, attributes, kind, start_ns=start_ns)
+        if error:
+            span.fail(error)
+        self.end(span, max(end_ns, start_ns))
+
+    def traced_tool(self, function):
+        # Wraps a local function tool so each call is an execute_tool span; the signature and docstring
+        # the agent sees are unchanged.
+        attributes = {"gen_ai.tool.name": function.__name__, "gen_ai.tool.type": "function"}
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with self.span(f"execute_tool {function.__name__}", attributes):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.span(f"execute_tool {function.__name__}", attributes):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def summary(self) -> dict:
+        # Latency percentiles (seconds) and token totals per span name.
+        with self._lock:
+            return {name: {**histogram.summary(), **self.tokens.get(name, {})} for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.tokens = {}
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+def configure(trace_file: str | None = None, console: bool = False) -> Tracer:
+    # Sets the exporters of the shared tracer; arguments default to TRACE_FILE / TRACE_CONSOLE.
+    trace_file = trace_file or os.getenv(TRACE_FILE_ENV)
+    console = console or os.getenv(TRACE_CONSOLE_ENV) == "1"
+    tracer.shutdown()
+    tracer.exporters = ([OtlpFileExporter(trace_file)] if trace_file else []) + ([ConsoleExporter()] if console else [])
+    return tracer
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{'span':<40} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'in tok':>8} {'out tok':>8}"]
+    for name, row in summary.items():
+        tokens = f"{row['input_tokens']:>8} {row['output_tokens']:>8}" if "runs" in row else f"{'':>8} {'':>8}"
+        lines.append(f"{name[:40]:<40} {row['count']:>6} {row['p50']:>7.3f}s {row['p95']:>7.3f}s {row['p99']:>7.3f}s {row['max']:>7.3f}s {tokens}")
+    return "\n".join(lines)
+
+
+tracer = Tracer()